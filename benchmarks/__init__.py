@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+# WinPackIt benchmark suite.
+# Builds generated projects in "delayed install" mode (so it runs on Linux),
+# with a local HTTP server standing in for python.org and bootstrap.pypa.io:
+# no network needed, and repeatable numbers.
+# Run `python -m benchmarks --help` from the repository root.
@@ -0,0 +1,154 @@
+# -*- coding: utf-8 -*-
+
+# Run the WinPackIt benchmarks and compare them against a stored baseline.
+# $ python -m benchmarks                       # tiny and small tiers
+# $ python -m benchmarks --tiers medium large  # up to 100k files, 5 GB
+# $ python -m benchmarks --save                # store a new baseline
+# Exit code is 1 if some stage got slower than the baseline allows.
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import platform
+import statistics
+from pathlib import Path
+from types import SimpleNamespace
+
+from winpackit import Packit, LOG_ALWAYS
+from benchmarks.standin import PythonOrgStandIn
+from benchmarks.projects import TIERS, make_project
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / 'baseline.json'
+WORKDIR = HERE.parent / 'benchoutput'
+
+
+def make_settings(workdir, project):
+    """The same settings a runner script would collect, for a delayed
+    install: nothing needs to run the target Python."""
+    return SimpleNamespace(
+        HERE=workdir, VERBOSE=LOG_ALWAYS, USE_CACHE=True, REMOTE_CACHE_URL='',
+        OFFLINE=False, DOWNLOAD_CONNECTIONS=4,
+        PYTHON_VERSION='3.10-64', PY_CATALOG_MIRROR='',
+        DELAYED_INSTALL=True, PIP_REQUIRED=True,
+        REQUIREMENTS='', DEPENDENCIES=['requests'], PIP_CACHE=True,
+        DEPENDENCY_LAYERS=[],
+        PIP_ARGS=[], PIP_INSTALL_ARGS=[],
+        PROJECTS=[[str(project), ('main.py', 'main')]],
+        PROJECT_FILES_IGNORE_PATTERNS=[], COMPILE=True,
+        PYC_ONLY_DISTRIBUTION=False, COPY_DIRS=[],
+        PRUNE_PYTHON=False, PRUNE_KEEP=[], IMPORT_LOG='',
+        SLIM_SITE_PACKAGES=False, SLIM_PATTERNS=[], SLIM_KEEP=[],
+        PROFILE_IMPORTS=False, PROFILE_PYTHON='', VERIFY_INSTALL='hash',
+        ARCHIVE_OUTPUT=True,
+        TRACE_FILE='',
+        WELCOME_MESSAGE='', GOODBYE_MESSAGE='',
+        custom_action=lambda packit_instance: True)
+
+
+def run_tier(tier, workdir, repeat):
+    """Build the tier project repeat times, with a cold cache each time
+    (downloads are local anyway). Return the median timings."""
+    project = make_project(workdir / 'projects', tier)
+    runs = []
+    for n in range(repeat):
+        packit = Packit(make_settings(workdir, project), workdir / 'cache')
+        packit.build_dir = workdir / f'build_{tier}'
+        shutil.rmtree(packit.cache_dir, ignore_errors=True)
+        report = packit.main()
+        if not all(report):
+            raise RuntimeError(f'Benchmark build for tier {tier} failed.')
+        runs.append(report)
+    stages = {}
+    for stage in runs[0].stages:
+        name = stage['stage']
+        stages[name] = statistics.median(
+            [s['wall_time'] for r in runs for s in r.stages if s['stage'] == name])
+    return {'stages': stages,
+            'total': statistics.median(r.totals()['wall_time'] for r in runs),
+            'output_bytes': runs[0].output['bytes']}
+
+
+def compare(results, baseline, tolerance, min_delta):
+    """Print results against the baseline. Return the regressions found."""
+    regressions = []
+    for tier, result in results.items():
+        old = baseline.get('tiers', {}).get(tier)
+        print(f'\nTier {tier}:')
+        rows = list(result['stages'].items()) + [('TOTAL', result['total'])]
+        for name, now in rows:
+            if old is None:
+                print(f'  {name + " ":.<24} {now:8.3f}s')
+                continue
+            before = old['total'] if name == 'TOTAL' else old['stages'].get(name)
+            if before is None:
+                print(f'  {name + " ":.<24} {now:8.3f}s   (new stage)')
+                continue
+            change = (now - before) / before * 100 if before else 0.0
+            slower = (now > before * (1 + tolerance)
+                      and now - before > min_delta)
+            flag = '  <-- SLOWER' if slower else ''
+            print(f'  {name + " ":.<24} {now:8.3f}s  {before:8.3f}s',
+                  f'{change:+7.1f}%{flag}')
+            if slower:
+                regressions.append((tier, name, before, now))
+    return regressions
+
+
+def machine():
+    return {'platform': platform.platform(), 'python': platform.python_version(),
+            'cpu_count': os.cpu_count()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks',
+                        description='Time the WinPackIt build stages on '
+                                    'generated projects, with no network.')
+    parser.add_argument('--tiers', nargs='+', choices=list(TIERS),
+                        default=['tiny', 'small'],
+                        help='project sizes to build (default: tiny small)')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='builds per tier, the median is taken (default: 3)')
+    parser.add_argument('--baseline', default=BASELINE, type=Path,
+                        help='baseline file (default: benchmarks/baseline.json)')
+    parser.add_argument('--save', action='store_true',
+                        help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown, as a fraction (default: 0.25)')
+    parser.add_argument('--min-delta', type=float, default=0.05,
+                        help='ignore slowdowns below these seconds (default: 0.05)')
+    parser.add_argument('--workdir', default=WORKDIR, type=Path,
+                        help='where projects and builds go (default: benchoutput)')
+    args = parser.parse_args(argv)
+    if not sys.platform.startswith('linux'):
+        print('Note: the baseline numbers were taken on Linux.')
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    results = {}
+    with PythonOrgStandIn(args.workdir / 'standin'):
+        for tier in args.tiers:
+            print(f'Running tier {tier}...', flush=True)
+            results[tier] = run_tier(tier, args.workdir, args.repeat)
+    baseline = {}
+    if args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text())
+        if baseline.get('machine') != machine():
+            print('Note: the baseline was taken on a different machine:',
+                  baseline.get('machine'))
+    regressions = compare(results, baseline, args.tolerance, args.min_delta)
+    if args.save:
+        tiers = baseline.get('tiers', {})
+        tiers.update(results)
+        _ = args.baseline.write_text(json.dumps(
+                {'machine': machine(), 'tiers': tiers}, indent=2))
+        print(f'\nBaseline saved in {args.baseline}.')
+        return 0
+    if regressions:
+        print(f'\n{len(regressions)} stage(s) slower than the baseline.')
+        return 1
+    print('\nNo regressions.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+# Generated projects for the benchmarks, in size tiers.
+# Each project is a package tree of Python modules plus a dir of "assets":
+# half compressible data, half incompressible (as images, audio etc.).
+
+import os
+import json
+from pathlib import Path
+
+# tier: (Python modules, asset files, total asset bytes)
+TIERS = {
+    'tiny':   (10,      2,      64 * 1024),
+    'small':  (300,     50,     20 * 1024 * 1024),
+    'medium': (5000,    500,    500 * 1024 * 1024),
+    'large':  (100000,  5000,   5 * 1024 * 1024 * 1024),
+}
+MODULES_PER_PACKAGE = 50
+
+MODULE_TEMPLATE = '''\
+"""Generated module number {n}."""
+
+import os
+import sys
+
+CONSTANT_{n} = {n}
+
+def function_{n}(x, y=None):
+    """Return something not too trivial."""
+    values = [x * i for i in range({n} % 17 + 3)]
+    if y is not None:
+        values.append(y)
+    return sum(values) + CONSTANT_{n}
+
+class Class{n}:
+    def __init__(self, value):
+        self.value = value
+
+    def method(self):
+        return function_{n}(self.value)
+'''
+
+
+def make_project(root, tier):
+    """Generate the tier project in root (if not already there), with a
+    main.py entry point. Return the project dir."""
+    modules, assets, asset_bytes = TIERS[tier]
+    project = Path(root) / f'bench_{tier}'
+    marker = project / 'project.json'
+    if marker.exists():
+        return project  # they take a while, reuse them
+    project.mkdir(parents=True, exist_ok=True)
+    package = None
+    for n in range(modules):
+        if n % MODULES_PER_PACKAGE == 0:
+            package = project / 'app' / f'pkg{n // MODULES_PER_PACKAGE}'
+            package.mkdir(parents=True, exist_ok=True)
+            _ = (package / '__init__.py').write_text('')
+        _ = (package / f'mod{n}.py').write_text(MODULE_TEMPLATE.format(n=n))
+    _ = (project / 'app' / '__init__.py').write_text('')
+    _ = (project / 'main.py').write_text(
+        'import app.pkg0.mod0\nprint(app.pkg0.mod0.function_0(1))\n')
+    assets_dir = project / 'assets'
+    assets_dir.mkdir(exist_ok=True)
+    size = asset_bytes // assets
+    # a random block, repeated: still incompressible for deflate
+    block = os.urandom(min(size, 1024 * 1024)) or b'x'
+    for n in range(assets):
+        if n % 2:
+            path, data = assets_dir / f'image{n}.png', block
+        else:
+            path, data = assets_dir / f'data{n}.txt', b'some,csv,data\n' * 1024
+        with open(path, 'wb') as f:
+            written = 0
+            while written < size:
+                chunk = data[:size - written]
+                f.write(chunk)
+                written += len(chunk)
+    _ = marker.write_text(json.dumps({'tier': tier, 'modules': modules,
+                                      'assets': assets,
+                                      'asset_bytes': asset_bytes}))
+    return project
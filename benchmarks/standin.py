@@ -0,0 +1,243 @@
+# -*- coding: utf-8 -*-
+
+# A local HTTP stand-in for python.org and bootstrap.pypa.io.
+# It serves synthetic embeddable packages and a fake get-pip.py, and points
+# winpackit.PY_URL/GETPIP_URL at them (with the right md5 checksums).
+# Directory listings are served too, as a mirror for PyVersionCatalog, and
+# PUT requests are accepted (into workdir/uploads), as a remote HTTPCache.
+# Byte ranges are supported (unless ranges=False), as on python.org.
+# Used by the benchmarks, and by the test suite for network-free builds:
+#
+#   with PythonOrgStandIn(workdir, versions=[(3, 10, 0, 64)]) as standin:
+#       Packit(settings).main()
+
+import os
+import hashlib
+import threading
+import zipfile
+from pathlib import Path
+from unittest import mock
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+
+import winpackit
+
+# extension modules and runtime dlls of a typical embeddable package
+EXTENSIONS = ('_asyncio', '_bz2', '_ctypes', '_decimal', '_elementtree',
+              '_hashlib', '_lzma', '_msi', '_multiprocessing', '_overlapped',
+              '_queue', '_socket', '_sqlite3', '_ssl', '_uuid', '_zoneinfo',
+              'pyexpat', 'select', 'unicodedata', 'winsound')
+DLLS = ('libcrypto-1_1.dll', 'libffi-7.dll', 'libssl-1_1.dll',
+        'sqlite3.dll', 'vcruntime140.dll')
+
+
+def make_embeddable(filepath, version, stdlib_modules=1500, module_size=4096,
+                    binary_size=256 * 1024):
+    """Write a fake embeddable package for version (ma, mi, mc, arch):
+    same layout as the real one, with synthetic content of about the
+    same size. Nothing in it can actually run, of course."""
+    ma, mi = version[:2]
+    stdlib = Path(filepath).with_suffix('.stdlib')
+    with zipfile.ZipFile(stdlib, 'w', zipfile.ZIP_DEFLATED) as z:
+        for n in range(stdlib_modules):
+            # compiled modules, about as compressible as real pycs
+            body = (b'\xe3' + n.to_bytes(4, 'little')) * (module_size // 5)
+            z.writestr(f'module{n}.pyc', body + os.urandom(module_size // 4))
+    with zipfile.ZipFile(filepath, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr(f'python{ma}{mi}._pth', f'python{ma}{mi}.zip\n.\n')
+        z.write(stdlib, f'python{ma}{mi}.zip')
+        for name in ('python.exe', 'pythonw.exe', f'python{ma}{mi}.dll'):
+            z.writestr(name, os.urandom(binary_size))
+        for name in EXTENSIONS:
+            z.writestr(f'{name}.pyd', os.urandom(binary_size // 4))
+        for name in DLLS:
+            z.writestr(name, os.urandom(binary_size))
+        z.writestr('LICENSE.txt', 'Not really a Python.\n' * 500)
+    stdlib.unlink()
+    return filepath
+
+
+def make_getpip(filepath, size=2500 * 1024):
+    """Write a fake get-pip.py, about as big as the real one."""
+    filler = '# ' + 'x' * 76 + '\n'
+    text = 'print("This is not get-pip.")\n' + filler * (size // len(filler))
+    _ = Path(filepath).write_text(text)
+    return filepath
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def do_PUT(self):
+        self.server.requests.append((self.command, self.path))
+        filepath = self.server.upload_dir / self.path.lstrip('/')
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        length = int(self.headers['Content-Length'])
+        with open(filepath, 'wb') as f:
+            while length:
+                chunk = self.rfile.read(min(length, 1024 * 1024))
+                if not chunk:
+                    break
+                f.write(chunk)
+                length -= len(chunk)
+        self.server.files[self.path] = filepath
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _listing(self):
+        """An html listing of the files and dirs just below self.path."""
+        names = set()
+        for path in self.server.files:
+            if path.startswith(self.path) and path != self.path:
+                rest = path[len(self.path):]
+                names.add(rest.split('/')[0] + ('/' if '/' in rest else ''))
+        if not names:
+            return None
+        links = ''.join(f'<a href="{name}">{name}</a>\n' for name in sorted(names))
+        return f'<html><body><pre>\n{links}</pre></body></html>\n'.encode()
+
+    def _serve(self, body):
+        self.server.requests.append((self.command, self.path))
+        if self.path.endswith('/'):
+            data = self._listing()
+            filepath = None
+            if data is None:
+                self.send_error(404)
+                return
+            etag = '"%s"' % hashlib.md5(data).hexdigest()
+            size = len(data)
+            content_type = 'text/html'
+        else:
+            filepath = self.server.files.get(self.path)
+            if filepath is None:
+                self.send_error(404)
+                return
+            st = filepath.stat()
+            etag = f'"{st.st_size}-{int(st.st_mtime)}"'
+            size = st.st_size
+            content_type = 'application/octet-stream'
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        ranges = self.server.ranges and filepath is not None
+        start, end = 0, size - 1
+        wanted = self.headers.get('Range', '')
+        if ranges and wanted.startswith('bytes='):
+            first, last = wanted[len('bytes='):].split('-')
+            start, end = int(first), min(int(last or size - 1), size - 1)
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        if ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        if not body:
+            return
+        if filepath is None:
+            self.wfile.write(data)
+            return
+        with open(filepath, 'rb') as f:
+            f.seek(start)
+            left = end - start + 1
+            while left:
+                chunk = f.read(min(left, 1024 * 1024))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                left -= len(chunk)
+
+    def log_message(self, *args):
+        pass  # keep quiet
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class PythonOrgStandIn:
+    """Serve fake embeddable packages for the wanted versions
+    (default: latest 3.10, 64 bit) and a fake get-pip.py, from a local
+    HTTP server, at the same paths as python.org (plus an md5 file for
+    each package), in byte ranges too unless ranges=False. Unless
+    patch_urls=False, as a context manager also patch winpackit to use
+    them."""
+
+    def __init__(self, workdir, versions=None, patch_urls=True, ranges=True,
+                 **embeddable_options):
+        self.workdir = Path(workdir)
+        self.versions = versions or [(3, 10, winpackit.MAX_MICRO_VERSIONS[(3, 10)], 64)]
+        self.patch_urls = patch_urls
+        self.ranges = ranges
+        self.embeddable_options = embeddable_options
+        self.server = None
+        self.patches = []
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def add_file(self, urlpath, filepath):
+        """Serve filepath at base_url + urlpath. Return the full url."""
+        self.server.files[urlpath] = Path(filepath)
+        return self.base_url + urlpath
+
+    def start(self):
+        self.workdir.mkdir(parents=True, exist_ok=True)
+        self.server = _Server(('127.0.0.1', 0), _Handler)
+        self.server.files = {}
+        self.server.requests = [] # (method, path), for the curious
+        self.server.upload_dir = self.workdir / 'uploads'
+        self.server.ranges = self.ranges
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        py_urls = {}
+        for version in self.versions:
+            ma, mi, mc, arch = version
+            suffix = 'amd64' if arch == 64 else 'win32'
+            filename = f'python-{ma}.{mi}.{mc}-embed-{suffix}.zip'
+            filepath = self.workdir / filename
+            if not filepath.exists():  # they take a while, reuse them
+                make_embeddable(filepath, version, **self.embeddable_options)
+            checksum = winpackit._hashfile(filepath)
+            md5file = filepath.with_name(filename + '.md5')
+            _ = md5file.write_text(f'{checksum}  {filename}\n')
+            urlpath = f'/ftp/python/{ma}.{mi}.{mc}/{filename}'
+            url = self.add_file(urlpath, filepath)
+            self.add_file(urlpath + '.md5', md5file)
+            py_urls[version] = (url, checksum)
+        getpip = self.workdir / 'get-pip.py'
+        if not getpip.exists():
+            make_getpip(getpip)
+        url = self.add_file('/get-pip.py', getpip)
+        getpip_urls = {key: (url, '') for key in winpackit.GETPIP_URL}
+        if self.patch_urls:
+            self.patches = [mock.patch.dict(winpackit.PY_URL, py_urls),
+                            mock.patch.dict(winpackit.GETPIP_URL, getpip_urls),
+                            mock.patch('winpackit.GETPIP_DEFAULT_URL', (url, ''))]
+        for patch in self.patches:
+            patch.start()
+        return self
+
+    def stop(self):
+        for patch in reversed(self.patches):
+            patch.stop()
+        self.patches = []
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -7,20 +7,27 @@
 
 import unittest
 from unittest import mock
-import os, sys, shutil
+import os, sys, shutil, zipfile, json, subprocess, threading, hashlib, time
+from urllib.request import urlopen, Request
+from urllib.error import HTTPError
 from pathlib import Path
 from pprint import pprint
+from collections import namedtuple
 
+import winpackit
 from winpackit import *
+from benchmarks.standin import PythonOrgStandIn
 
 class _Cfg:
     def __init__(self):
         self.HERE = Path(__file__).resolve().parent
         self.PROJECTS = []
         self.PYTHON_VERSION = '3'
+        self.PY_CATALOG_MIRROR = ''
         self.DELAYED_INSTALL = False
         self.PIP_REQUIRED = False
         self.DEPENDENCIES = []
+        self.DEPENDENCY_LAYERS = []
         self.REQUIREMENTS = ''
         self.PIP_CACHE = True
         self.PIP_ARGS = []
@@ -29,7 +36,21 @@ class _Cfg:
         self.COMPILE = False
         self.PYC_ONLY_DISTRIBUTION = False
         self.COPY_DIRS = []
+        self.PRUNE_PYTHON = False
+        self.PRUNE_KEEP = []
+        self.IMPORT_LOG = ''
+        self.SLIM_SITE_PACKAGES = False
+        self.SLIM_PATTERNS = []
+        self.SLIM_KEEP = []
+        self.PROFILE_IMPORTS = False
+        self.PROFILE_PYTHON = ''
+        self.VERIFY_INSTALL = 'hash'
+        self.ARCHIVE_OUTPUT = False
+        self.TRACE_FILE = ''
         self.USE_CACHE = True
+        self.REMOTE_CACHE_URL = ''
+        self.OFFLINE = False
+        self.DOWNLOAD_CONNECTIONS = 4
         self.VERBOSE = 2
         self.WELCOME_MESSAGE = 'starting...'
         self.GOODBYE_MESSAGE = "done, press enter to quit"
@@ -51,6 +72,8 @@ class BasicTestCase(unittest.TestCase):
     def tearDown(self):
         shutil.rmtree(self.packit.build_dir)
         shutil.rmtree(self.packit.cache_dir)
+        logs = self.packit.build_dir.with_name('BasicTestCase_build_logs')
+        shutil.rmtree(logs, ignore_errors=True)
         self.packit = None
         del self.cfg
 
@@ -68,6 +91,34 @@ class BasicTestCase(unittest.TestCase):
         with mock.patch('sys.version_info', (3, 7, 1)):
             self.assertEqual(self.packit.parse_pyversion(), (3, 7, 1, 64))
 
+    def test_pip_cache_dir(self):
+        cache_dir = self.basedir / 'BasicTestCase_pipcache'
+        packit = Packit(_Cfg(), cache_dir)
+        self.assertEqual(packit.cache_dir, cache_dir)
+        self.assertEqual(packit._pip_cache_dir(), cache_dir)
+        target = packit._make_target('3.9')
+        self.assertEqual(target._pip_cache_dir(), cache_dir)
+        self.assertFalse(cache_dir.exists())
+
+    def test_old_runner_settings(self):
+        intro = f'\n#####\n##### RUNNING TEST old_runner_settings ...\n#####\n'
+        self.packit.msg(0, intro)
+        # the settings namedtuple of a runner made by WinPackIt 0.8.0
+        fields = ['HERE', 'VERBOSE', 'USE_CACHE', 'PYTHON_VERSION',
+                  'DELAYED_INSTALL', 'PIP_REQUIRED', 'REQUIREMENTS',
+                  'DEPENDENCIES', 'PIP_CACHE', 'PIP_ARGS', 'PIP_INSTALL_ARGS',
+                  'PROJECTS', 'PROJECT_FILES_IGNORE_PATTERNS', 'COMPILE',
+                  'PYC_ONLY_DISTRIBUTION', 'COPY_DIRS', 'WELCOME_MESSAGE',
+                  'GOODBYE_MESSAGE', 'custom_action']
+        old_cfg = namedtuple('cfg', fields)(*[getattr(self.cfg, f) for f in fields])
+        packit = Packit(old_cfg)
+        self.assertEqual(packit.cfg.PYTHON_VERSION, self.cfg.PYTHON_VERSION)
+        self.assertFalse(packit.cfg.PRUNE_PYTHON)
+        self.assertFalse(packit.cfg.OFFLINE)
+        self.assertEqual(packit.cfg.REMOTE_CACHE_URL, '')
+        self.assertEqual(packit.cfg.DEPENDENCY_LAYERS, [])
+        self.assertIsNone(packit.remote)
+
     def test_parse_pyversion_special_case(self): # see SPECIAL_CASE_VERSIONS
         intro = f'\n#####\n##### RUNNING TEST parse_pyversion_special_case ...\n#####\n'
         self.packit.msg(0, intro)
@@ -101,6 +152,32 @@ class BasicTestCase(unittest.TestCase):
         with mock.patch('sys.version_info', (2, 7, 10)):
             self.assertEqual(self.packit.parse_pyversion(), (3, 5, 4, 64))
 
+    def test_py_catalog(self):
+        intro = f'\n#####\n##### RUNNING TEST py_catalog ...\n#####\n'
+        self.packit.msg(0, intro)
+        catalog = PyVersionCatalog({(3, 8, 1, 64): ('a', 'x'), 
+                                    (3, 8, 3, 64): ('b', ''), 
+                                    (3, 9, 0, 64): ('c', ''), 
+                                    (3, 9, 2, 32): ('d', '')})
+        self.assertEqual(catalog.latest(3), (3, 9, 0, 64))
+        self.assertEqual(catalog.latest(3, arch=32), (3, 9, 2, 32))
+        self.assertEqual(catalog.latest(3, 8), (3, 8, 3, 64))
+        self.assertEqual(catalog.latest(3, 8, 2), (3, 8, 3, 64)) # missing
+        self.assertEqual(catalog.latest(3, 8, 9), (3, 8, 3, 64)) # too high
+        self.assertEqual(catalog.latest(3, 7), (3, 8, 3, 64))    # too low
+        self.assertEqual(catalog.latest(4), (3, 9, 0, 64))
+        # a new entry with no md5 keeps the old one
+        catalog.update({(3, 8, 1, 64): ('e', '')})
+        self.assertEqual(catalog.url((3, 8, 1, 64)), ('e', 'x'))
+        catalog_file = self.packit.build_dir / PY_CATALOG_FILE
+        catalog.save(catalog_file)
+        loaded = PyVersionCatalog({})
+        loaded.load(catalog_file)
+        self.assertEqual(loaded.entries, catalog.entries)
+        self.assertEqual(loaded.latest(3, 8, 2), (3, 8, 3, 64))
+        # the built-in table is the default
+        self.assertEqual(PyVersionCatalog().entries, PY_URL)
+
     def test_getfile(self):
         intro = f'\n#####\n##### RUNNING TEST getfile ...\n#####\n'
         self.packit.msg(0, intro)
@@ -111,6 +188,686 @@ class BasicTestCase(unittest.TestCase):
         self.cfg.USE_CACHE = True
         self.assertEqual(self.packit.getfile('bogus/dir/testfile'), testpath)
 
+    def test_prune_python(self):
+        intro = f'\n#####\n##### RUNNING TEST prune_python ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.cfg.PRUNE_PYTHON = True
+        self.cfg.PRUNE_KEEP = ['_socket']
+        self.packit.prepare_dirs()
+        # a fake embeddable Python, no need to download the real one
+        pydir = self.packit.build_dir / 'python-3.9.7-embed-amd64'
+        (pydir / 'Lib' / 'site-packages').mkdir(parents=True)
+        with zipfile.ZipFile(pydir / 'python39.zip', 'w') as z:
+            for name in ('os.pyc', 'encodings/__init__.pyc', 
+                         'json/__init__.pyc', 'sqlite3/__init__.pyc'):
+                z.writestr(name, b'fake')
+        for name in ('_sqlite3.pyd', 'sqlite3.dll', '_socket.pyd', 'python39.dll'):
+            (pydir / name).write_bytes(b'fake')
+        self.packit.target_py_dir = pydir
+        self.packit.target_py_version = (3, 9, 7, 64)
+        self.assertTrue(self.packit.prune_python())
+        with zipfile.ZipFile(pydir / 'python39.zip', 'r') as z:
+            self.assertEqual(sorted(z.namelist()), 
+                             ['encodings/__init__.pyc', 'os.pyc'])
+        self.assertEqual(sorted(i.name for i in pydir.iterdir() if i.is_file()),
+                         ['_socket.pyd', 'python39.dll', 'python39.zip'])
+        # a shipped Pip keeps what it needs, even if loaded dynamically
+        with zipfile.ZipFile(pydir / 'python39.zip', 'w') as z:
+            for name in ('os.pyc', 'json/__init__.pyc', 'sqlite3/__init__.pyc'):
+                z.writestr(name, b'fake')
+        commands = pydir / 'Lib' / 'site-packages' / 'pip' / 'commands'
+        commands.mkdir(parents=True)
+        (commands.parent / '__init__.py').write_text('')
+        (commands / '__init__.py').write_text('')
+        (commands / 'show.py').write_text('def run():\n    import json\n')
+        self.packit.pip_is_present = True
+        self.assertTrue(self.packit.prune_python())
+        with zipfile.ZipFile(pydir / 'python39.zip', 'r') as z:
+            self.assertEqual(sorted(z.namelist()), 
+                             ['json/__init__.pyc', 'os.pyc'])
+
+    def test_slim_site_packages(self):
+        intro = f'\n#####\n##### RUNNING TEST slim_site_packages ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.SLIM_SITE_PACKAGES = True
+        self.cfg.SLIM_PATTERNS = ['*.txt']
+        self.cfg.SLIM_KEEP = ['Setuptools', 'numpy/core/include/*']
+        # a fake site-packages, as left by pip
+        pydir = self.packit.build_dir / 'python-3.9.7-embed-amd64'
+        site_packages = pydir / 'Lib' / 'site-packages'
+        dists = {'pip-22.0.dist-info': ['pip/__init__.py', '../../Scripts/pip.exe'], 
+                 'setuptools-60.0.dist-info': ['setuptools/tests/test_a.py'],
+                 'numpy-1.22.0.dist-info': [
+                     'numpy/__init__.py', 'numpy/core/tests/test_a.py', 
+                     'numpy/core/include/numpy/a.h', 'numpy/core/a.pyi', 
+                     'numpy/readme.txt', 
+                     'numpy/__pycache__/__init__.cpython-39.pyc', 
+                     'numpy/__pycache__/__init__.cpython-38.pyc']}
+        for dist_info, files in dists.items():
+            files = files + [f'{dist_info}/METADATA', f'{dist_info}/RECORD']
+            for name in files:
+                path = site_packages / name
+                path.parent.mkdir(parents=True, exist_ok=True)
+                _ = path.write_bytes(b'fake')
+            _ = (site_packages / dist_info / 'RECORD').write_text(
+                    ''.join(f'{name},sha256=abc,4\n' for name in files))
+        _ = (site_packages / 'sitecustomize.py').write_text('') # not in RECORDs
+        pip_record = (site_packages / 'pip-22.0.dist-info' / 'RECORD').stat().st_size
+        self.packit.target_py_dir = pydir
+        self.packit.target_py_version = (3, 9, 7, 64)
+        self.packit.pip_is_present = True
+        self.assertTrue(self.packit.slim_site_packages())
+        remaining = sorted(p.relative_to(site_packages).as_posix() 
+                           for p in site_packages.rglob('*') if p.is_file())
+        self.assertEqual(remaining, [
+            'numpy-1.22.0.dist-info/METADATA', 'numpy-1.22.0.dist-info/RECORD', 
+            'numpy/__init__.py', 'numpy/__pycache__/__init__.cpython-39.pyc', 
+            'numpy/core/include/numpy/a.h', 
+            'setuptools-60.0.dist-info/METADATA', 
+            'setuptools-60.0.dist-info/RECORD', 'setuptools/tests/test_a.py', 
+            'sitecustomize.py'])
+        self.assertFalse((pydir / 'Scripts' / 'pip.exe').exists())
+        self.assertFalse((site_packages / 'numpy' / 'core' / 'tests').exists())
+        self.assertFalse(self.packit.pip_is_present)
+        record = (site_packages / 'numpy-1.22.0.dist-info' / 'RECORD').read_text()
+        self.assertEqual(sorted(line.split(',')[0] for line in record.splitlines()), 
+                         remaining[:5])
+        self.assertEqual(self.packit.report.slimmed, 
+                         {'numpy': {'files': 4, 'bytes': 16}, 
+                          'pip': {'files': 4, 'bytes': 12 + pip_record}})
+
+    def test_cache_backend(self):
+        intro = f'\n#####\n##### RUNNING TEST cache_backend ...\n#####\n'
+        self.packit.msg(0, intro)
+        remote_dir = self.packit.build_dir / 'remote'
+        remote = CacheBackend.from_url(str(remote_dir))
+        self.assertIsInstance(remote, LocalCache)
+        self.assertIsInstance(CacheBackend.from_url('http://host/cache'), HTTPCache)
+        testfile = self.packit.build_dir / 'testfile'
+        _ = testfile.write_text('some content')
+        dest = self.packit.build_dir / 'fetched'
+        self.assertFalse(remote.fetch('testfile', dest))
+        remote.store('testfile', testfile)
+        self.assertTrue(remote.fetch('testfile', dest))
+        self.assertEqual(dest.read_text(), 'some content')
+        _ = (remote_dir / 'testfile').write_text('corrupted') # md5 won't match
+        dest.unlink()
+        self.assertFalse(remote.fetch('testfile', dest))
+        self.assertFalse(dest.exists())
+        # Pip's cache goes there too, along with a manifest
+        self.packit.remote = remote
+        pip_cache = self.packit.cache_dir
+        self.cfg.PIP_ARGS[:] = [f'--cache-dir={pip_cache}']
+        wheel = pip_cache / 'wheels' / 'ab' / 'cd' / 'pkg-1.0-py3-none-any.whl'
+        wheel.parent.mkdir(parents=True)
+        _ = wheel.write_bytes(b'wheel')
+        self.packit._push_pip_cache(self.packit._pull_pip_cache())
+        self.packit.finish_uploads()
+        manifest = json.loads((remote_dir / REMOTE_PIP_MANIFEST).read_text())
+        self.assertEqual(manifest, ['wheels/ab/cd/pkg-1.0-py3-none-any.whl'])
+        shutil.rmtree(pip_cache / 'wheels')
+        self.packit._pull_pip_cache()
+        self.assertEqual(wheel.read_bytes(), b'wheel')
+
+    def test_offline(self):
+        intro = f'\n#####\n##### RUNNING TEST offline ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.OFFLINE = True
+        self.cfg.PIP_REQUIRED = True
+        self.packit.target_py_version = (3, 10, 0, 64)
+        with mock.patch('winpackit.urlretrieve', side_effect=AssertionError):
+            self.assertEqual(self.packit.getfile('http://host/missing.zip'), '')
+            with self.assertRaises(SystemExit):
+                self.packit.getfile('http://host/missing.zip', on_error_abort=True)
+            self.assertEqual(self.packit.obtain_getpip(), '')
+            getpip = self.packit.cache_dir / 'get-pip.py'
+            _ = getpip.write_text('# cached get-pip')
+            self.assertEqual(self.packit.obtain_getpip(), getpip)
+            self.packit.target_py_version = (3, 5, 4, 64)
+            self.assertEqual(self.packit.obtain_getpip(), '') # not the same one
+        self.assertEqual(self.packit._offline_args(), ['--no-index'])
+        _ = Packit(settings=self.cfg) # no Pip self-check either
+        self.assertIn('--disable-pip-version-check', self.cfg.PIP_ARGS)
+        index = self.packit.cache_dir / 'index'
+        export_index(cache_dir=self.packit.cache_dir)
+        self.assertEqual(self.packit._offline_args(), 
+                         ['--index-url', index.resolve().as_uri() + '/'])
+
+    def test_export_index(self):
+        intro = f'\n#####\n##### RUNNING TEST export_index ...\n#####\n'
+        self.packit.msg(0, intro)
+        cache = self.packit.cache_dir
+        wheels = cache / 'wheels' / 'ab'
+        wheels.mkdir(parents=True)
+        _ = (wheels / 'Foo_Bar-1.0-py3-none-any.whl').write_bytes(b'wheel')
+        _ = (cache / 'python_dateutil-2.8.2.tar.gz').write_bytes(b'sdist')
+        _ = (cache / 'python-3.10.0-embed-amd64.zip').write_bytes(b'python')
+        body = cache / 'http-v2' / 'a' / 'b' / '0123456789abcdef.body'
+        body.parent.mkdir(parents=True)
+        with zipfile.ZipFile(body, 'w') as z: # a wheel downloaded by Pip
+            z.writestr('six-1.16.0.dist-info/WHEEL', 
+                       'Wheel-Version: 1.0\nTag: py2-none-any\nTag: py3-none-any\n')
+            z.writestr('six.py', '')
+        output = self.packit.build_dir / 'index'
+        self.assertEqual(export_index(output, cache), 0)
+        projects = sorted(p.name for p in output.iterdir() if p.is_dir())
+        self.assertEqual(projects, ['foo-bar', 'python-dateutil', 'six'])
+        self.assertTrue((output / 'six' / 'six-1.16.0-py2.py3-none-any.whl').exists())
+        page = (output / 'foo-bar' / 'index.html').read_text()
+        digest = hashlib.sha256(b'wheel').hexdigest()
+        self.assertIn(f'href="Foo_Bar-1.0-py3-none-any.whl#sha256={digest}"', page)
+        self.assertIn('href="six/"', (output / 'index.html').read_text())
+        # exporting again adds nothing new
+        self.assertEqual(export_index(output, cache), 0)
+        self.assertEqual(len(list((output / 'six').iterdir())), 2)
+
+    def test_dependency_layers(self):
+        intro = f'\n#####\n##### RUNNING TEST dependency_layers ...\n#####\n'
+        self.packit.msg(0, intro)
+        requirements = self.packit.build_dir / 'requirements-base.txt'
+        _ = requirements.write_text('numpy\n')
+        self.cfg.DEPENDENCY_LAYERS = [['base', f'-r {requirements}', 'attrs'], 
+                                      ['app', 'arrow']]
+        installed = []
+        def fake_pip(*args, on_line=None): # "installs" a module per package
+            packages = [a for a in args[args.index('install') + 1:] 
+                        if not a.startswith('-')]
+            for package in packages:
+                if package == str(requirements):
+                    package = requirements.read_text().strip()
+                installed.append(package)
+                module = pydir / 'Lib' / 'site-packages' / package / '__init__.py'
+                module.parent.mkdir(parents=True, exist_ok=True)
+                _ = module.write_text(f'# {package}\n')
+            return True
+        # two builds: the second one links the layers from the cache
+        for build in ('build1', 'build2'):
+            pydir = self.packit.build_dir / build / 'python'
+            (pydir / 'Lib' / 'site-packages').mkdir(parents=True)
+            self.packit.target_py_dir = pydir
+            self.packit.target_py_version = (3, 9, 7, 64)
+            with mock.patch.object(self.packit, 'run_subprocess', fake_pip):
+                self.assertTrue(self.packit.run_stage(self.packit._install_layers))
+        self.assertEqual(installed, ['numpy', 'attrs', 'arrow'])
+        first, second = self.packit.report.stages
+        self.assertEqual(first['counters'], {'layer_misses': 2})
+        self.assertEqual(second['counters'], {'layer_hits': 2, 'files_linked': 3})
+        site1 = self.packit.build_dir / 'build1' / 'python' / 'Lib' / 'site-packages'
+        site2 = pydir / 'Lib' / 'site-packages'
+        self.assertEqual((site2 / 'arrow' / '__init__.py').read_text(), '# arrow\n')
+        layers = list((self.packit.cache_dir / 'layers').iterdir())
+        self.assertEqual(len(layers), 2)
+        app = [l for l in layers 
+               if json.loads((l / 'layer.json').read_text())['name'] == 'app'][0]
+        self.assertTrue((site2 / 'arrow' / '__init__.py').samefile(
+                app / 'files' / 'Lib' / 'site-packages' / 'arrow' / '__init__.py'))
+        self.assertFalse((site1 / 'numpy' / '__init__.py').samefile(
+                         site2 / 'numpy' / '__init__.py'))
+        # a new base layer means a new app layer too
+        base_print, app_print = [f for n, i, f in self.packit._layer_fingerprints()]
+        _ = requirements.write_text('numpy==1.22\n')
+        new_base, new_app = [f for n, i, f in self.packit._layer_fingerprints()]
+        self.assertNotEqual(base_print, new_base)
+        self.assertNotEqual(app_print, new_app)
+
+    def test_warm_cache(self):
+        intro = f'\n#####\n##### RUNNING TEST warm_cache ...\n#####\n'
+        self.packit.msg(0, intro)
+        warm = WarmCache(self.packit.cache_dir / 'templates')
+        testfile = self.packit.build_dir / 'testfile'
+        _ = testfile.write_text('some content')
+        checksum = winpackit._hashfile(testfile)
+        with mock.patch('winpackit._hashfile', 
+                        side_effect=winpackit._hashfile) as hashfile:
+            self.assertTrue(warm.md5compare(testfile, checksum))
+            self.assertTrue(warm.md5compare(testfile, checksum))
+            self.assertEqual(hashfile.call_count, 1) # hashed once
+            self.assertFalse(warm.md5compare(testfile, 'bogus'))
+        # compiled modules are reused for the same source
+        source = self.packit.build_dir / 'mod.py'
+        pyc = self.packit.build_dir / '__pycache__' / 'mod.cpython-39.pyc'
+        _ = source.write_text('x = 1\n')
+        self.assertEqual(warm.restore_pycs((3, 9), False, [(source, pyc)]), 0)
+        pyc.parent.mkdir()
+        _ = pyc.write_bytes(b'compiled')
+        warm.store_pycs((3, 9), False, [(source, pyc)])
+        pyc.unlink()
+        self.assertEqual(warm.restore_pycs((3, 8), False, [(source, pyc)]), 0)
+        self.assertEqual(warm.restore_pycs((3, 9), False, [(source, pyc)]), 1)
+        self.assertEqual(pyc.read_bytes(), b'compiled')
+
+    def test_profile_imports(self):
+        intro = f'\n#####\n##### RUNNING TEST profile_imports ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project1', ('main.py', 'main')]]
+        self.cfg.PROFILE_IMPORTS = True
+        self.cfg.PROFILE_PYTHON = sys.executable
+        self.packit.prepare_dirs()
+        self.packit.copy_project_files()
+        # a fake embeddable Python, matching our own version
+        pydir = self.packit.build_dir / 'python-fake-embed-amd64'
+        (pydir / 'Lib' / 'site-packages').mkdir(parents=True)
+        (pydir / 'python._pth').write_text('.\nLib/site-packages\n../project1\n')
+        self.packit.target_py_dir = pydir
+        self.packit.target_py_version = (*sys.version_info[:3], 64)
+        self.assertTrue(self.packit.profile_imports())
+        with open(self.packit.bootstrap_dir / 'import_times.json') as f:
+            report = json.load(f)
+        imported = [i[0] for i in report['main']['imports']]
+        self.assertIn('a', imported)
+        self.assertIn('foo.foo', imported)
+
+    def test_make_archive(self):
+        intro = f'\n#####\n##### RUNNING TEST make_archive ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project1', ('main.py', 'main')], 
+                             ['examples/project3/code with spaces']]
+        self.cfg.ARCHIVE_OUTPUT = True
+        self.packit.prepare_dirs()
+        self.packit.copy_project_files()
+        archive = self.basedir / 'BasicTestCase_build.zip'
+        try:
+            # a low threshold, to stream-compress some files too
+            with mock.patch('winpackit.ARCHIVE_STREAM_SIZE', 10):
+                self.assertTrue(self.packit.make_archive())
+            with zipfile.ZipFile(archive) as z:
+                self.assertIsNone(z.testzip())
+                names = z.namelist()
+                self.assertEqual(names, sorted(names))
+                self.assertEqual(z.read('BasicTestCase_build/project1/main.py'), 
+                                 Path('examples/project1/main.py').read_bytes())
+                gif = z.getinfo('BasicTestCase_build/project1/a.gif')
+                self.assertEqual(gif.compress_type, zipfile.ZIP_STORED)
+                self.assertIn('BasicTestCase_build/code with spaces/main.py', names)
+        finally:
+            archive.unlink()
+
+    def test_make_archive_raw_python(self):
+        intro = f'\n#####\n##### RUNNING TEST make_archive_raw_python ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.ARCHIVE_OUTPUT = True
+        self.packit.prepare_dirs()
+        # a fake embeddable Python, no need to download the real one
+        pyfile = self.packit.cache_dir / 'python-3.9.7-embed-amd64.zip'
+        with zipfile.ZipFile(pyfile, 'w', zipfile.ZIP_DEFLATED) as z:
+            z.writestr('python39._pth', 'python39.zip\n.\n')
+            z.writestr('python.exe', b'fake executable ' * 100)
+            z.writestr('python39.zip', b'fake stdlib ' * 100)
+        self.packit.target_py_version = (3, 9, 7, 64)
+        self.assertTrue(self.packit.unpack_python(pyfile))
+        archive = self.basedir / 'BasicTestCase_build.zip'
+        try:
+            with mock.patch('winpackit._read_raw_entry', 
+                            wraps=winpackit._read_raw_entry) as raw:
+                self.assertTrue(self.packit.make_archive())
+            # the ._pth file was changed, the others are copied as they are
+            self.assertEqual(raw.call_count, 2)
+            with zipfile.ZipFile(archive) as z, zipfile.ZipFile(pyfile) as src:
+                self.assertIsNone(z.testzip())
+                prefix = 'BasicTestCase_build/python-3.9.7-embed-amd64/'
+                for name in ('python.exe', 'python39.zip'):
+                    self.assertEqual(z.getinfo(prefix + name).CRC, 
+                                     src.getinfo(name).CRC)
+                self.assertIn('Lib/site-packages', 
+                              z.read(prefix + 'python39._pth').decode())
+        finally:
+            archive.unlink()
+
+    def _load_bootstrap(self):
+        # exec the generated bootstrap script, with a fake subprocess.run
+        bootstrap = self.packit.bootstrap_dir / 'bootstrap.py'
+        namespace = {'__file__': str(bootstrap), '__name__': 'bootstrap'}
+        cwd = os.getcwd()
+        try:
+            exec(compile(bootstrap.read_text(), str(bootstrap), 'exec'), namespace)
+        finally:
+            os.chdir(cwd)
+        def fake_run(args, stdout=None, stderr=None, **kwargs):
+            if stdout:
+                stdout.write(f'fake run: {args[1:3]}\n')
+                if 'get-pip.py' in args:
+                    stdout.write('Downloading pip-21.3-py3-none-any.whl (1.7 MB)\n')
+                elif 'compileall' in args:
+                    stdout.write("Compiling 'main.py'...\n")
+            return subprocess.CompletedProcess(args, 0)
+        namespace['subprocess'] = mock.Mock(run=mock.Mock(side_effect=fake_run),
+                                            STDOUT=subprocess.STDOUT)
+        return namespace
+
+    def test_bootstrap_concurrent_steps(self):
+        intro = f'\n#####\n##### RUNNING TEST bootstrap_concurrent_steps ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.packit.prepare_dirs()
+        self.packit.copy_project_files()
+        self.packit.target_py_dir = self.packit.build_dir / 'python-fake-embed-amd64'
+        self.packit.delay_have_pip = True
+        self.packit.delay_compile_pycs = True
+        self.assertTrue(self.packit.make_bootstrap())
+        bootstrap = self._load_bootstrap()
+        cwd = os.getcwd()
+        os.chdir(self.packit.bootstrap_dir)
+        try:
+            bootstrap['run_steps']()
+        finally:
+            os.chdir(cwd)
+        log = (self.packit.bootstrap_dir / 'install.log').read_text()
+        for step in ('install pip', 'compile py modules', 'make shortcuts'):
+            self.assertIn(step, log)
+        self.assertEqual(sorted(i.name for i in self.packit.bootstrap_dir.glob('*.log')),
+                         ['install.log'])
+        with open(self.packit.bootstrap_dir / 'install_report.json') as f:
+            report = json.load(f)['steps']
+        self.assertEqual(report['pip']['bytes_downloaded'], 1700000)
+        self.assertEqual(report['pip']['exit_codes'], [0])
+        self.assertEqual(report['compile']['files_compiled'], 1)
+        self.assertFalse(report['shortcuts']['skipped'])
+
+    def test_bootstrap_resume(self):
+        intro = f'\n#####\n##### RUNNING TEST bootstrap_resume ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.packit.prepare_dirs()
+        self.packit.copy_project_files()
+        self.packit.target_py_dir = self.packit.build_dir / 'python-fake-embed-amd64'
+        self.packit.delay_have_pip = True
+        self.packit.delay_compile_pycs = True
+        (self.packit.bootstrap_dir / 'get-pip.py').write_text('fake')
+        self.assertTrue(self.packit.make_bootstrap())
+        self.assertTrue(self.packit.write_manifest())
+        cwd = os.getcwd()
+        os.chdir(self.packit.bootstrap_dir)
+        try:
+            bootstrap = self._load_bootstrap()
+            bootstrap['run_steps']()  # first run: everything is done
+            self.assertEqual(bootstrap['subprocess'].run.call_count, 3)
+            bootstrap = self._load_bootstrap()
+            bootstrap['run_steps']()  # second run: nothing to do
+            self.assertEqual(bootstrap['subprocess'].run.call_count, 0)
+            # ...but the build is checked again, it may be damaged since
+            main = self.packit.build_dir / 'project0' / 'main.py'
+            source, st = main.read_bytes(), main.stat()
+            main.write_bytes(bytes(len(source)))
+            bootstrap = self._load_bootstrap()
+            self.assertFalse(bootstrap['run_steps']())
+            self.assertEqual(bootstrap['subprocess'].run.call_count, 0)
+            main.write_bytes(source)
+            os.utime(main, ns=(st.st_atime_ns, st.st_mtime_ns))
+            # from now on, the build changes on purpose
+            (self.packit.bootstrap_dir / 'build_manifest.json').unlink()
+            (self.packit.bootstrap_dir / 'get-pip.py').write_text('changed')
+            bootstrap = self._load_bootstrap()
+            bootstrap['run_steps']()  # changed input: Pip only
+            self.assertEqual(bootstrap['subprocess'].run.call_count, 1)
+            bootstrap = self._load_bootstrap()
+            bootstrap['FORCE'] = True
+            bootstrap['run_steps']()  # forced: everything again
+            self.assertEqual(bootstrap['subprocess'].run.call_count, 3)
+        finally:
+            os.chdir(cwd)
+        log = (self.packit.bootstrap_dir / 'install.log').read_text()
+        self.assertIn('pip: already done, skipped', log)
+
+    def test_build_manifest(self):
+        intro = f'\n#####\n##### RUNNING TEST build_manifest ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.packit.prepare_dirs()
+        self.packit.copy_project_files()
+        self.packit.target_py_dir = self.packit.build_dir / 'python-fake-embed-amd64'
+        self.assertTrue(self.packit.make_bootstrap())
+        self.assertTrue(self.packit.run_stage(self.packit.write_manifest))
+        manifest = self.packit.bootstrap_dir / 'build_manifest.json'
+        with open(manifest) as f:
+            files = json.load(f)['files']
+        self.assertIn('project0/main.py', files)
+        self.assertIn('winpackit_bootstrap/bootstrap.py', files)
+        self.assertNotIn('winpackit_bootstrap/build_manifest.json', files)
+        self.assertEqual(self.packit.report.totals()['files_hashed'], len(files))
+        log = self.packit.bootstrap_dir / 'install_verify.log'
+        bootstrap = self._load_bootstrap()
+        info = dict()
+        self.assertTrue(bootstrap['verify_build'](str(log), info))
+        self.assertEqual(info['files_checked'], len(files))
+        # same size, different content: only a full check can tell
+        main = self.packit.build_dir / 'project0' / 'main.py'
+        main.write_bytes(bytes(len(main.read_bytes())))
+        self.assertFalse(bootstrap['verify_build'](str(log), info))
+        self.assertIn('project0/main.py: corrupted', log.read_text())
+        bootstrap['VERIFY'] = 'size'
+        self.assertTrue(bootstrap['verify_build'](str(log), info))
+        main.unlink()
+        self.assertFalse(bootstrap['verify_build'](str(log), info))
+        self.assertIn('project0/main.py: missing', log.read_text())
+        bootstrap['VERIFY'] = ''
+        self.assertTrue(bootstrap['verify_build'](str(log), info))
+        self.cfg.VERIFY_INSTALL = ''
+        manifest.unlink()
+        self.assertTrue(self.packit.write_manifest())
+        self.assertFalse(manifest.exists())
+
+    def test_build_manifest_sync(self):
+        project = self.basedir / 'BasicTestCase_project'
+        shutil.rmtree(project, ignore_errors=True)
+        shutil.copytree(self.cfg.HERE / 'examples/project0', project)
+        self.cfg.PROJECTS = [[str(project), ('main.py', 'main')]]
+        self.cfg.COMPILE = False
+        self.packit.prepare_dirs()
+        self.packit.copy_project_files()
+        self.packit.target_py_dir = self.packit.build_dir / 'python-fake-embed-amd64'
+        self.assertTrue(self.packit.make_bootstrap())
+        self.assertTrue(self.packit.write_manifest())
+        self.cfg.ARCHIVE_OUTPUT = True
+        self.assertTrue(self.packit.make_archive())
+        old = self.packit.snapshot_sources()
+        _ = (project / 'main.py').write_text('print("changed")\n')
+        _ = (project / 'new.py').write_text('print("new")\n')
+        (project / 'readme.txt').unlink()
+        self.assertTrue(self.packit.sync_changes(old, self.packit.snapshot_sources()))
+        manifest = self.packit.bootstrap_dir / 'build_manifest.json'
+        with open(manifest) as f:
+            files = json.load(f)['files']
+        name = project.name
+        main = self.packit.build_dir / name / 'main.py'
+        self.assertEqual(files[f'{name}/main.py'], 
+                         [main.stat().st_size, 
+                          hashlib.md5(main.read_bytes()).hexdigest()])
+        self.assertIn(f'{name}/new.py', files)
+        self.assertNotIn(f'{name}/readme.txt', files)
+        log = self.packit.bootstrap_dir / 'install_verify.log'
+        self.assertTrue(self._load_bootstrap()['verify_build'](str(log), dict()))
+        # the archive is made again
+        archive = self.packit.build_dir.with_name('BasicTestCase_build.zip')
+        with zipfile.ZipFile(archive) as z:
+            names = z.namelist()
+            self.assertEqual(z.read(f'BasicTestCase_build/{name}/main.py'), 
+                             b'print("changed")\n')
+        self.assertIn(f'BasicTestCase_build/{name}/new.py', names)
+        self.assertNotIn(f'BasicTestCase_build/{name}/readme.txt', names)
+        archive.unlink()
+        shutil.rmtree(project)
+
+    def test_build_report(self):
+        intro = f'\n#####\n##### RUNNING TEST build_report ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.packit.prepare_dirs()
+        ret = self.packit.run_stage(self.packit.copy_project_files)
+        self.assertTrue(ret)
+        record = self.packit.report.stages[-1]
+        self.assertEqual(record['stage'], 'copy_project_files')
+        self.assertTrue(record['ok'])
+        self.assertGreaterEqual(record['wall_time'], 0)
+        proj = self.cfg.HERE / 'examples' / 'project0'
+        copied = [f for f in proj.rglob('*') 
+                  if f.is_file() and '__pycache__' not in f.parts]
+        self.assertEqual(record['counters']['files_copied'], len(copied))
+        self.assertEqual(record['counters']['bytes_copied'], 
+                         sum(f.stat().st_size for f in copied))
+        # outside of a stage, nothing is counted
+        self.packit.count('files_copied')
+        self.assertEqual(record['counters']['files_copied'], len(copied))
+        # still a list of results, as always
+        self.packit.report.append(ret)
+        self.assertEqual(self.packit.report, [True])
+        self.assertEqual(self.packit.report.totals()['files_copied'], len(copied))
+
+    def test_events(self):
+        intro = f'\n#####\n##### RUNNING TEST events ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.packit.prepare_dirs()
+        events = []
+        self.packit.subscribe(events.append)
+        trace = self.packit.subscribe(ChromeTrace())
+        self.assertTrue(self.packit.run_stage(self.packit.copy_project_files))
+        self.packit.unsubscribe(trace)
+        self.assertEqual(events[0], StageStarted('copy_project_files'))
+        self.assertIsInstance(events[-1], StageFinished)
+        self.assertTrue(events[-1].ok)
+        copied = [e for e in events if isinstance(e, FileCopied)]
+        self.assertEqual(len(copied), events[-1].counters['files_copied'])
+        self.assertFalse(any(e.linked for e in copied))
+        # msg is just one more event, even if VERBOSE=0
+        self.assertTrue(any(isinstance(e, Message) and e.verbose == LOG_VERBOSE 
+                            for e in events))
+        tracefile = self.packit.build_dir / 'trace.json'
+        trace.save(tracefile)
+        trace = json.loads(tracefile.read_text())['traceEvents']
+        self.assertEqual([e['ph'] for e in trace if e.get('cat') == 'stage'], 
+                         ['B', 'E'])
+        self.assertEqual(trace[-1]['args']['files_copied'], len(copied))
+
+    def test_sync_requirements(self):
+        requirements = self.basedir / 'BasicTestCase_requirements.txt'
+        _ = requirements.write_text('arrow\n')
+        self.cfg.REQUIREMENTS = str(requirements)
+        self.cfg.PIP_REQUIRED = True
+        self.cfg.SLIM_SITE_PACKAGES = True
+        self.packit.prepare_dirs()
+        old = self.packit.snapshot_sources()
+        _ = requirements.write_text('arrow\nrequests\n')
+        new = self.packit.snapshot_sources()
+        calls = []
+        def stage(name, ret=True):
+            def run(*args):
+                calls.append(name)
+                return ret
+            return mock.Mock(side_effect=run)
+        stages = {'obtain_getpip': stage('obtain_getpip', 'get-pip.py')}
+        for name in ('install_pip', 'install_dependencies', 'slim_site_packages'):
+            stages[name] = stage(name)
+        with mock.patch.multiple(self.packit, **stages):
+            # Pip was slimmed away: installed again, then slimmed again
+            self.packit.pip_is_present = False
+            self.assertTrue(self.packit.sync_changes(old, new))
+            self.assertEqual(calls, ['obtain_getpip', 'install_pip', 
+                                     'install_dependencies', 'slim_site_packages'])
+            stages['install_pip'].assert_called_with('get-pip.py')
+            # a pruned Python needs a full build
+            calls.clear()
+            self.cfg.PRUNE_PYTHON = True
+            self.assertFalse(self.packit.sync_changes(old, new))
+            self.assertEqual(calls, [])
+        requirements.unlink()
+
+    def test_process_usage(self):
+        intro = f'\n#####\n##### RUNNING TEST process_usage ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.packit.prepare_dirs()
+        code = ('import sys; data = bytearray(64 * 1024 * 1024); '
+                'print("\\n".join(map(str, range(30)))); '
+                'sys.exit(int(sys.argv[1]))')
+        def run_child(exitcode):
+            return self.packit.run_subprocess(sys.executable, '-c', code,
+                                              str(exitcode))
+        messages = []
+        self.packit.subscribe(messages.append)
+        self.assertTrue(self.packit.run_stage(run_child, 0))
+        self.assertFalse(self.packit.run_stage(run_child, 3))
+        ok, failed = self.packit.report.stages[-2:]
+        self.assertEqual(ok['processes'][0]['returncode'], 0)
+        self.assertEqual(failed['processes'][0]['returncode'], 3)
+        self.assertGreater(ok['processes'][0]['wall_time'], 0)
+        if hasattr(os, 'wait4'):
+            self.assertGreater(ok['processes'][0]['max_rss'], 64 * 1024 * 1024)
+            self.assertIn('user_time', ok['processes'][0])
+            child = ok['processes'][0]
+            self.assertGreaterEqual(ok['cpu_time'] + 0.001, 
+                                    child['user_time'] + child['system_time'])
+        # the output is in the stage log, and the tail is shown on failure
+        log = self.basedir / 'BasicTestCase_build_logs' / 'run_child.log'
+        self.assertEqual(log.read_text().count('\n29\n'), 2)
+        self.assertIn('exit code 3', log.read_text())
+        tail = [m.args[0] for m in messages if isinstance(m, Message)
+                and m.verbose == LOG_VERBOSE and str(m.args[0]).startswith('    ')]
+        self.assertEqual(tail[-1].split(), [str(n) for n in range(10, 30)])
+        # outside of a stage, nothing is logged or recorded
+        self.assertTrue(run_child(0))
+        self.assertEqual(log.read_text().count('\n29\n'), 2)
+        # a new build starts with new logs
+        self.packit.prepare_dirs()
+        self.assertFalse(log.exists())
+        # a stage is not charged with the CPU time of the other threads
+        def busy():
+            end = time.perf_counter() + 0.5
+            while time.perf_counter() < end:
+                pass
+        def idle():
+            time.sleep(0.5)
+            return True
+        if hasattr(time, 'thread_time'):
+            spinner = threading.Thread(target=busy)
+            spinner.start()
+            self.assertTrue(self.packit.run_stage(idle))
+            spinner.join()
+            self.assertLess(self.packit.report.stages[-1]['cpu_time'], 0.2)
+        # events made the old way still work
+        self.assertIsNone(StageFinished('stage', True, 0, 0, {}).processes)
+        trace = ChromeTrace()
+        trace(ProcessStarted(('python', '-c')))
+        trace(ProcessExited(('python', '-c'), 0, 0.1))
+
+    def test_plan(self):
+        intro = f'\n#####\n##### RUNNING TEST plan ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.HERE = self.basedir / 'PlanTest'
+        self.cfg.PROJECTS = [[str(self.basedir.parent / 'examples' / 'project0'), 
+                              ('main.py', 'main')]]
+        self.cfg.PROJECT_FILES_IGNORE_PATTERNS = ['*.txt']
+        self.cfg.COMPILE = True
+        self.cfg.PYTHON_VERSION = '3.8-32'
+        # a previous build report, to estimate from
+        previous = self.cfg.HERE / 'winpackit_build_old'
+        previous.mkdir(parents=True)
+        report = {'target': '3.8.10-32', 'stages': [
+            {'stage': 'obtain_python', 'wall_time': 5.0, 'cpu_time': 0.1, 
+             'counters': {'bytes_downloaded': 7000000, 'cache_misses': 1}},
+            {'stage': 'copy_project_files', 'wall_time': 2.0, 'cpu_time': 1.0, 
+             'counters': {'bytes_copied': 10, 'files_copied': 1}}]}
+        (previous / 'build_report.json').write_text(json.dumps(report))
+        try:
+            packit = Packit(settings=self.cfg)
+            packit.cache_dir = self.basedir / 'PlanTest_cache'
+            plan = packit.plan()['targets'][0]
+            self.assertFalse(packit.build_dir.exists())
+            self.assertFalse(packit.cache_dir.exists())
+            self.assertEqual(plan['target'], '3.8.10-32')
+            self.assertFalse(plan['downloads'][0]['cached'])
+            self.assertEqual(plan['downloads'][0]['bytes'], 7000000)
+            main = self.basedir.parent / 'examples' / 'project0' / 'main.py'
+            self.assertEqual(plan['copy_projects'], 
+                             {'files': 1, 'bytes': main.stat().st_size, 
+                              'modules': 1}) # readme.txt is ignored
+            self.assertEqual(plan['compile'], {'when': 'now', 'modules': 1})
+            estimates = plan['estimates']
+            self.assertEqual(estimates['stages']['obtain_python'], 5.0)
+            self.assertEqual(estimates['stages']['copy_project_files'], 
+                             round(2.0 * main.stat().st_size / 10, 3))
+        finally:
+            shutil.rmtree(self.cfg.HERE)
+
     @unittest.skip('this will download and check *all* the pythons...')
     def test_get_pythons(self):
         intro = f'\n#####\n##### RUNNING TEST get_pythons ...\n#####\n'
@@ -119,7 +876,245 @@ class BasicTestCase(unittest.TestCase):
             self.assertTrue(self.packit.getfile(url, checksum))
 
 
+class DeltaTestCase(unittest.TestCase):
+    def setUp(self):
+        self.basedir = Path(__file__).resolve().parent / 'testoutput' / 'DeltaTestCase'
+        self.basedir.mkdir(parents=True, exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir)
+
+    def _make_build(self, name, files):
+        build = self.basedir / name
+        for path, content in files.items():
+            (build / path).parent.mkdir(parents=True, exist_ok=True)
+            (build / path).write_text(content)
+        return build
+
+    def test_make_and_apply_delta(self):
+        common = {'install.bat': 'echo off', 'python-3.9.7-embed-amd64/python.exe': 'exe', 
+                  'winpackit_bootstrap/bootstrap.py': 'pass'}
+        old = self._make_build('old', {**common, 'project/main.py': 'old', 
+                                       'project/gone.py': 'gone', 
+                                       'project/same.py': 'same'})
+        new = self._make_build('new', {**common, 'project/main.py': 'new', 
+                                       'project/added/mod.py': 'added', 
+                                       'project/same.py': 'same'})
+        # install-time files must not count as differences
+        (old / 'winpackit_bootstrap' / 'install.log').write_text('log')
+        delta = self.basedir / 'delta.zip'
+        with mock.patch('sys.stdout'):
+            self.assertEqual(make_delta(old, new, delta), 0)
+        with zipfile.ZipFile(delta) as z:
+            self.assertEqual(sorted(z.namelist()), 
+                ['apply_delta.bat', 'winpackit_delta/apply_delta.py', 
+                 'winpackit_delta/delta_manifest.json', 
+                 'winpackit_delta/files/project/added/mod.py', 
+                 'winpackit_delta/files/project/main.py'])
+            z.extractall(old)
+        script = str(old / 'winpackit_delta' / 'apply_delta.py')
+        ret = subprocess.run([sys.executable, script], stdout=subprocess.PIPE)
+        self.assertEqual(ret.returncode, 0)
+        self.assertEqual((old / 'project' / 'main.py').read_text(), 'new')
+        self.assertEqual((old / 'project' / 'added' / 'mod.py').read_text(), 'added')
+        self.assertFalse((old / 'project' / 'gone.py').exists())
+        # applying twice is harmless
+        ret = subprocess.run([sys.executable, script], stdout=subprocess.PIPE)
+        self.assertEqual(ret.returncode, 0)
+
+    def test_analyze(self):
+        site = 'python-3.9.7-embed-amd64/Lib/site-packages/'
+        common = {'install.bat': 'echo off', 
+                  'python-3.9.7-embed-amd64/python.exe': 'x' * 100, 
+                  'python-3.9.7-embed-amd64/python39.zip': 'x' * 1000, 
+                  'winpackit_bootstrap/bootstrap.py': "PROJECY_DIRS = ['project']\n", 
+                  site + 'arrow/__init__.py': 'x' * 10, 
+                  site + 'arrow-1.2.dist-info/RECORD': 
+                      'arrow/__init__.py,,\narrow-1.2.dist-info/RECORD,,\n'}
+        old = self._make_build('old', {**common, 'project/main.py': 'x' * 10})
+        new = self._make_build('new', {**common, 'project/main.py': 'x' * 50, 
+                                       'assets/image.png': 'x' * 500, 
+                                       site + 'stray.py': 'x'})
+        analysis = analyze_build(new, top=2)
+        self.assertEqual(analysis['files'], 9)
+        components = analysis['components']
+        self.assertEqual(components['interpreter'], {'files': 1, 'bytes': 100})
+        self.assertEqual(components['stdlib zip'], {'files': 1, 'bytes': 1000})
+        self.assertEqual(components['site-packages arrow']['files'], 2)
+        self.assertEqual(components['site-packages (no RECORD)']['files'], 1)
+        self.assertEqual(components['project project']['bytes'], 50)
+        self.assertEqual(components['dir assets']['bytes'], 500)
+        self.assertEqual(list(components)[0], 'stdlib zip') # biggest first
+        self.assertEqual(analysis['largest'], 
+                         [['python-3.9.7-embed-amd64/python39.zip', 1000], 
+                          ['assets/image.png', 500]])
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(analyze(new, against=old, as_json=True), 0)
+        diff = json.loads(stdout.write.call_args_list[0][0][0])
+        self.assertEqual(diff['files_change'], 2)
+        self.assertEqual(diff['components']['project project']['bytes_change'], 40)
+        self.assertEqual(diff['components']['dir assets']['files_change'], 1)
+        # a build matrix, by target
+        matrix = self.basedir / 'matrix'
+        shutil.copytree(new, matrix / 'py3.9.7-64')
+        analysis = analyze_build(matrix)
+        self.assertIn('py3.9.7-64: site-packages arrow', analysis['components'])
+
+    def test_apply_delta_conflict(self):
+        old = self._make_build('old', {'install.bat': '', 'main.py': 'old'})
+        new = self._make_build('new', {'install.bat': '', 'main.py': 'new'})
+        delta = self.basedir / 'delta.zip'
+        with mock.patch('sys.stdout'):
+            make_delta(old, new, delta)
+        with zipfile.ZipFile(delta) as z:
+            z.extractall(old)
+        (old / 'main.py').write_text('locally modified')
+        script = str(old / 'winpackit_delta' / 'apply_delta.py')
+        ret = subprocess.run([sys.executable, script], stdout=subprocess.PIPE)
+        self.assertEqual(ret.returncode, 1)
+        self.assertEqual((old / 'main.py').read_text(), 'locally modified')
+        ret = subprocess.run([sys.executable, script, '--force'], 
+                             stdout=subprocess.PIPE)
+        self.assertEqual(ret.returncode, 0)
+        self.assertEqual((old / 'main.py').read_text(), 'new')
+
+    def test_apply_delta_compiled(self):
+        old = self._make_build('old', {'install.bat': '', 'app/main.py': 'old',
+                                       'app/pkg/gone.py': 'gone',
+                                       'app/mod.py': 'mod'})
+        new = self._make_build('new', {'install.bat': '', 'app/main.py': 'new',
+                                       'app/mod.py': 'mod'})
+        delta = self.basedir / 'delta.zip'
+        with mock.patch('sys.stdout'):
+            make_delta(old, new, delta)
+        # as left by install.bat: PYC_ONLY modules, and a __pycache__
+        for name in ('main', 'pkg/gone'):
+            (old / 'app' / f'{name}.py').rename(old / 'app' / f'{name}.pyc')
+        (old / 'app' / '__pycache__').mkdir()
+        (old / 'app' / '__pycache__' / 'mod.cpython-39.pyc').write_text('pyc')
+        with zipfile.ZipFile(delta) as z:
+            z.extractall(old)
+        script = str(old / 'winpackit_delta' / 'apply_delta.py')
+        ret = subprocess.run([sys.executable, script], stdout=subprocess.PIPE)
+        self.assertEqual(ret.returncode, 0, ret.stdout) # no conflicts
+        self.assertEqual((old / 'app' / 'main.py').read_text(), 'new')
+        self.assertFalse((old / 'app' / 'main.pyc').exists()) # stale
+        self.assertFalse((old / 'app' / 'pkg').exists()) # emptied, removed
+        self.assertTrue((old / 'app' / '__pycache__' / 'mod.cpython-39.pyc').exists())
+
+
+class MatrixTestCase(unittest.TestCase):
+    # a delayed build with fake Pythons: no download, no target Python to run
+    def setUp(self):
+        self.cfg = _Cfg()
+        self.cfg.VERBOSE = 0
+        self.cfg.DELAYED_INSTALL = True
+        self.basedir = self.cfg.HERE / 'testoutput'
+        self.basedir.mkdir(exist_ok=True)
+        self.packit = Packit(settings=self.cfg)
+        self.packit.cache_dir = self.basedir / 'MatrixTestCase_cachedir'
+        self.packit.build_dir = self.basedir / 'MatrixTestCase_build'
+        self.packit.cache_dir.mkdir(exist_ok=True)
+
+    def tearDown(self):
+        shutil.rmtree(self.packit.build_dir)
+        shutil.rmtree(self.packit.cache_dir)
+
+    def _fake_python(self, version):
+        url, _ = PY_URL[version]
+        ma, mi = version[:2]
+        with zipfile.ZipFile(self.packit.cache_dir / url.split('/')[-1], 'w') as z:
+            z.writestr(f'python{ma}{mi}._pth', f'python{ma}{mi}.zip\n.\n')
+            z.writestr('python.exe', b'fake executable')
+
+    def test_build_matrix(self):
+        intro = f'\n#####\n##### RUNNING TEST build_matrix ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        self.cfg.PYTHON_VERSION = ['3.8-32', '3.9', '3.8.10-32'] # a duplicate
+        self._fake_python((3, 8, 10, 32))
+        self._fake_python((3, 9, MAX_MICRO_VERSIONS[(3, 9)], 64))
+        with mock.patch('winpackit._md5compare', lambda i, j: True):
+            ret = self.packit.main()
+        py39 = f'py3.9.{MAX_MICRO_VERSIONS[(3, 9)]}-64'
+        self.assertEqual(sorted(ret), ['py3.8.10-32', py39])
+        self.assertTrue(all(all(r) for r in ret.values()))
+        main1 = self.packit.build_dir / 'py3.8.10-32' / 'project0' / 'main.py'
+        main2 = self.packit.build_dir / py39 / 'project0' / 'main.py'
+        self.assertTrue(main1.exists())
+        self.assertTrue(os.path.samefile(main1, main2)) # hardlinked
+        self.assertTrue((self.packit.build_dir / py39 / 'install.bat').exists())
+        self.assertFalse((self.packit.build_dir / 'winpackit_shared').exists())
+        report = json.loads((self.packit.build_dir / 'build_report.json').read_text())
+        self.assertEqual(sorted(report['targets']), ['py3.8.10-32', py39])
+        self.assertEqual(report['targets'][py39]['target'], py39[2:])
+        self.assertEqual(report['totals']['cache_hits'], 2)
+        self.assertTrue((self.packit.build_dir / py39 / 'build_report.json').exists())
+        # each target has its own copy of list settings
+        self.assertEqual(self.cfg.PIP_ARGS.count('--no-warn-script-location'), 1)
+
+    def test_build_matrix_getpip(self):
+        intro = f'\n#####\n##### RUNNING TEST build_matrix_getpip ...\n#####\n'
+        self.packit.msg(0, intro)
+        self.cfg.PIP_REQUIRED = True
+        self.cfg.PYTHON_VERSION = ['3.8-32', '3.9']
+        self._fake_python((3, 8, 10, 32))
+        self._fake_python((3, 9, MAX_MICRO_VERSIONS[(3, 9)], 64))
+        with mock.patch('winpackit._md5compare', lambda i, j: True), \
+             PythonOrgStandIn(self.basedir / 'standin', stdlib_modules=1) as standin:
+            ret = self.packit.main()
+        self.assertTrue(all(all(r) for r in ret.values()))
+        # downloaded once, before the targets start
+        self.assertEqual(standin.server.requests.count(('HEAD', '/get-pip.py')), 1)
+        getpip = (self.basedir / 'standin' / 'get-pip.py').read_bytes()
+        for name in ret:
+            bootstrap = self.packit.build_dir / name / 'winpackit_bootstrap'
+            self.assertEqual((bootstrap / 'get-pip.py').read_bytes(), getpip)
+
+    def test_watch_matrix(self):
+        intro = f'\n#####\n##### RUNNING TEST watch_matrix ...\n#####\n'
+        self.packit.msg(0, intro)
+        project = self.basedir / 'MatrixTestCase_project'
+        shutil.rmtree(project, ignore_errors=True)
+        shutil.copytree(self.cfg.HERE / 'examples/project0', project)
+        _ = (project / 'old.py').write_text('print("old")\n')
+        requirements = project / 'requirements.txt'
+        _ = requirements.write_text('arrow\n')
+        self.cfg.PROJECTS = [[str(project), ('main.py', 'main')]]
+        self.cfg.REQUIREMENTS = str(requirements)
+        self.cfg.PIP_REQUIRED = True
+        self.cfg.PYTHON_VERSION = ['3.8-32', '3.9']
+        self._fake_python((3, 8, 10, 32))
+        self._fake_python((3, 9, MAX_MICRO_VERSIONS[(3, 9)], 64))
+        def edit(interval): # the sources change while we wait
+            _ = (project / 'main.py').write_text('print("changed")\n')
+            _ = (project / 'new.py').write_text('print("new")\n')
+            (project / 'old.py').unlink()
+            _ = requirements.write_text('arrow\nrequests\n')
+        with mock.patch('winpackit._md5compare', lambda i, j: True), \
+             PythonOrgStandIn(self.basedir / 'standin', stdlib_modules=1), \
+             mock.patch('winpackit.time.sleep', edit):
+            ret = self.packit.watch(rounds=1)
+        self.assertTrue(all(all(r) for r in ret.values()))
+        py39 = f'py3.9.{MAX_MICRO_VERSIONS[(3, 9)]}-64'
+        for name in ('py3.8.10-32', py39):
+            target = self.packit.build_dir / name / project.name
+            self.assertEqual((target / 'main.py').read_text(), 'print("changed")\n')
+            self.assertTrue((target / 'new.py').exists())
+            self.assertFalse((target / 'old.py').exists())
+            bootstrap = self.packit.build_dir / name / 'winpackit_bootstrap'
+            self.assertEqual((bootstrap / 'requirements.txt').read_text(), 
+                             'arrow\nrequests\n')
+        # changed files are replaced in each target, the others still shared
+        py38 = self.packit.build_dir / 'py3.8.10-32' / project.name
+        self.assertFalse((py38 / 'main.py').samefile(target / 'main.py'))
+        self.assertTrue((py38 / 'readme.txt').samefile(target / 'readme.txt'))
+        shutil.rmtree(project)
+
+
 class BaseBuildTestCase(unittest.TestCase):
+    cache_dir_name = 'test_cachedir' # shared by the builds, to save downloads
+
     def setUp(self):
         self.cfg = _Cfg()
         self.basedir = self.cfg.HERE / 'testoutput'
@@ -132,7 +1127,7 @@ class BaseBuildTestCase(unittest.TestCase):
         self.packit = Packit(settings=self.cfg)
         intro = f'\n#####\n##### RUNNING TEST {buildir.stem} ...\n#####\n'
         self.packit.msg(1, intro)
-        self.packit.cache_dir = self.basedir / 'test_cachedir'
+        self.packit.cache_dir = self.basedir / self.cache_dir_name
         self.packit.build_dir = self.basedir / buildir
         # skip md5 check to save time
         with mock.patch('winpackit._md5compare', lambda i, j: True):
@@ -227,6 +1222,212 @@ class BuildTestCase(BaseBuildTestCase):
         self.assertTrue(all(ret))
 
 
+class StandInBuildTestCase(BaseBuildTestCase):
+    # a delayed build, downloading from a local stand-in for python.org
+    # fake Pythons and Get-pip must not end up in the shared cache
+    cache_dir_name = 'StandInBuildTestCase_cachedir'
+
+    def tearDown(self):
+        shutil.rmtree(self.basedir / self.cache_dir_name, ignore_errors=True)
+        super().tearDown()
+
+    def test_standin_delayed_build(self):
+        self.cfg.VERBOSE = 1 # debug output would run the (fake) python.exe
+        self.cfg.DELAYED_INSTALL = True
+        self.cfg.PIP_REQUIRED = True
+        self.cfg.USE_CACHE = False
+        self.cfg.ARCHIVE_OUTPUT = True
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        buildir = Path('StandInBuildTestCase_build')
+        self.cfg.TRACE_FILE = 'trace.json'
+        with PythonOrgStandIn(self.basedir / 'standin'):
+            ret = self.start(buildir)
+        self.assertTrue(all(ret))
+        trace = json.loads((self.basedir / buildir / 'trace.json').read_text())
+        self.assertTrue(any(e['name'] == 'download bytes/sec' 
+                            for e in trace['traceEvents']))
+        downloads = [s for s in ret.stages if s['stage'].startswith('obtain_')]
+        self.assertTrue(all(s['counters']['bytes_downloaded'] > 0 
+                            for s in downloads))
+
+
+    def test_standin_catalog_mirror(self):
+        new_python = (3, 99, 0, 64) # unknown to the built-in table
+        with PythonOrgStandIn(self.basedir / 'standin', patch_urls=False, 
+                              versions=[(3, 10, 0, 64), new_python]) as standin:
+            mirror = standin.base_url + '/ftp/python/'
+            self.cfg.PY_CATALOG_MIRROR = mirror
+            packit = Packit(settings=self.cfg)
+            packit.cache_dir = self.basedir / 'StandInBuildTestCase_cachedir'
+            shutil.rmtree(packit.cache_dir, ignore_errors=True)
+            self.assertEqual(packit.parse_pyversion(), new_python)
+            url, checksum = packit.catalog.url(new_python)
+            self.assertTrue(url.startswith(mirror))
+            self.assertEqual(checksum, 
+                             winpackit._hashfile(self.basedir / 'standin' / url.split('/')[-1]))
+            # known releases now come from the mirror too
+            self.assertTrue(packit.catalog.url((3, 10, 0, 64))[0].startswith(mirror))
+            self.assertTrue((packit.cache_dir / PY_CATALOG_FILE).exists())
+            # next time: the cached catalog, and a conditional request only
+            del standin.server.requests[:]
+            packit = Packit(settings=self.cfg)
+            packit.cache_dir = self.basedir / 'StandInBuildTestCase_cachedir'
+            self.assertEqual(packit.parse_pyversion(), new_python)
+            self.assertEqual(standin.server.requests, [('GET', '/ftp/python/')])
+            shutil.rmtree(packit.cache_dir)
+
+
+    def test_standin_remote_cache(self):
+        self.cfg.VERBOSE = 1
+        self.cfg.DELAYED_INSTALL = True
+        self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main')]]
+        reports = []
+        with PythonOrgStandIn(self.basedir / 'standin') as standin:
+            self.cfg.REMOTE_CACHE_URL = standin.base_url + '/remote_cache'
+            # two build machines, with their own empty local caches
+            for node in ('node1', 'node2'):
+                packit = Packit(settings=self.cfg)
+                packit.cache_dir = self.basedir / f'StandInBuildTestCase_{node}'
+                packit.build_dir = self.basedir / f'StandInBuildTestCase_{node}_build'
+                shutil.rmtree(packit.cache_dir, ignore_errors=True)
+                reports.append(packit.main())
+                shutil.rmtree(packit.cache_dir)
+                shutil.rmtree(packit.build_dir)
+            puts = [path for method, path in standin.server.requests 
+                    if method == 'PUT']
+        self.assertTrue(all(reports[0]) and all(reports[1]))
+        pyfile = packit.python_zip.name
+        self.assertEqual(puts, [f'/remote_cache/{pyfile}', 
+                                f'/remote_cache/{pyfile}.md5'])
+        first, second = [[s for s in r.stages if s['stage'] == 'obtain_python'][0]
+                         for r in reports]
+        self.assertEqual(first['counters']['remote_misses'], 1)
+        self.assertIn('bytes_downloaded', first['counters'])
+        self.assertEqual(second['counters']['remote_hits'], 1)
+        self.assertNotIn('bytes_downloaded', second['counters'])
+
+    def test_standin_segmented_download(self):
+        self.cfg.DOWNLOAD_CONNECTIONS = 4
+        bigfile = self.basedir / 'bigfile.bin'
+        _ = bigfile.write_bytes(os.urandom(3 * DOWNLOAD_MIN_SEGMENT + 1000))
+        checksum = winpackit._hashfile(bigfile)
+        packit = Packit(settings=self.cfg)
+        packit.cache_dir = self.basedir / 'StandInBuildTestCase_segments'
+        shutil.rmtree(packit.cache_dir, ignore_errors=True)
+        packit.cache_dir.mkdir()
+        self.cfg.USE_CACHE = False
+        for ranges, requests in ((True, ['GET', 'GET', 'GET', 'HEAD']), 
+                                 (False, ['GET', 'HEAD'])):
+            with PythonOrgStandIn(self.basedir / 'standin', ranges=ranges) as standin:
+                url = standin.add_file('/files/bigfile.bin', bigfile)
+                del standin.server.requests[:]
+                packit.report = BuildReport()
+                filepath = packit.run_stage(packit.getfile, url, checksum)
+                methods = sorted(m for m, p in standin.server.requests)
+            self.assertEqual(methods, requests)
+            self.assertEqual(winpackit._hashfile(filepath), checksum)
+            counters = packit.report.stages[0]['counters']
+            self.assertEqual(counters.get('download_segments'), 3 if ranges else None)
+        shutil.rmtree(packit.cache_dir)
+        bigfile.unlink()
+
+    def test_standin_prefetch(self):
+        py310 = (3, 10, MAX_MICRO_VERSIONS[(3, 10)], 64)
+        py39 = (3, 9, MAX_MICRO_VERSIONS[(3, 9)], 32)
+        cache_dir = self.basedir / 'StandInBuildTestCase_prefetch'
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        requirements = self.basedir / 'requirements-prefetch.txt'
+        _ = requirements.write_text('arrow\n')
+        pip_runs = []
+        def fake_pip(packit, *args, on_line=None):
+            pip_runs.append(args)
+            return True
+        with PythonOrgStandIn(self.basedir / 'standin', versions=[py310, py39]) \
+                as standin, mock.patch('winpackit.Packit.run_subprocess', fake_pip):
+            self.assertEqual(prefetch(['3.10', '3.9-32', '3.10.99'], str(requirements), 
+                                      cache_dir, workers=2), 0)
+            gets = {path for method, path in standin.server.requests 
+                    if method == 'GET'}
+            # again: only Get-pip is downloaded, since it's not versioned
+            del standin.server.requests[:]
+            self.assertEqual(prefetch(['3.10', '3.9-32'], cache_dir=cache_dir), 0)
+            again = {path for method, path in standin.server.requests 
+                     if method == 'GET'}
+        self.assertEqual(len(gets), 3) # one Get-pip for both
+        self.assertEqual(again, {'/get-pip.py'})
+        for version in (py310, py39):
+            url, checksum = winpackit.PY_URL[version]
+            self.assertTrue((cache_dir / url.split('/')[-1]).exists())
+        self.assertTrue((cache_dir / 'get-pip.py').exists())
+        platforms = sorted(args[args.index('--platform') + 1] for args in pip_runs)
+        self.assertEqual(platforms, ['win32', 'win_amd64'])
+        self.assertIn(str(cache_dir / PREFETCH_WHEEL_DIR), pip_runs[0])
+        shutil.rmtree(cache_dir)
+
+    def test_standin_build_server(self):
+        cache_dir = self.basedir / 'StandInBuildTestCase_servercache'
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        server = BuildServer(('127.0.0.1', 0), cache_dir, workers=2, 
+                             here=self.basedir, root=self.basedir.parent)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = 'http://{}:{}/builds'.format(*server.server_address[:2])
+        def request(payload=None, path=''):
+            data = json.dumps(payload).encode() if payload is not None else None
+            try:
+                with urlopen(Request(url + path, data=data)) as response:
+                    return response.status, json.loads(response.read())
+            except HTTPError as e:
+                return e.code, json.loads(e.read())
+        payload = {'HERE': '..', 'VERBOSE': 0, 'DELAYED_INSTALL': True, 
+                   'PYTHON_VERSION': '3.10', 'wait': True,
+                   'PROJECTS': [['examples/project0', ['main.py', 'main']]]}
+        build_dirs = []
+        try:
+            with PythonOrgStandIn(self.basedir / 'standin'):
+                code, first = request(payload)
+                build_dirs.append(first['build_dir'])
+                self.assertEqual(code, 200)
+                self.assertTrue(first['ok'], first)
+                code, second = request(payload)
+                build_dirs.append(second['build_dir'])
+                self.assertTrue(second['ok'], second)
+            self.assertNotEqual(first['build_dir'], second['build_dir'])
+            unpack = [s for s in second['report']['stages'] 
+                      if s['stage'] == 'unpack_python'][0]
+            self.assertGreater(unpack['counters']['files_linked'], 0)
+            self.assertEqual(second['report']['totals']['cache_hits'], 1)
+            self.assertEqual(request(path='/2')[1]['status'], 'done')
+            self.assertEqual(len(request()[1]), 2)
+            self.assertEqual(request({'BOGUS': 1})[0], 400)
+            self.assertEqual(request(path='/99')[0], 404)
+            # no builds outside of the server root
+            outside = dict(payload, HERE='../..')
+            self.assertEqual(request(outside)[0], 400)
+            outside = dict(payload, PROJECTS=[['../..', ['main.py', 'main']]])
+            self.assertEqual(request(outside)[0], 400)
+            # nor programs, files or servers of the client's choice
+            for key, value in (('PROFILE_PYTHON', '/bin/sh'), 
+                               ('TRACE_FILE', '/tmp/trace.json'), 
+                               ('PIP_ARGS', ['--index-url=http://example.com']), 
+                               ('DEPENDENCIES', ['--target=/tmp'])):
+                code, reply = request(dict(payload, **{key: value}))
+                self.assertEqual(code, 400)
+                self.assertIn('not allowed', reply['error'])
+            # finished builds are forgotten
+            server.max_jobs = 1
+            self.assertEqual([job['id'] for job in request()[1]], [2])
+            self.assertEqual(request(path='/1')[0], 404)
+            server.job_ttl = -1
+            self.assertEqual(request()[1], [])
+        finally:
+            server.shutdown()
+            server.server_close()
+            for build_dir in build_dirs:
+                if build_dir:
+                    shutil.rmtree(build_dir, ignore_errors=True)
+            shutil.rmtree(cache_dir)
+
+
 class FailBuildTestCase(BaseBuildTestCase):
     # test various failures
 
@@ -235,14 +1436,14 @@ class FailBuildTestCase(BaseBuildTestCase):
         buildir = Path('BuildTestCase_fail1')
         with mock.patch('winpackit.Packit.obtain_getpip', lambda i: 'bogus'):
             ret = self.start(buildir)
-            self.assertEqual(ret, [True, False, True, True, True, True, True, True, False])
+            self.assertEqual(ret, [True, False, True, True, True, True, True, True, False, True, True, True, True, True])
 
     def test_fail2(self): # this installs a bogus dependency
         self.cfg.PIP_REQUIRED = True
         self.cfg.DEPENDENCIES = ['total_bogus_packet_wont_install']
         buildir = Path('BuildTestCase_fail2')
         ret = self.start(buildir)
-        self.assertEqual(ret, [True, True, False, True, True, True, True, True, True])
+        self.assertEqual(ret, [True, True, False, True, True, True, True, True, True, True, True, True, True, True])
 
     def test_fail3(self): # this packs a non-existent project
         self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main'), 
@@ -250,14 +1451,14 @@ class FailBuildTestCase(BaseBuildTestCase):
                              ['examples/BOGUS']]
         buildir = Path('BuildTestCase_fail3')
         ret = self.start(buildir)
-        self.assertEqual(ret, [True, True, True, False, True, True, True, True, True])
+        self.assertEqual(ret, [True, True, True, False, True, True, True, True, True, True, True, True, True, True])
 
     def test_fail4(self): # this will hit a compile error
         self.cfg.PROJECTS = [['examples/project7', ('main.py', 'main')]]
         self.cfg.COMPILE = True
         buildir = Path('BuildTestCase_fail4')
         ret = self.start(buildir)
-        self.assertEqual(ret, [True, True, True, True, False, True, True, True, True])
+        self.assertEqual(ret, [True, True, True, True, False, True, True, True, True, True, True, True, True, True])
 
     def test_fail5(self): # this packs a non-existent "other" dir
         self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main'), 
@@ -265,14 +1466,14 @@ class FailBuildTestCase(BaseBuildTestCase):
         self.cfg.COPY_DIRS = [['examples/BOGUS']]
         buildir = Path('BuildTestCase_fail5')
         ret = self.start(buildir)
-        self.assertEqual(ret, [True, True, True, True, True, False, True, True, True])
+        self.assertEqual(ret, [True, True, True, True, True, False, True, True, True, True, True, True, True, True])
 
     def test_fail6(self): # this has a bogus entrypoint
         self.cfg.PROJECTS = [['examples/project0', ('main.py', 'main'), 
                                                    ('BOGUS', 'readme')]]
         buildir = Path('BuildTestCase_fail6')
         ret = self.start(buildir)
-        self.assertEqual(ret, [True, True, True, True, True, True, False, True, True])
+        self.assertEqual(ret, [True, True, True, True, True, True, False, True, True, True, True, True, True, True])
 
 
 class BuildTestCaseAllPythons(BaseBuildTestCase):
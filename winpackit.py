@@ -42,21 +42,58 @@ See examples folder for a few kind of projects you can build with this script.
 *** SEE README AND DOCS FOR MORE DETAILS. ***
 """
 
-__all__ = ['BOOTSTRAP_PY_SCRIPT', 'PACKIT_CONFIG_SCRIPT', 'GETPIP_URL', 'PY_URL',
+__all__ = ['APPLY_DELTA_PY_SCRIPT', 'BOOTSTRAP_PY_SCRIPT', 'PACKIT_CONFIG_SCRIPT', 
+           'ARCHIVE_COMPRESS_LEVEL', 'ARCHIVE_STORE_SUFFIXES', 
+           'ARCHIVE_STREAM_SIZE', 'DELTA_IGNORE_PATTERNS', 'GETPIP_URL', 'PY_URL',
+           'BUILD_MANIFEST_FILE', 'MANIFEST_IGNORE_PATTERNS', 
+           'PROCESS_LOG_SUFFIX', 'PROCESS_LOG_TAIL', 
+           'DOWNLOAD_CHUNK_SIZE', 'DOWNLOAD_MIN_SEGMENT', 
            'LOG_ALWAYS', 'LOG_DEBUG', 'LOG_VERBOSE', 
            'MAX_MAJOR_VERSION', 'MAX_MICRO_VERSIONS', 'MAX_MINOR_VERSIONS', 
-           'MIN_TARGET_VERSION', 'Packit', 'make_runner_script', 'version']
+           'MIN_TARGET_VERSION', 'PRUNE_ALWAYS_KEEP', 'PRUNE_DLL_USERS', 
+           'SERVE_DEFAULT_ADDRESS', 'SERVE_MAX_QUEUED', 
+           'SERVE_JOB_TTL', 'SERVE_MAX_JOBS', 'SERVE_REQUEST_SETTINGS', 'SLIM_DEFAULT_PATTERNS', 
+           'PY_CATALOG_FILE', 'WATCH_INTERVAL', 'PyVersionCatalog', 
+           'BuildReport', 'ChromeTrace', 'DownloadProgress', 'FileCopied', 
+           'Message', 'ModuleCompiled', 'ProcessExited', 'ProcessStarted', 
+           'StageFinished', 'StageStarted', 'Packit', 'WarmCache', 
+           'CacheBackend', 'LocalCache', 'HTTPCache', 'REMOTE_PIP_DIRS', 
+           'REMOTE_PIP_MANIFEST', 'OFFLINE_INDEX_DIR', 'PREFETCH_WHEEL_DIR', 
+           'ANALYZE_TOP', 'BuildServer', 'analyze', 'analyze_build', 
+           'export_index', 'make_delta', 'make_runner_script', 
+           'prefetch', 'serve', 'version']
 
 import sys
 import os
 import shutil
 import zipfile
 import time
+import zlib
+import struct
 import subprocess
+import sysconfig
+import modulefinder
+import ast
+import json
+import fnmatch
+import argparse
+import copy
+import threading
+import re
+import bisect
+import csv
+import posixpath
 
 from pathlib import Path
-from hashlib import md5
-from urllib.request import urlretrieve
+from collections import namedtuple, deque
+from types import SimpleNamespace
+from hashlib import md5, sha256
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from urllib.request import urlretrieve, urlopen, Request
+from urllib.error import HTTPError
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 
 version = '0.8.0'
 
@@ -179,14 +216,66 @@ GETPIP_URL = {(3,5): ('https://bootstrap.pypa.io/pip/3.5/get-pip.py', '')}
 # default Get-pip for newest, supported versions
 GETPIP_DEFAULT_URL = ('https://bootstrap.pypa.io/get-pip.py', '')
 
+# segmented downloads (see DOWNLOAD_CONNECTIONS): smaller files, or parts, 
+# are not worth another connection
+DOWNLOAD_MIN_SEGMENT = 1024 * 1024
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+
+# build analyzer (python -m winpackit --analyze): largest files listed
+ANALYZE_TOP = 20
+
+# the Python version catalog, as refreshed from PY_CATALOG_MIRROR (in the cache)
+PY_CATALOG_FILE = 'py_catalog.json'
+
+# pip's own cache dirs (in winpackit_cache), mirrored in REMOTE_CACHE_URL
+REMOTE_PIP_DIRS = ('http', 'http-v2', 'wheels')
+REMOTE_PIP_MANIFEST = 'pip_cache.json'
+
+# offline builds: a static "simple" index (see export_index), in the cache
+OFFLINE_INDEX_DIR = 'index'
+INDEX_SKIP_DIRS = (OFFLINE_INDEX_DIR, 'layers', 'winpackit_templates')
+INDEX_SDIST_SUFFIXES = ('.tar.gz', '.tar.bz2', '.zip')
+
+# prefetch: the wheels downloaded for each target Python, in the cache
+PREFETCH_WHEEL_DIR = 'wheelhouse'
+
+# watch mode (runner --watch): seconds between two scans of the project files
+WATCH_INTERVAL = 0.5
+
+# stdlib pruning: modules the embedded interpreter needs no matter what 
+# the entry points import (their own imports will be followed too)
+PRUNE_ALWAYS_KEEP = ('encodings', 'codecs', 'io', 'abc', 'site', 'os', 'stat', 
+                     'ntpath', 'genericpath', '_collections_abc', 
+                     '_sitebuiltins', 'zipimport', 'runpy', 'warnings', 
+                     'traceback', 'linecache')
+# stdlib pruning: runtime dlls (name prefix) and the extension modules using them
+PRUNE_DLL_USERS = {'sqlite3': ('_sqlite3',), 
+                   'libssl': ('_ssl',), 
+                   'libcrypto': ('_ssl', '_hashlib'), 
+                   'libffi': ('_ctypes',)}
+# site-packages slimming: RECORD paths, or whole distributions (by name), 
+# removed by default. Compiled modules for other Pythons are removed too.
+SLIM_DEFAULT_PATTERNS = ('pip', 'setuptools', 'wheel', # not needed at run time
+                         'tests/*', '*/tests/*', 'docs/*', '*/docs/*', 
+                         '*/include/*', '*.h', '*.hpp', '*.c', '*.cpp', 
+                         '*.pyx', '*.pxd', '*.pyi')
+
 # users will run this script on their own pc to finalize installation 
 BOOTSTRAP_PY_SCRIPT = """\
 # -*- coding: utf-8 -*-
 # This was created by the WinPackIt script - please do not remove
 
 import os
+import re
+import sys
+import json
+import time
+import hashlib
+import platform
 import subprocess
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 HERE = Path(__file__).parent.resolve()
 os.chdir(str(HERE))
@@ -200,12 +289,171 @@ HAVE_PIP = {have_pip} # Pip "delayed install"
 HAVE_DEPS = {have_deps} # dependencies "delayed install"
 WELCOME_MESSAGE = {welcome}
 GOODBYE_MESSAGE = {goodbye}
+# completed steps, with a hash of their inputs: run "install.bat --force" 
+# to redo them anyway
+STATE_FILE = HERE / 'install_state.json'
+FORCE = '--force' in sys.argv[1:]
+STATE_LOCK = threading.Lock()
+# check the build against its manifest first: 'hash', 'size' (quick) or ''
+MANIFEST_FILE = HERE / 'build_manifest.json'
+VERIFY = {verify}
+if '--no-verify' in sys.argv[1:]:
+    VERIFY = ''
+elif '--verify-size' in sys.argv[1:]:
+    VERIFY = 'size'
+# per-step timing and size telemetry, to be sent back for support
+REPORT_FILE = HERE / 'install_report.json'
+REPORT = dict()
+DOWNLOAD_UNITS = dict(B=1, kB=1000, KB=1000, MB=1000**2, GB=1000**3)
+
+def load_state():
+    try:
+        with open(str(STATE_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return dict()
+
+STATE = load_state()
+
+def hash_inputs(*items):
+    # items are strings, or Paths to be hashed by size/mtime
+    h = hashlib.md5()
+    for item in items:
+        h.update(str(item).encode('utf-8'))
+        if isinstance(item, Path):
+            try:
+                st = item.stat()
+                h.update(('%d %d' % (st.st_size, st.st_mtime_ns)).encode())
+            except OSError:
+                h.update(b'missing')
+    return h.hexdigest()
+
+def pip_inputs():
+    return hash_inputs(PY_DIR, HERE / 'get-pip.py')
+
+def dependencies_inputs():
+    return hash_inputs(PY_DIR, HERE / 'requirements.txt')
+
+def compile_inputs():
+    pys = []
+    for d in PROJECY_DIRS:
+        pys.extend(sorted(Path(HERE.parent / d).resolve().glob('**/*.py')))
+    return hash_inputs(PYC_ONLY, *pys)
+
+def shortcut_inputs():
+    lnks = [BUILD_DIR / (name + '.lnk') for pth, name, flavor in ENTRY_POINTS]
+    return hash_inputs(BUILD_DIR, ENTRY_POINTS, *lnks)
+
+def step_dirs(name):
+    # where each step is expected to write
+    if name in ('pip', 'dependencies'):
+        return [PY_DIR]
+    if name == 'compile':
+        return [HERE.parent / d for d in PROJECY_DIRS]
+    return []
+
+def disk_usage(dirs):
+    size = 0
+    for d in dirs:
+        for root, subdirs, files in os.walk(str(d)):
+            for name in files:
+                try:
+                    size += os.path.getsize(os.path.join(root, name))
+                except OSError:
+                    pass
+    return size
+
+def parse_log(log, offset):
+    # figure out downloads and compiled files from the step output
+    with open(log, 'rb') as f:
+        f.seek(offset)
+        output = f.read().decode('utf-8', 'replace')
+    downloaded = 0
+    for size, unit in re.findall(r'Downloading \\S+ \\(([\\d.]+) ?([kKMG]?B)\\)', 
+                                 output):
+        downloaded += int(float(size) * DOWNLOAD_UNITS[unit])
+    compiled = len(re.findall('^Compiling ', output, re.MULTILINE))
+    return downloaded, compiled
+
+def run_step(name, step, inputs, log):
+    # Run step(log, info), unless it was already done with the same inputs 
+    # (no inputs: always run, and never remembered). Return True if the 
+    # step is done.
+    info = dict(skipped=False, ok=True, duration=0.0, exit_codes=[], 
+                bytes_downloaded=0, files_compiled=0, disk_usage_added=0)
+    with STATE_LOCK:
+        REPORT[name] = info
+        done = inputs is not None and STATE.get(name) == inputs()
+    if done and not FORCE:
+        info['skipped'] = True
+        with open(log, 'a') as f:
+            f.write('*** %s: already done, skipped ***\\n\\n' % name)
+        return True
+    size = disk_usage(step_dirs(name))
+    offset = os.path.getsize(log) if os.path.exists(log) else 0
+    start = time.time()
+    ok = step(log, info)
+    info['duration'] = round(time.time() - start, 3)
+    info['ok'] = ok
+    info['disk_usage_added'] = disk_usage(step_dirs(name)) - size
+    info['bytes_downloaded'], info['files_compiled'] = parse_log(log, offset)
+    with STATE_LOCK:
+        if ok and inputs is not None:
+            STATE[name] = inputs()  # inputs *after*, eg no py in pyc-only
+        else:
+            STATE.pop(name, None)
+        with open(str(STATE_FILE), 'w') as f:
+            json.dump(STATE, f, indent=1)
+    return ok
+
+def file_md5(path):
+    h = hashlib.md5()
+    with open(str(path), 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def check_file(item):
+    # return what's wrong with a file of the manifest, if anything
+    path, (size, md5) = item
+    filepath = BUILD_DIR / path
+    try:
+        if filepath.stat().st_size != size:
+            return '%s: wrong size' % path
+    except OSError:
+        if PYC_ONLY and filepath.suffix == '.py' and \\
+                filepath.with_suffix('.pyc').exists():
+            return None  # compiled and removed by a previous install
+        return '%s: missing' % path
+    if VERIFY == 'hash' and file_md5(filepath) != md5:
+        return '%s: corrupted' % path
+    return None
 
-def compile_pycs():
+def verify_build(log, info):
+    if not VERIFY or not MANIFEST_FILE.exists():
+        with open(log, 'a') as f:
+            f.write('*** verify build: no check required ***\\n\\n')
+        return True
+    with open(str(MANIFEST_FILE), 'r') as f:
+        files = json.load(f)['files']
+    # hashlib releases the GIL: threads are enough
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4)) as ex:
+        problems = [p for p in ex.map(check_file, sorted(files.items())) if p]
+    info['files_checked'] = len(files)
+    with open(log, 'a') as f:
+        f.write('*** verify build (%s) ***\\n' % VERIFY)
+        for problem in problems:
+            f.write(problem + '\\n')
+        f.write('%d files checked, %d problems\\n' % (len(files), len(problems)))
+        f.write('*******************\\n\\n')
+    return not problems
+
+def compile_pycs(log, info):
     if not COMPILE_PYCS:
-        return
+        return True
     pyexec = str(PY_DIR / 'python.exe')
-    with open('install.log', 'a') as f:
+    ok = True
+    with open(log, 'a') as f:
         f.write('*** compile py modules ***\\n')
         f.flush()
         for d in PROJECY_DIRS:
@@ -213,38 +461,49 @@ def compile_pycs():
             args = [pyexec, '-m', 'compileall', str(d)]
             if PYC_ONLY:
                 args.append('-b')
-            subprocess.run(args, stdout=f, stderr=subprocess.STDOUT)
+            ret = subprocess.run(args, stdout=f, stderr=subprocess.STDOUT)
+            info['exit_codes'].append(ret.returncode)
+            ok = ok and ret.returncode == 0
             if PYC_ONLY:
                 for py in d.glob('**/*.py'):
                     py.unlink()
         f.write('*******************\\n\\n')
+    return ok
 
-def install_dependencies():
+def install_dependencies(log, info):
     if not HAVE_DEPS:
-        return
+        return True
     pyexec = str(PY_DIR / 'python.exe')
-    with open('install.log', 'a') as f:
+    with open(log, 'a') as f:
         f.write('*** install dependencies ***\\n')
         f.flush()
-        subprocess.run([pyexec, '-m', 'pip', 'install', 
-                        '-r', 'requirements.txt', '--no-cache'], 
-                       stdout=f, stderr=subprocess.STDOUT)
+        ret = subprocess.run([pyexec, '-m', 'pip', 'install', 
+                              '-r', 'requirements.txt', '--no-cache'], 
+                             stdout=f, stderr=subprocess.STDOUT)
         f.write('*******************\\n\\n')
+    info['exit_codes'].append(ret.returncode)
+    return ret.returncode == 0
 
-def install_pip():
+def install_pip(log, info):
     if not HAVE_PIP:
-        return
+        return True
     pyexec = str(PY_DIR / 'python.exe')
-    with open('install.log', 'a') as f:
+    with open(log, 'a') as f:
         f.write('*** install pip ***\\n')
         f.flush()
-        subprocess.run([pyexec, 'get-pip.py', '--no-cache'], 
-                       stdout=f, stderr=subprocess.STDOUT)
+        ret = subprocess.run([pyexec, 'get-pip.py', '--no-cache'], 
+                             stdout=f, stderr=subprocess.STDOUT)
         f.write('*******************\\n\\n')
+    info['exit_codes'].append(ret.returncode)
+    return ret.returncode == 0
+
+def install_pip_and_dependencies(log):
+    if run_step('pip', install_pip, pip_inputs, log):
+        run_step('dependencies', install_dependencies, dependencies_inputs, log)
 
-def make_shortcut():
+def make_shortcut(log, info):
     if not ENTRY_POINTS:
-        return
+        return True
     # There is no way to make a Windows shortcut from vanilla Python.
     # So we make a PowerShell script on-the-fly instead, and subprocess.run it.
     # Also, no f-strings here, to be 3.5-compatible.
@@ -271,8 +530,55 @@ def make_shortcut():
         pass
     with open('make_shortcuts.ps1', 'a') as f:
         f.write(ps)
-    subprocess.run(['powershell', '-ExecutionPolicy', 'Bypass', 
-                   './make_shortcuts.ps1'])
+    with open(log, 'a') as f:
+        f.write('*** make shortcuts ***\\n')
+        f.flush()
+        ret = subprocess.run(['powershell', '-ExecutionPolicy', 'Bypass', 
+                             './make_shortcuts.ps1'], 
+                             stdout=f, stderr=subprocess.STDOUT)
+        f.write('*******************\\n\\n')
+    info['exit_codes'].append(ret.returncode)
+    return ret.returncode == 0
+
+def run_steps():
+    # Pip must come before the dependencies, but compiling and making 
+    # shortcuts don't need Pip: so we run them at the same time. Each step 
+    # writes its own log, and the logs are merged into install.log at the end.
+    # But first, we check that the build is not damaged: every time, since 
+    # files may have been damaged after a previous run.
+    steps = ((install_pip_and_dependencies, 'install_pip.log'), 
+             (run_step, 'compile', compile_pycs, compile_inputs, 
+              'install_compile.log'), 
+             (run_step, 'shortcuts', make_shortcut, shortcut_inputs, 
+              'install_shortcuts.log'))
+    threads = [threading.Thread(target=step[0], args=step[1:]) 
+               for step in steps]
+    start = time.time()
+    verified = run_step('verify', verify_build, None, 'install_verify.log')
+    if verified:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    else:
+        print('ERROR: this copy of the program is damaged, see install.log.')
+        print('Please get a new copy. Nothing was installed.')
+    report = dict(started=time.strftime('%Y-%m-%d %H:%M:%S', 
+                                        time.localtime(start)), 
+                  duration=round(time.time() - start, 3), 
+                  python=PY_DIR.name, platform=platform.platform(), 
+                  force=FORCE, steps=REPORT)
+    with open(str(REPORT_FILE), 'w') as f:
+        json.dump(report, f, indent=1)
+    with open('install.log', 'a') as f:
+        for log in ['install_verify.log'] + [step[-1] for step in steps]:
+            try:
+                with open(log, 'r') as step_log:
+                    f.write(step_log.read())
+                os.remove(log)
+            except OSError:
+                pass
+    return verified
 
 def post_deploy_action():
     # Insert your custom post-deploy actions here.
@@ -282,39 +588,1006 @@ def post_deploy_action():
 
 if __name__ == '__main__':
     print(WELCOME_MESSAGE)
-    install_pip()
-    install_dependencies()
-    compile_pycs()
-    make_shortcut()
-    post_deploy_action()
+    if run_steps():
+        post_deploy_action()
     input(GOODBYE_MESSAGE)
 
 """
 
+# archive output: compression level, and file types not worth compressing
+ARCHIVE_COMPRESS_LEVEL = 6
+ARCHIVE_STORE_SUFFIXES = ('.zip', '.whl', '.gz', '.tgz', '.bz2', '.xz', '.7z', 
+                          '.png', '.jpg', '.jpeg', '.gif', '.mp3', '.mp4')
+# files above this size are compressed chunk by chunk, not in memory
+ARCHIVE_STREAM_SIZE = 32 * 1024 * 1024
+
+# files written at install time, not part of a build (see make_delta)
+DELTA_IGNORE_PATTERNS = ('*.lnk', 'winpackit_bootstrap/install*.log', 
+                         'winpackit_bootstrap/install_state.json', 
+                         'winpackit_bootstrap/install_report.json', 
+                         'build_report.json', 
+                         'winpackit_bootstrap/make_shortcuts.ps1', 
+                         'apply_delta.bat', 'winpackit_delta/*')
+
+# the output of the external processes goes into a log for each stage, 
+# in a dir next to the build (named as the build, plus this suffix); 
+# on failure, the last lines are shown
+PROCESS_LOG_SUFFIX = '_logs'
+PROCESS_LOG_TAIL = 20
+
+# build manifest, checked by the bootstrap script (see VERIFY_INSTALL)
+BUILD_MANIFEST_FILE = 'build_manifest.json'
+MANIFEST_IGNORE_PATTERNS = DELTA_IGNORE_PATTERNS + (
+                               f'winpackit_bootstrap/{BUILD_MANIFEST_FILE}',)
+
+# users will run this script to update a build with a delta package
+APPLY_DELTA_PY_SCRIPT = """\
+# -*- coding: utf-8 -*-
+# This was created by the WinPackIt script. 
+# It updates a WinPackIt build from {old} to {new}.
+# Usage: put the content of the delta package in the build directory, 
+# then run "apply_delta.bat" (or "python apply_delta.py [BUILD_DIR] [--force]").
+
+import os
+import sys
+import json
+import shutil
+import hashlib
+from pathlib import Path
+
+HERE = Path(__file__).parent.resolve()
+FILES_DIR = HERE / 'files'
+FORCE = '--force' in sys.argv[1:]
+
+def md5(path):
+    h = hashlib.md5()
+    with open(str(path), 'rb') as f:
+        buffer = f.read(65536)
+        while buffer:
+            h.update(buffer)
+            buffer = f.read(65536)
+    return h.hexdigest()
+
+def current_hash(path):
+    try:
+        return md5(path)
+    except OSError:
+        return None
+
+def compiled_files(path):
+    # what install.bat may have compiled a module into: a pyc next to it 
+    # (and then the py is gone, in a PYC_ONLY build), or in __pycache__
+    if path.suffix != '.py':
+        return []
+    pycache = path.parent / '__pycache__'
+    return [p for p in [path.with_suffix('.pyc')] + 
+            sorted(pycache.glob(path.stem + '.*.pyc')) if p.exists()]
+
+def compiled_away(path):
+    # a py that install.bat compiled and removed (PYC_ONLY): we can't tell 
+    # if it was changed, but the pyc comes from the original build
+    return path.suffix == '.py' and not path.exists() and \
+           path.with_suffix('.pyc').exists()
+
+def remove_empty_dirs(build_dir, dirs):
+    for d in sorted(set(dirs), key=lambda d: len(d.parts), reverse=True):
+        while d != build_dir and d.is_dir() and not any(d.iterdir()):
+            d.rmdir()
+            d = d.parent
+
+def main(build_dir):
+    with open(str(HERE / 'delta_manifest.json'), 'r') as f:
+        delta = json.load(f)
+    # Check before: changed/deleted files must be those of the old build 
+    # (or those of the new build, if the delta was already applied).
+    conflicts = []
+    for path, (old_hash, size, new_hash) in delta['change'].items():
+        if compiled_away(build_dir / path):
+            continue
+        if current_hash(build_dir / path) not in (old_hash, new_hash):
+            conflicts.append(path)
+    for path, old_hash in delta['delete'].items():
+        if current_hash(build_dir / path) not in (old_hash, None):
+            conflicts.append(path)
+    if conflicts:
+        print('These files do not match the original build:')
+        for path in conflicts:
+            print('   ', path)
+        if not FORCE:
+            print('Nothing was changed. Run with "--force" to update anyway.')
+            return 1
+    # Update.
+    # Compiled modules of changed or deleted py files are stale: 
+    # "install.bat" will compile the changed ones again.
+    errors = []
+    updated = set(delta['add']) | set(delta['change'])
+    def stale(dest):
+        return [pyc for pyc in compiled_files(dest) 
+                if pyc.relative_to(build_dir).as_posix() not in updated]
+    for path in list(delta['add']) + list(delta['change']):
+        dest = build_dir / path
+        try:
+            for pyc in stale(dest):
+                pyc.unlink()
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(str(FILES_DIR / path), str(dest))
+        except OSError as e:
+            errors.append('%s (%s)' % (path, e))
+    removed_from = []
+    for path in delta['delete']:
+        dest = build_dir / path
+        try:
+            for pyc in stale(dest):
+                pyc.unlink()
+                removed_from.append(pyc.parent)
+            dest.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            errors.append('%s (%s)' % (path, e))
+        removed_from.append(dest.parent)
+    remove_empty_dirs(build_dir, removed_from)
+    # Check after.
+    for path, (size, new_hash) in delta['add'].items():
+        if current_hash(build_dir / path) != new_hash:
+            errors.append('%s (bad hash)' % path)
+    for path, (old_hash, size, new_hash) in delta['change'].items():
+        if current_hash(build_dir / path) != new_hash:
+            errors.append('%s (bad hash)' % path)
+    if errors:
+        print('ERROR: update failed for these files:')
+        for err in errors:
+            print('   ', err)
+        return 1
+    print('Build successfully updated to %s.' % delta['new'])
+    print('Please run "install.bat" again to complete the update.')
+    return 0
+
+if __name__ == '__main__':
+    args = [a for a in sys.argv[1:] if a != '--force']
+    build_dir = Path(args[0]).resolve() if args else HERE.parent
+    sys.exit(main(build_dir))
+"""
+
 # output levels
 LOG_ALWAYS = 0
 LOG_VERBOSE = 1
 LOG_DEBUG = 2
 
-def _md5compare(filepath, md5hash=''):
-    if not md5hash:
-        return True
+# build events, sent to the Packit subscribers (see Packit.subscribe)
+Message = namedtuple('Message', 'verbose args')
+StageStarted = namedtuple('StageStarted', 'stage')
+StageFinished = namedtuple('StageFinished', 
+                           'stage ok wall_time cpu_time counters processes')
+DownloadProgress = namedtuple('DownloadProgress', 
+                              'filename done total bytes_per_sec')
+FileCopied = namedtuple('FileCopied', 'src dst size linked')
+ModuleCompiled = namedtuple('ModuleCompiled', 'path')
+ProcessStarted = namedtuple('ProcessStarted', 'args')
+ProcessExited = namedtuple('ProcessExited', 'args returncode duration usage')
+# fields added later have a default, for the subscribers making their own
+StageFinished.__new__.__defaults__ = (None,) # processes
+ProcessExited.__new__.__defaults__ = (None,) # usage
+
+def _hashfile(filepath):
     with open(filepath,'rb') as fp:
         h = md5()
-        buffer = fp.read(4096)
+        buffer = fp.read(65536)
         while len(buffer) > 0:
             h.update(buffer)
-            buffer = fp.read(4096)
-    return h.hexdigest() == md5hash
+            buffer = fp.read(65536)
+    return h.hexdigest()
+
+def _md5compare(filepath, md5hash=''):
+    if not md5hash:
+        return True
+    return _hashfile(filepath) == md5hash
+
+def _thread_cpu_time():
+    """CPU time used so far by the current thread: other builds may run 
+    in other threads (a build matrix, the build server). Python 3.6 has 
+    no time.thread_time, so we fall back to the whole process."""
+    return getattr(time, 'thread_time', time.process_time)()
+
+def _processes_cpu_time(processes):
+    """Total CPU time of the external processes recorded by run_subprocess."""
+    return sum(p.get('user_time', 0) + p.get('system_time', 0) 
+               for p in processes)
+
+def _wait_process(proc):
+    """Wait for proc to exit (its output already read), and return its 
+    resource usage: user_time, system_time (seconds), max_rss, read_bytes, 
+    write_bytes (bytes). Best effort: what the platform won't tell 
+    is left out."""
+    usage = {}
+    if not hasattr(os, 'wait4'):
+        proc.wait()
+        if sys.platform == 'win32':
+            usage.update(_win_process_usage(proc._handle))
+        return usage
+    try:
+        io = Path(f'/proc/{proc.pid}/io')
+        if hasattr(os, 'waitid') and io.exists():
+            # exited but not reaped yet: Linux still keeps its I/O counters
+            os.waitid(os.P_PID, proc.pid, os.WEXITED | os.WNOWAIT)
+            try:
+                counters = dict(line.split(': ') 
+                                for line in io.read_text().splitlines())
+                usage['read_bytes'] = int(counters['rchar'])
+                usage['write_bytes'] = int(counters['wchar'])
+            except (OSError, KeyError, ValueError):
+                pass
+        pid, status, ru = os.wait4(proc.pid, 0)
+    except ChildProcessError: # reaped by someone else
+        proc.wait()
+        return usage
+    if os.WIFSIGNALED(status):
+        proc.returncode = -os.WTERMSIG(status)
+    else:
+        proc.returncode = os.WEXITSTATUS(status)
+    # ru_maxrss is in kilobytes, but in bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    usage.update(user_time=round(ru.ru_utime, 3), 
+                 system_time=round(ru.ru_stime, 3), 
+                 max_rss=ru.ru_maxrss * scale)
+    return usage
+
+def _win_process_usage(handle):
+    """Resource usage of an exited Windows process, as in _wait_process."""
+    import ctypes
+    from ctypes import wintypes
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD)] + \
+                   [(name, ctypes.c_size_t) for name in (
+                    'PeakWorkingSetSize', 'WorkingSetSize', 
+                    'QuotaPeakPagedPoolUsage', 'QuotaPagedPoolUsage', 
+                    'QuotaPeakNonPagedPoolUsage', 'QuotaNonPagedPoolUsage', 
+                    'PagefileUsage', 'PeakPagefileUsage')]
+    class IO_COUNTERS(ctypes.Structure):
+        _fields_ = [(name, ctypes.c_ulonglong) for name in (
+                    'ReadOperationCount', 'WriteOperationCount', 
+                    'OtherOperationCount', 'ReadTransferCount', 
+                    'WriteTransferCount', 'OtherTransferCount')]
+    usage = {}
+    try:
+        kernel32 = ctypes.WinDLL('kernel32')
+        handle = wintypes.HANDLE(int(handle))
+        # creation, exit, kernel, user times, in 100 ns units
+        times = [wintypes.FILETIME() for _ in range(4)]
+        if kernel32.GetProcessTimes(handle, *[ctypes.byref(t) for t in times]):
+            kernel, user = [(t.dwHighDateTime << 32 | t.dwLowDateTime) / 10**7 
+                            for t in times[2:]]
+            usage.update(user_time=round(user, 3), system_time=round(kernel, 3))
+        memory = PROCESS_MEMORY_COUNTERS()
+        memory.cb = ctypes.sizeof(memory)
+        if kernel32.K32GetProcessMemoryInfo(handle, ctypes.byref(memory), 
+                                            memory.cb):
+            usage['max_rss'] = memory.PeakWorkingSetSize
+        io = IO_COUNTERS()
+        if kernel32.GetProcessIoCounters(handle, ctypes.byref(io)):
+            usage['read_bytes'] = io.ReadTransferCount
+            usage['write_bytes'] = io.WriteTransferCount
+    except (OSError, AttributeError):
+        pass
+    return usage
+
+def _tree_size(root):
+    """Return (number of files, total bytes) for the root tree."""
+    files, size = 0, 0
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, name))
+    return files, size
+
+def _walk_tree(root, ignore=None):
+    """Yield the files shutil.copytree(root, ..., ignore=ignore) would copy."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if ignore is not None:
+            ignored = ignore(dirpath, dirnames + filenames)
+            dirnames[:] = [name for name in dirnames if name not in ignored]
+            filenames = [name for name in filenames if name not in ignored]
+        for name in filenames:
+            yield Path(dirpath) / name
+
+def _link_or_copy(src, dst):
+    """A copytree copy_function: hardlink if possible, else copy."""
+    try:
+        os.link(src, dst)
+    except OSError: # eg, different volumes, or FAT32
+        shutil.copy2(src, dst)
+    return dst
+
+def _complete_settings(settings):
+    """Return the settings, with the default value of each setting they 
+    lack: runner scripts made by older versions don't know the newer ones."""
+    missing = {key: copy.deepcopy(value) for key, value in _DEFAULT_SETTINGS.items() 
+               if not hasattr(settings, key)}
+    if not missing:
+        return settings
+    if hasattr(settings, '_asdict'): # the runner's namedtuple, read-only
+        return SimpleNamespace(**settings._asdict(), **missing)
+    for key, value in missing.items():
+        setattr(settings, key, value)
+    return settings
+
+def _clone_settings(settings, **changes):
+    """Return a copy of the settings with some values changed. 
+    List values are copied too, since Packit appends to some of them."""
+    if hasattr(settings, '_replace'): # the runner's namedtuple
+        clone = settings._replace(**changes)
+        return clone._replace(**{k: list(v) for k, v in clone._asdict().items()
+                                 if isinstance(v, list)})
+    clone = copy.copy(settings)
+    for k, v in vars(clone).items():
+        if isinstance(v, list):
+            setattr(clone, k, list(v))
+    for k, v in changes.items():
+        setattr(clone, k, v)
+    return clone
+
+def _snapshot_tree(root):
+    """Return a {relative posix path: (size, mtime)} dict for the root tree."""
+    snapshot = {}
+    for path in _walk_tree(root):
+        st = path.stat()
+        snapshot[path.relative_to(root).as_posix()] = (st.st_size, 
+                                                       st.st_mtime_ns)
+    return snapshot
+
+def _scan_tree(root, workers=8):
+    """Return a {relative posix path: size} dict for the root tree. 
+    Directories are scanned in parallel (os.scandir releases the GIL)."""
+    root = str(root)
+    def scan(dirpath):
+        files, subdirs = {}, []
+        with os.scandir(dirpath) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    files[entry.path] = entry.stat(follow_symlinks=False).st_size
+        return files, subdirs
+    sizes = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {executor.submit(scan, root)}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                files, subdirs = future.result()
+                sizes.update(files)
+                pending.update(executor.submit(scan, d) for d in subdirs)
+    start = len(root) + 1
+    return {path[start:].replace(os.sep, '/'): size 
+            for path, size in sizes.items()}
+
+def _canonical_name(name):
+    """Normalize a distribution name, as in PEP 503."""
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+def _dist_filename(path):
+    """Return the (project name, filename) of a cached distribution: a wheel 
+    or an sdist, by its name; or a wheel body in Pip's http cache, by its 
+    metadata. Return None if path is not a distribution."""
+    name = path.name
+    if name.endswith('.whl'):
+        return name.split('-')[0], name
+    for suffix in INDEX_SDIST_SUFFIXES:
+        found = re.match(r'^(.+?)-\d[^-]*$', name[:-len(suffix)])
+        if name.endswith(suffix) and found:
+            return found.group(1), name
+    if not name.endswith('.body') or not zipfile.is_zipfile(path):
+        return None
+    with zipfile.ZipFile(path) as z:
+        wheel = [n for n in z.namelist() 
+                 if n.count('/') == 1 and n.endswith('.dist-info/WHEEL')]
+        if not wheel:
+            return None
+        tags = [line.split(':', 1)[1].strip() 
+                for line in z.read(wheel[0]).decode().splitlines() 
+                if line.startswith('Tag:')]
+    if not tags:
+        return None
+    project, dist_version = wheel[0][:-len('.dist-info/WHEEL')].rsplit('-', 1)
+    # compressed tag sets, as in "py2.py3-none-any"
+    tag = '-'.join('.'.join(dict.fromkeys(t.split('-')[n] for t in tags)) 
+                   for n in range(3))
+    return project, f'{project}-{dist_version}-{tag}.whl'
+
+def _build_manifest(root, ignore=()):
+    """Return a {relative posix path: (size, md5)} manifest of the root tree, 
+    leaving out paths matching the ignore patterns. Files are hashed 
+    in parallel (hashlib releases the GIL)."""
+    root = Path(root)
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in filenames:
+            path = Path(dirpath) / name
+            rel = path.relative_to(root).as_posix()
+            if not any(fnmatch.fnmatch(rel, pattern) for pattern in ignore):
+                paths.append((rel, path))
+    with ThreadPoolExecutor() as pool:
+        hashes = pool.map(_hashfile, [path for rel, path in paths])
+        return {rel: (path.stat().st_size, h) 
+                for (rel, path), h in zip(paths, hashes)}
+
+def _collect_imports(filepath):
+    """Return a list of (module, fromlist) for the absolute imports of 
+    a module, not counting those inside functions and classes."""
+    with open(filepath, 'rb') as f:
+        tree = ast.parse(f.read(), str(filepath))
+    imports = []
+    def visit(nodes):
+        for node in nodes:
+            if isinstance(node, ast.Import):
+                imports.extend((alias.name, []) for alias in node.names)
+            elif isinstance(node, ast.ImportFrom):
+                if node.level == 0:
+                    imports.append((node.module, 
+                                    [alias.name for alias in node.names]))
+            elif not isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, 
+                                       ast.ClassDef)):
+                for field in ('body', 'orelse', 'finalbody', 'handlers'):
+                    visit(getattr(node, field, []))
+    visit(tree.body)
+    return imports
+
+def _parse_importtime(output):
+    """Parse the stderr output of `python -X importtime`.
+    Return a list of (module, self time, cumulative time) in microseconds."""
+    times = []
+    for line in output.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        try:
+            self_us, cumulative_us, name = line[12:].split('|')
+            times.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError: # the header line
+            pass
+    return times
+
+def _read_import_log(filepath):
+    """Return the set of top-level module names found in an import log: 
+    either a plain list of module names, one per line, or the stderr output 
+    of a `python -X importtime` run."""
+    names = set()
+    with open(filepath, 'r') as f:
+        for line in f:
+            if line.startswith('import time:'):
+                line = line.split('|')[-1]
+            line = line.strip()
+            if not line or line.startswith(('#', 'imported package')):
+                continue
+            names.add(line.split('.')[0])
+    return names
+
+def _dos_datetime(timestamp):
+    """Return the (time, date) zip header fields for a timestamp."""
+    y, mo, d, h, mi, s = time.localtime(timestamp)[:6]
+    if y < 1980:
+        y, mo, d, h, mi, s = 1980, 1, 1, 0, 0, 0
+    return (h << 11) | (mi << 5) | (s // 2), ((y - 1980) << 9) | (mo << 5) | d
+
+def _read_raw_entry(zippath, info):
+    """Return the compressed data of a zip member, as it is."""
+    with open(zippath, 'rb') as f:
+        f.seek(info.header_offset)
+        header = f.read(30)
+        name_len, extra_len = struct.unpack('<HH', header[26:30])
+        f.seek(name_len + extra_len, os.SEEK_CUR)
+        return f.read(info.compress_size)
+
+def _deflate_file(filepath, store=False, raw=None):
+    """Read and compress filepath in memory (to be run on a thread pool: 
+    zlib releases the GIL). Return (data, crc, size, method). 
+    raw=(zippath, zipinfo) is the same file in another zip: if unchanged, 
+    its compressed data will be copied instead."""
+    with open(filepath, 'rb') as f:
+        data = f.read()
+    crc, size = zlib.crc32(data), len(data)
+    if raw is not None:
+        zippath, info = raw
+        if (crc, size) == (info.CRC, info.file_size):
+            return (_read_raw_entry(zippath, info), crc, size, 
+                    info.compress_type)
+    if store:
+        return data, crc, size, zipfile.ZIP_STORED
+    c = zlib.compressobj(ARCHIVE_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+    return c.compress(data) + c.flush(), crc, size, zipfile.ZIP_DEFLATED
+
+class _ZipWriter:
+    """A minimal zip file writer. Unlike zipfile.ZipFile, it takes entries 
+    already compressed (so that compression can happen elsewhere, 
+    e.g. on a thread pool). Zip64 extensions are used when needed."""
+    def __init__(self, filepath):
+        self.fp = open(filepath, 'wb')
+        self.entries = [] # central directory data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _local_header(self, name, method, date_time, crc, csize, size, 
+                      zip64=False):
+        extra = b''
+        if zip64:
+            extra = struct.pack('<HHQQ', 1, 16, size, csize)
+            csize = size = 0xFFFFFFFF
+        return struct.pack('<IHHHHHIIIHH', 0x04034b50, 45 if zip64 else 20, 
+                           0x800, method, *date_time, crc, csize, size, 
+                           len(name), len(extra)) + name + extra
+
+    def write_entry(self, arcname, data, crc, size, method, mtime):
+        """Write an entry, with data already compressed."""
+        name = arcname.encode('utf-8')
+        date_time = _dos_datetime(mtime)
+        zip64 = max(size, len(data)) >= 0xFFFFFFFF
+        offset = self.fp.tell()
+        self.fp.write(self._local_header(name, method, date_time, crc, 
+                                         len(data), size, zip64))
+        self.fp.write(data)
+        self.entries.append((name, method, date_time, crc, len(data), size, 
+                             offset))
+
+    def write_stream(self, arcname, filepath, store=False):
+        """Compress and write a (large) file chunk by chunk."""
+        name = arcname.encode('utf-8')
+        date_time = _dos_datetime(os.stat(filepath).st_mtime)
+        method = zipfile.ZIP_STORED if store else zipfile.ZIP_DEFLATED
+        offset = self.fp.tell()
+        # placeholder header, patched later: we can't know sizes yet
+        self.fp.write(self._local_header(name, method, date_time, 0, 0, 0, 
+                                         zip64=True))
+        c = zlib.compressobj(ARCHIVE_COMPRESS_LEVEL, zlib.DEFLATED, -15)
+        crc = size = csize = 0
+        with open(filepath, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                crc = zlib.crc32(chunk, crc)
+                size += len(chunk)
+                if not store:
+                    chunk = c.compress(chunk)
+                self.fp.write(chunk)
+                csize += len(chunk)
+            if not store:
+                chunk = c.flush()
+                self.fp.write(chunk)
+                csize += len(chunk)
+        end = self.fp.tell()
+        self.fp.seek(offset)
+        self.fp.write(self._local_header(name, method, date_time, crc, csize, 
+                                         size, zip64=True))
+        self.fp.seek(end)
+        self.entries.append((name, method, date_time, crc, csize, size, offset))
+
+    def close(self):
+        """Write the central directory and close the file."""
+        if self.fp is None:
+            return
+        cd_offset = self.fp.tell()
+        for name, method, date_time, crc, csize, size, offset in self.entries:
+            extra = b''
+            for value in (size, csize, offset): # this order, by the specs
+                if value >= 0xFFFFFFFF:
+                    extra += struct.pack('<Q', value)
+            if extra:
+                extra = struct.pack('<HH', 1, len(extra)) + extra
+                size, csize, offset = (min(v, 0xFFFFFFFF) 
+                                       for v in (size, csize, offset))
+            version = 45 if extra else 20
+            self.fp.write(struct.pack('<IHHHHHHIIIHHHHHII', 0x02014b50, 
+                                      version, version, 0x800, method, 
+                                      *date_time, crc, csize, size, len(name), 
+                                      len(extra), 0, 0, 0, 0, offset))
+            self.fp.write(name + extra)
+        cd_end = self.fp.tell()
+        count, cd_size = len(self.entries), cd_end - cd_offset
+        if max(cd_offset, cd_size) >= 0xFFFFFFFF or count >= 0xFFFF:
+            self.fp.write(struct.pack('<IQHHIIQQQQ', 0x06064b50, 44, 45, 45, 
+                                      0, 0, count, count, cd_size, cd_offset))
+            self.fp.write(struct.pack('<IIQI', 0x07064b50, 0, cd_end, 1))
+            count = min(count, 0xFFFF)
+            cd_offset, cd_size = (min(v, 0xFFFFFFFF) for v in (cd_offset, cd_size))
+        self.fp.write(struct.pack('<IHHHHIIH', 0x06054b50, 0, 0, count, count, 
+                                  cd_size, cd_offset, 0))
+        self.fp.close()
+        self.fp = None
+
+class PyVersionCatalog:
+    """The embeddable Pythons we know about: a sorted index of the available 
+    versions for each (major, minor, arch), and their (url, md5). 
+    The built-in PY_URL table is always there; more entries may come from 
+    a mirror of https://www.python.org/ftp/python/ (see refresh), and be 
+    saved to/loaded from a json file."""
+    def __init__(self, entries=None):
+        self.entries = {} # (ma, mi, mc, arch) -> (url, md5)
+        self.micros = {} # (ma, mi, arch) -> sorted micro versions
+        self.minors = {} # (ma, arch) -> sorted minor versions
+        self.majors = [] # sorted major versions
+        self.validators = {} # url -> (etag, last-modified), see refresh
+        self.update(PY_URL if entries is None else entries)
+
+    def update(self, entries):
+        """Add entries to the catalog. A new entry with no md5 checksum 
+        keeps the one we already know for the same version."""
+        for version, (url, checksum) in entries.items():
+            ma, mi, mc, arch = version = tuple(version)
+            if not checksum and version in self.entries:
+                checksum = self.entries[version][1]
+            self.entries[version] = (url, checksum)
+            for index, key, value in ((self.micros, (ma, mi, arch), mc), 
+                                      (self.minors, (ma, arch), mi)):
+                values = index.setdefault(key, [])
+                if value not in values:
+                    bisect.insort(values, value)
+            if ma not in self.majors:
+                bisect.insort(self.majors, ma)
+
+    @staticmethod
+    def _closest(values, wanted):
+        """Pick wanted from the sorted values; if not there, the next one 
+        (eg, a missing release), or the last one if wanted is too high."""
+        if wanted is None or wanted > values[-1]:
+            return values[-1]
+        return values[bisect.bisect_left(values, wanted)]
+
+    def latest(self, ma, mi=None, mc=None, arch=64):
+        """Return the best available (ma, mi, mc, arch) version: the latest 
+        one if minor/micro numbers are None."""
+        ma = self._closest(self.majors, ma)
+        mi = self._closest(self.minors[(ma, arch)], mi)
+        mc = self._closest(self.micros[(ma, mi, arch)], mc)
+        return ma, mi, mc, arch
+
+    def url(self, version):
+        """Return (url, md5) for version."""
+        return self.entries[tuple(version)]
+
+    def save(self, filepath):
+        data = {'entries': [list(version) + list(value) 
+                            for version, value in sorted(self.entries.items())], 
+                'validators': self.validators}
+        _ = Path(filepath).write_text(json.dumps(data, indent=1))
+
+    def load(self, filepath):
+        """Add the entries saved in filepath."""
+        data = json.loads(Path(filepath).read_text())
+        self.update({tuple(item[:4]): tuple(item[4:]) 
+                     for item in data['entries']})
+        self.validators.update({url: tuple(value) for url, value 
+                                in data.get('validators', {}).items()})
+
+    def _fetch(self, url):
+        """GET url with a conditional request. Return the text, 
+        or None if not modified since last time."""
+        request = Request(url)
+        etag, modified = self.validators.get(url, (None, None))
+        if etag:
+            request.add_header('If-None-Match', etag)
+        if modified:
+            request.add_header('If-Modified-Since', modified)
+        try:
+            with urlopen(request, timeout=30) as response:
+                text = response.read().decode('utf-8', 'replace')
+                self.validators[url] = (response.headers.get('ETag'), 
+                                        response.headers.get('Last-Modified'))
+        except HTTPError as e:
+            if e.code == 304:
+                return None
+            raise
+        return text
+
+    def refresh(self, mirror_url):
+        """Update the catalog from a mirror of https://www.python.org/ftp/python/, 
+        reading its directory listings (one "X.Y.Z/" dir for each version). 
+        Only listings changed since last time are downloaded, and only the 
+        version dirs with embeddable packages still unknown. An md5 checksum 
+        is read from a "<package>.md5" file, if the mirror has one. 
+        Return the number of entries found, or None if nothing changed."""
+        root = mirror_url.rstrip('/') + '/'
+        listing = self._fetch(root)
+        if listing is None:
+            return None
+        found = {}
+        for href in re.findall(r'href="([^"?#]+)"', listing):
+            # links may be relative or absolute
+            match = re.search(r'(?:^|/)(\d+)\.(\d+)\.(\d+)/$', href)
+            if not match:
+                continue
+            ma, mi, mc = version = tuple(map(int, match.groups()))
+            if version < MIN_TARGET_VERSION:
+                continue
+            known = [self.entries.get((ma, mi, mc, arch), ('', ''))[0] 
+                     for arch in (32, 64)]
+            if all(url.startswith(root) for url in known):
+                continue  # releases don't change
+            version_dir = root + f'{ma}.{mi}.{mc}/'
+            files = self._fetch(version_dir)
+            if files is None:
+                continue
+            files = {href.split('/')[-1] 
+                     for href in re.findall(r'href="([^"?#]+)"', files)}
+            for arch, suffix in ((64, 'amd64'), (32, 'win32')):
+                name = f'python-{ma}.{mi}.{mc}-embed-{suffix}.zip'
+                if name not in files:
+                    continue
+                checksum = ''
+                if name + '.md5' in files:
+                    text = self._fetch(version_dir + name + '.md5') or ''
+                    checksum = (re.findall(r'[0-9a-f]{32}', text) or [''])[0]
+                found[(ma, mi, mc, arch)] = (version_dir + name, checksum)
+        self.update(found)
+        return len(found)
+
+
+class BuildReport(list):
+    """The outcome of Packit.main: the list of stage results (True/False) 
+    as always, plus a record for each stage run, with timings and counters."""
+    def __init__(self):
+        super().__init__()
+        self.target = None # the target Python, once known
+        self.stages = [] # stage records, in order
+        self.output = {} # sizes of the build products
+        self.slimmed = {} # files and bytes removed from each distribution
+
+    def totals(self):
+        """Sum timings and counters over all the stages."""
+        totals = {'wall_time': 0.0, 'cpu_time': 0.0}
+        for stage in self.stages:
+            for key in ('wall_time', 'cpu_time'):
+                totals[key] = round(totals[key] + stage[key], 3)
+            for key, value in stage['counters'].items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def as_dict(self):
+        return {'winpackit_version': version, 'target': self.target, 
+                'ok': all(self), 'stages': self.stages, 
+                'totals': self.totals(), 'output': self.output, 
+                'slimmed': self.slimmed}
+
+    def save(self, filepath):
+        _ = Path(filepath).write_text(json.dumps(self.as_dict(), indent=2))
+
+
+class ChromeTrace:
+    """A subscriber recording the build events in the Chrome trace format: 
+    load the file in chrome://tracing or https://ui.perfetto.dev."""
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+        self.start = time.perf_counter()
+        self.files = {'copied': 0, 'compiled': 0}
+        self.files_ts = None # last "files" counter event
+
+    def __call__(self, event):
+        ts = round((time.perf_counter() - self.start) * 1000000)
+        base = {'pid': os.getpid(), 'tid': threading.get_ident(), 'ts': ts}
+        if isinstance(event, StageStarted):
+            record = dict(base, name=event.stage, cat='stage', ph='B')
+        elif isinstance(event, StageFinished):
+            record = dict(base, name=event.stage, cat='stage', ph='E', 
+                          args=dict(event.counters, ok=event.ok))
+        elif isinstance(event, (ProcessStarted, ProcessExited)):
+            name = ' '.join([Path(str(event.args[0])).name] + 
+                            [str(arg) for arg in event.args[1:3]])
+            if isinstance(event, ProcessStarted):
+                record = dict(base, name=name, cat='process', ph='B', 
+                              args={'args': [str(arg) for arg in event.args]})
+            else:
+                record = dict(base, name=name, cat='process', ph='E', 
+                              args=dict(event.usage or {}, 
+                                        returncode=event.returncode))
+        elif isinstance(event, DownloadProgress):
+            record = dict(base, name='download bytes/sec', ph='C', 
+                          args={event.filename: event.bytes_per_sec})
+        elif isinstance(event, (FileCopied, ModuleCompiled)):
+            with self.lock:
+                key = 'copied' if isinstance(event, FileCopied) else 'compiled'
+                self.files[key] += 1
+                # one counter event every 10 ms is enough
+                if self.files_ts is not None and ts - self.files_ts < 10000:
+                    return
+                self.files_ts = ts
+                record = dict(base, name='files', ph='C', args=dict(self.files))
+        else:
+            return
+        with self.lock:
+            self.events.append(record)
+
+    def save(self, filepath):
+        with self.lock:
+            trace = {'traceEvents': self.events, 'displayTimeUnit': 'ms'}
+            _ = Path(filepath).write_text(json.dumps(trace))
+
+
+class WarmCache:
+    """What a build server (see serve) keeps warm from one build to the 
+    next: the md5 checksums of the cached downloads, the embeddable 
+    packages already extracted, and the compiled modules. Shared by all 
+    the builds of the server, thread-safe."""
+    def __init__(self, templates_dir):
+        self.templates_dir = Path(templates_dir)
+        self.lock = threading.Lock()
+        self.file_locks = {} # one for each file, see file_lock
+        self.checksums = {} # filepath -> (mtime, size, md5)
+        self.templates = {} # (filepath, mtime, size) -> extracted dir
+        self.pycs = {} # (version, pyc_only, source md5, mtime, size) -> pyc
+
+    def file_lock(self, key):
+        """Return the lock guarding the key (eg, a file in the cache)."""
+        with self.lock:
+            return self.file_locks.setdefault(str(key), threading.Lock())
+
+    def md5compare(self, filepath, md5hash=''):
+        """As _md5compare, but hash again only if the file has changed."""
+        if not md5hash:
+            return True
+        st = os.stat(filepath)
+        with self.lock:
+            known = self.checksums.get(str(filepath))
+        if known is None or known[:2] != (st.st_mtime_ns, st.st_size):
+            known = (st.st_mtime_ns, st.st_size, _hashfile(filepath))
+            with self.lock:
+                self.checksums[str(filepath)] = known
+        return known[2] == md5hash
+
+    def template(self, pyfile):
+        """Return a dir with the embeddable package pyfile extracted, 
+        extracting it only the first time."""
+        st = os.stat(pyfile)
+        key = (str(pyfile), st.st_mtime_ns, st.st_size)
+        with self.file_lock(('template', pyfile)):
+            template = self.templates.get(key)
+            if template is None or not template.exists():
+                template = self.templates_dir / Path(pyfile).stem
+                shutil.rmtree(template, ignore_errors=True)
+                with zipfile.ZipFile(pyfile, 'r') as python_zip:
+                    python_zip.extractall(template)
+                self.templates[key] = template
+            return template
+
+    @staticmethod
+    def _pyc_key(version, pyc_only, source):
+        st = source.stat()
+        return (tuple(version[:2]), pyc_only, _hashfile(source), 
+                int(st.st_mtime), st.st_size)
+
+    def restore_pycs(self, version, pyc_only, sources):
+        """Write the known compiled modules for the (source, pyc) pairs. 
+        Return how many."""
+        restored = 0
+        for source, pyc in sources:
+            with self.lock:
+                data = self.pycs.get(self._pyc_key(version, pyc_only, source))
+            if data is not None:
+                pyc.parent.mkdir(exist_ok=True)
+                _ = pyc.write_bytes(data)
+                restored += 1
+        return restored
+
+    def store_pycs(self, version, pyc_only, sources):
+        """Remember the compiled modules for the (source, pyc) pairs."""
+        for source, pyc in sources:
+            if pyc.exists():
+                key = self._pyc_key(version, pyc_only, source)
+                data = pyc.read_bytes()
+                with self.lock:
+                    self.pycs[key] = data
+
+
+class CacheBackend:
+    """A cache shared by many build machines (see REMOTE_CACHE_URL), 
+    holding copies of the files in winpackit_cache. Each file is stored 
+    along with a "<name>.md5" file, checked when the file is fetched. 
+    Subclasses implement _download and _upload."""
+    @staticmethod
+    def from_url(url):
+        """Return the backend for url: http(s), or else a path 
+        (eg, a network share)."""
+        if url.startswith(('http://', 'https://')):
+            return HTTPCache(url)
+        return LocalCache(url)
+
+    def _download(self, name, dest):
+        """Copy name into dest. Return False if not found."""
+        raise NotImplementedError
+
+    def _upload(self, name, filepath):
+        """Copy filepath into the cache as name."""
+        raise NotImplementedError
+
+    def fetch(self, name, dest):
+        """Copy the cached file name into dest. Return False if not found, 
+        or if it does not match its md5."""
+        dest = Path(dest)
+        tmp = dest.with_name(dest.name + '.part')
+        md5file = dest.with_name(dest.name + '.md5.part')
+        try:
+            if not (self._download(name + '.md5', md5file) 
+                    and self._download(name, tmp)):
+                return False
+            if _hashfile(tmp) != md5file.read_text().strip():
+                return False
+            os.replace(tmp, dest)
+            return True
+        finally:
+            for path in (tmp, md5file):
+                if path.exists():
+                    path.unlink()
+
+    def store(self, name, filepath):
+        """Copy filepath into the cache as name (the md5 file goes last, 
+        so that nobody will fetch a file still being written)."""
+        filepath = Path(filepath)
+        md5file = filepath.with_name(filepath.name + '.md5.upload')
+        _ = md5file.write_text(_hashfile(filepath))
+        try:
+            self._upload(name, filepath)
+            self._upload(name + '.md5', md5file)
+        finally:
+            md5file.unlink()
+
+
+class LocalCache(CacheBackend):
+    """A shared cache in a directory."""
+    def __init__(self, root):
+        self.root = Path(root)
+
+    def _download(self, name, dest):
+        src = self.root / name
+        if not src.is_file():
+            return False
+        shutil.copyfile(src, dest)
+        return True
+
+    def _upload(self, name, filepath):
+        dest = self.root / name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dest.with_name(f'{dest.name}.{threading.get_ident()}.part')
+        shutil.copyfile(filepath, tmp)
+        os.replace(tmp, dest)
+
+
+class HTTPCache(CacheBackend):
+    """A shared cache on a web server accepting GET and PUT requests."""
+    def __init__(self, base_url):
+        self.base_url = base_url.rstrip('/')
+
+    def _url(self, name):
+        return f'{self.base_url}/{quote(name)}'
+
+    def _download(self, name, dest):
+        try:
+            with urlopen(self._url(name), timeout=60) as response, \
+                 open(dest, 'wb') as f:
+                shutil.copyfileobj(response, f, 1024 * 1024)
+        except HTTPError as e:
+            if e.code == 404:
+                return False
+            raise
+        return True
+
+    def _upload(self, name, filepath):
+        with open(filepath, 'rb') as f:
+            request = Request(self._url(name), data=f, method='PUT')
+            request.add_header('Content-Length', str(os.path.getsize(filepath)))
+            request.add_header('Content-Type', 'application/octet-stream')
+            with urlopen(request, timeout=300) as response:
+                response.read()
+
 
 class Packit:
-    def __init__(self, settings):
+    def __init__(self, settings, cache_dir=None):
         # "settings": in normal usage, a namedtuple used by the runner script
         # to collect all settings together (see make_runner_script below). 
         # If you are importing this class you may pass whatever object
         # your need with the same api (eg a dataclass).
-        self.cfg = settings
-        self.cache_dir = self.cfg.HERE / 'winpackit_cache'
+        # "cache_dir": default <HERE>/winpackit_cache; pass it here, rather 
+        # than changing it later, since the Pip cache goes there too.
+        self.cfg = _complete_settings(settings)
+        self.cache_dir = Path(cache_dir or self.cfg.HERE / 'winpackit_cache')
         # our project configuration, to be figured out later
         self.proj_dirs = None # project dir(s)
         self.copy_dirs = None # other non-project dir(s)
@@ -324,69 +1597,258 @@ class Packit:
         self.bootstrap_dir = None # "service" dir for bootstrap script
         self.target_py_version = None # Python version
         self.target_py_dir = None # Python root directory
+        self.python_zip = None # the embeddable package, once obtained
+        self.getpip_file = None # Get-pip, if already obtained (see main_matrix)
+        self.catalog = None # available Pythons, see load_catalog
+        self.warm = None # a WarmCache, when running in a build server
+        self.remote = None # a CacheBackend, if REMOTE_CACHE_URL is set
+        if self.cfg.REMOTE_CACHE_URL:
+            self.remote = CacheBackend.from_url(self.cfg.REMOTE_CACHE_URL)
+        self.uploads = [] # background uploads to the remote cache
+        self.upload_executor = None
         self.pip_is_present = False # if Pip is currently installed
         self.target_proj_dirs = None # project dir(s)
         self.target_proj_dirs_relative = None # id, relative to self.build_dir
         self.target_copy_dirs = None # other non-project dir(s)
         self.entry_points = None # entry points (to both "projects" and "copy")
+        self.entry_point_sources = None # original py/pyw entry point modules
         # options to delay installing things on target:
         self.delay_have_pip = False
         self.delay_have_dependencies = False
         self.delay_compile_pycs = False
-        self.cfg.PIP_ARGS.append('--no-warn-script-location')
+        # build report, and counters for the stage currently running
+        self.report = BuildReport()
+        self.counters = None
+        self.counters_lock = threading.Lock()
+        self.processes = None # external processes run by the current stage
+        self.stage_name = None
+        self.log_lock = threading.Lock()
+        # build matrix machinery: dirs already copied once for all targets
+        self.shared_dirs = {} # original dir -> staged copy
+        self.targets = {} # target name -> Packit instance, after main_matrix
+        self.msg_prefix = '' # tells targets apart in the output
+        # build events subscribers: console output is just one of them
+        self.subscribers = [self.print_message]
+        # settings may be shared with other instances (see main_matrix), 
+        # so we don't add the same thing twice
+        pip_args = ['--no-warn-script-location']
         if self.cfg.PIP_CACHE:
-            self.cfg.PIP_ARGS.append(f'--cache-dir={self.cache_dir}')
+            pip_args.append(f'--cache-dir={self.cache_dir}')
         else:
-            self.cfg.PIP_ARGS.append('--no-cache-dir')
+            pip_args.append('--no-cache-dir')
         if self.cfg.VERBOSE == 0:
-            self.cfg.PIP_ARGS.append('-qqq')
-        self.cfg.PROJECT_FILES_IGNORE_PATTERNS.append('__pycache__')
+            pip_args.append('-qqq')
+        if self.cfg.OFFLINE:
+            pip_args.append('--disable-pip-version-check')
+        for arg in pip_args:
+            if arg not in self.cfg.PIP_ARGS:
+                self.cfg.PIP_ARGS.append(arg)
+        if '__pycache__' not in self.cfg.PROJECT_FILES_IGNORE_PATTERNS:
+            self.cfg.PROJECT_FILES_IGNORE_PATTERNS.append('__pycache__')
         
+    def subscribe(self, subscriber):
+        """Add a subscriber: a callable that will be called with each build 
+        event (Message, StageStarted, DownloadProgress etc.), from the 
+        thread where the event happens. Return the subscriber."""
+        self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self.subscribers.remove(subscriber)
+
+    def emit(self, event):
+        """Send event to all the subscribers."""
+        for subscriber in self.subscribers:
+            subscriber(event)
+
     def msg(self, verbose, *args):
-        if verbose <= self.cfg.VERBOSE:
-            print(*args, flush=True)
+        self.emit(Message(verbose, args))
+
+    def print_message(self, event):
+        """The default subscriber: print messages, according to VERBOSE."""
+        if not isinstance(event, Message) or event.verbose > self.cfg.VERBOSE:
+            return
+        args = event.args
+        if self.msg_prefix:
+            text = ' '.join(str(arg) for arg in args)
+            args = ['\n'.join(self.msg_prefix + line 
+                              for line in text.split('\n'))]
+        print(*args, flush=True)
+
+    def count(self, key, amount=1):
+        """Add amount to a counter of the stage currently running. 
+        Counters end up in the build report."""
+        if self.counters is None:
+            return
+        with self.counters_lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
 
-    def run_subprocess(self, *args):
-        """Call subprocess.run(args). Return False if retcode!=0."""
-        ret = subprocess.run(args)
-        if ret.returncode != 0:
+    def run_stage(self, stage, *args):
+        """Call stage(*args), recording timings and counters 
+        in the build report. The CPU time is that of the current thread, 
+        plus that of the external processes run by the stage. 
+        Return the stage result."""
+        self.counters = {}
+        self.processes = []
+        self.stage_name = stage.__name__
+        self.emit(StageStarted(stage.__name__))
+        wall, cpu = time.perf_counter(), _thread_cpu_time()
+        ret = stage(*args)
+        record = {
+            'stage': stage.__name__, 
+            # only install stages have a result, downloads return a path
+            'ok': ret if isinstance(ret, bool) else None,
+            'wall_time': round(time.perf_counter() - wall, 3), 
+            'cpu_time': round(_thread_cpu_time() - cpu 
+                              + _processes_cpu_time(self.processes), 3), 
+            'counters': self.counters, 
+            'processes': self.processes}
+        self.report.stages.append(record)
+        self.counters = self.processes = self.stage_name = None
+        self.emit(StageFinished(**record))
+        return ret
+
+    def _process_log(self):
+        """Return the log file for the output of the external processes 
+        run by the current stage, or None outside of a stage (or of a build)."""
+        if self.stage_name is None or not self.build_dir.is_dir():
+            return None
+        log_dir = self.build_dir.with_name(self.build_dir.name + 
+                                           PROCESS_LOG_SUFFIX)
+        log_dir.mkdir(exist_ok=True)
+        return log_dir / f'{self.stage_name}.log'
+
+    def run_subprocess(self, *args, on_line=None):
+        """Run args in a subprocess. Return False if retcode!=0. 
+        The process output goes into the stage log (see PROCESS_LOG_SUFFIX), 
+        and is passed to on_line, if given, line by line (or else shown 
+        in debug mode). Timings, peak memory and I/O of the process are 
+        recorded in the build report."""
+        self.emit(ProcessStarted(args))
+        log = self._process_log()
+        tail = deque(maxlen=PROCESS_LOG_TAIL)
+        start = time.perf_counter()
+        with open(log or os.devnull, 'a', encoding='utf-8') as f, \
+             subprocess.Popen(args, stdout=subprocess.PIPE, 
+                              stderr=subprocess.STDOUT, 
+                              universal_newlines=True, 
+                              errors='replace') as proc:
+            with self.log_lock:
+                f.write(f'*** {subprocess.list2cmdline(map(str, args))} ***\n')
+            for line in proc.stdout:
+                line = line.rstrip('\n')
+                tail.append(line)
+                with self.log_lock:
+                    f.write(line + '\n')
+                if on_line is None:
+                    self.msg(LOG_DEBUG, line)
+                else:
+                    on_line(line)
+            usage = _wait_process(proc)
+            returncode = proc.returncode
+            usage['wall_time'] = round(time.perf_counter() - start, 3)
+            with self.log_lock:
+                f.write(f'*** exit code {returncode}, {usage} ***\n\n')
+        self.emit(ProcessExited(args, returncode, usage['wall_time'], usage))
+        if self.processes is not None:
+            with self.counters_lock:
+                self.processes.append(dict(
+                    command=' '.join([Path(str(args[0])).name] + 
+                                     [str(arg) for arg in args[1:3]]), 
+                    returncode=returncode, **usage))
+        if returncode != 0:
             self.msg(LOG_VERBOSE, 'ERROR: unable to run external process!')
             self.msg(LOG_VERBOSE, 'Process was called with arguments:')
-            self.msg(LOG_VERBOSE, ret.args)
-            self.msg(LOG_VERBOSE, f'Process exited with code {ret.returncode}.')
+            self.msg(LOG_VERBOSE, args)
+            self.msg(LOG_VERBOSE, f'Process exited with code {returncode}.')
+            if tail:
+                where = f' (full output in {log})' if log else ''
+                self.msg(LOG_VERBOSE, f'Last lines of the output{where}:')
+                self.msg(LOG_VERBOSE, '\n'.join('    ' + line for line in tail))
             return False
-        self.msg(LOG_DEBUG, '->Debug - ret.args:', ret.args)
+        self.msg(LOG_DEBUG, '->Debug - ret.args:', args)
+        self.msg(LOG_DEBUG, '->Debug - resource usage:', usage)
         return True
 
-    def getfile(self, fileurl, checksum='', on_error_abort=False):
-        """Download fileurl into self.cache_dir. 
+    def _download_hook(self, filename):
+        """Return a urlretrieve reporthook sending DownloadProgress events, 
+        at most every 0.1 seconds."""
+        start = last = time.perf_counter()
+        def hook(blocks, blocksize, totalsize):
+            nonlocal last
+            now = time.perf_counter()
+            done = blocks * blocksize
+            if totalsize > 0:
+                done = min(done, totalsize)
+            if blocks and done != totalsize and now - last < 0.1:
+                return
+            last = now
+            speed = round(done / (now - start)) if now > start else 0
+            self.emit(DownloadProgress(filename, done, totalsize, speed))
+        return hook
+
+    def getfile(self, fileurl, checksum='', on_error_abort=False, 
+                filename=None, refresh=False):
+        """Download fileurl into self.cache_dir (named as filename, if given). 
         Return downloaded filepath, or empty string on failed download or 
         failed md5 checksum verification. If checksum=None, no verification 
         will occur. 
-        If on_error_abort=True, on failed download exit with stacktrace.""" 
-        filename = fileurl.split('/')[-1]
+        If on_error_abort=True, on failed download exit with stacktrace.
+        If refresh=True, download again even if cached (unless OFFLINE).""" 
+        filename = filename or fileurl.split('/')[-1]
         target_filepath = self.cache_dir / filename
-        if self.cfg.USE_CACHE and target_filepath.exists():
+        if self.warm is None:
+            return self._getfile(fileurl, target_filepath, checksum, 
+                                 on_error_abort, refresh)
+        # in a build server, other builds may be using the same file
+        with self.warm.file_lock(target_filepath):
+            return self._getfile(fileurl, target_filepath, checksum, 
+                                 on_error_abort, refresh)
+
+    def _getfile(self, fileurl, target_filepath, checksum, on_error_abort, 
+                 refresh=False):
+        filename = target_filepath.name
+        downloaded = False
+        use_cache = self.cfg.USE_CACHE and (self.cfg.OFFLINE or not refresh)
+        if use_cache and target_filepath.exists():
             self.msg(LOG_VERBOSE, f'Using cached {filename}...')
+            self.count('cache_hits')
         else:
+            if use_cache:
+                self.count('cache_misses')
             try:  # Python 3.8 has "missing_ok=True" here...
                 target_filepath.unlink()
             except FileNotFoundError:
                 pass
-            self.msg(LOG_VERBOSE, 
-                     f'Downloading {filename}...\nDownload from {fileurl}')
-            try:
-                urlretrieve(str(fileurl), target_filepath)
-            except Exception as e:
-                if on_error_abort:
-                    self.msg(LOG_ALWAYS, 
-                             f"FATAL: can't download {filename}! Aborting...")
-                    raise  # this will exit with a stacktrace
-                self.msg(LOG_VERBOSE, f"ERROR: can't download {filename}!")
-                self.msg(LOG_VERBOSE, 'The following exception was raised:')
-                self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
-                return ''
-        if not _md5compare(target_filepath, checksum):
+            if not (use_cache and self.fetch_remote(filename, target_filepath)):
+                if self.cfg.OFFLINE: # no point in waiting for a timeout
+                    if on_error_abort:
+                        self.msg(LOG_ALWAYS, f'FATAL: {filename} not in the '
+                                              'cache, and we are offline!')
+                        sys.exit(1)
+                    self.msg(LOG_VERBOSE, 
+                             f'ERROR: {filename} not in the cache, and we are offline!')
+                    return ''
+                self.msg(LOG_VERBOSE, 
+                         f'Downloading {filename}...\nDownload from {fileurl}')
+                try:
+                    self._download(fileurl, target_filepath)
+                except Exception as e:
+                    if on_error_abort:
+                        self.msg(LOG_ALWAYS, 
+                                 f"FATAL: can't download {filename}! Aborting...")
+                        raise  # this will exit with a stacktrace
+                    self.msg(LOG_VERBOSE, f"ERROR: can't download {filename}!")
+                    self.msg(LOG_VERBOSE, 'The following exception was raised:')
+                    self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+                    return ''
+                self.count('bytes_downloaded', target_filepath.stat().st_size)
+                downloaded = True
+        if self.warm is not None:
+            verified = self.warm.md5compare(target_filepath, checksum)
+        else:
+            verified = _md5compare(target_filepath, checksum)
+        if not verified:
             new = target_filepath.with_name(f'XXX_BADMD5_{filename}')
             target_filepath.rename(new)
             if on_error_abort:
@@ -394,24 +1856,228 @@ class Packit:
                 sys.exit(1)
             self.msg(LOG_VERBOSE, f'ERROR: bad md5 checksum for {filename}!')
             return ''
+        if self.cfg.USE_CACHE and downloaded:
+            self.push_remote(filename, target_filepath)
         self.msg(LOG_DEBUG, '->Debug - target_filepath:', target_filepath)
         return target_filepath
 
+    def _range_size(self, fileurl):
+        """Return the size of fileurl, if the server can send byte ranges 
+        of it. Else, return 0."""
+        if not str(fileurl).startswith(('http://', 'https://')):
+            return 0
+        try:
+            request = Request(str(fileurl), method='HEAD')
+            with urlopen(request, timeout=60) as response:
+                if response.headers.get('Accept-Ranges') != 'bytes':
+                    return 0
+                return int(response.headers.get('Content-Length', 0))
+        except Exception: # let the download itself report the problem
+            return 0
+
+    def _download(self, fileurl, target_filepath):
+        """Download fileurl into target_filepath: a big file in byte ranges, 
+        over DOWNLOAD_CONNECTIONS parallel connections, if the server 
+        supports them; else, as a single stream."""
+        hook = self._download_hook(target_filepath.name)
+        connections = self.cfg.DOWNLOAD_CONNECTIONS
+        size = self._range_size(fileurl) if connections > 1 else 0
+        segments = min(connections, size // DOWNLOAD_MIN_SEGMENT)
+        if segments > 1:
+            try:
+                if self._download_segments(fileurl, target_filepath, size, 
+                                           segments, hook):
+                    return
+            except Exception: # don't leave a full-size, broken file around
+                target_filepath.unlink()
+                raise
+            self.msg(LOG_VERBOSE, 'No byte ranges from the server, '
+                                  'downloading as a single stream...')
+        urlretrieve(str(fileurl), target_filepath, reporthook=hook)
+
+    def _download_segments(self, fileurl, target_filepath, size, segments, 
+                           hook):
+        """Download fileurl in byte ranges, at once, into a preallocated 
+        target_filepath. Return False if the server ignores the ranges."""
+        with open(target_filepath, 'wb') as f:
+            f.truncate(size)
+        bounds = [size * n // segments for n in range(segments + 1)]
+        lock = threading.Lock()
+        done = 0
+        def fetch(start, end):
+            nonlocal done
+            request = Request(str(fileurl))
+            request.add_header('Range', f'bytes={start}-{end - 1}')
+            with urlopen(request, timeout=300) as response, \
+                 open(target_filepath, 'r+b') as f:
+                if response.status != 206: # the whole file, then
+                    return False
+                f.seek(start)
+                received = 0
+                while True:
+                    chunk = response.read(DOWNLOAD_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    f.write(chunk)
+                    received += len(chunk)
+                    with lock:
+                        done += len(chunk)
+                        hook(done, 1, size)
+            if received != end - start:
+                raise OSError(f'Range {start}-{end - 1}: got {received} bytes.')
+            return True
+        with ThreadPoolExecutor(max_workers=segments) as executor:
+            futures = [executor.submit(fetch, start, end) 
+                       for start, end in zip(bounds, bounds[1:])]
+            results = [future.result() for future in futures]
+        if not all(results):
+            return False
+        self.count('download_segments', segments)
+        return True
+
+    def fetch_remote(self, name, filepath):
+        """Fetch name from the remote cache into filepath, if there is 
+        a remote cache. Return False if not found."""
+        if self.remote is None:
+            return False
+        try:
+            found = self.remote.fetch(name, filepath)
+        except Exception as e:
+            self.msg(LOG_VERBOSE, f"ERROR: can't fetch {name} from the remote cache.")
+            self.msg(LOG_VERBOSE, 'The following exception was raised:')
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            found = False
+        if found:
+            self.msg(LOG_VERBOSE, f'Fetched {name} from the remote cache.')
+            self.count('remote_hits')
+            self.count('bytes_fetched', Path(filepath).stat().st_size)
+        else:
+            self.count('remote_misses')
+        return found
+
+    def push_remote(self, name, filepath, job=None):
+        """Store filepath in the remote cache as name, if there is a 
+        remote cache: in the background, see finish_uploads. If job is 
+        given, run job() in the background instead."""
+        if self.remote is None:
+            return
+        if self.upload_executor is None:
+            self.upload_executor = ThreadPoolExecutor(max_workers=4)
+        if job is None:
+            job = lambda: self.remote.store(name, filepath)
+        self.uploads.append((name, self.upload_executor.submit(job)))
+
+    def finish_uploads(self):
+        """Wait for the background uploads to the remote cache. Upload 
+        errors are reported, but they don't make the build fail."""
+        if not self.uploads:
+            return
+        self.msg(LOG_VERBOSE, 
+                 f'\nWaiting for {len(self.uploads)} upload(s) to the remote cache...')
+        errors = 0
+        for name, future in self.uploads:
+            try:
+                future.result()
+            except Exception as e:
+                errors += 1
+                self.msg(LOG_VERBOSE, f"ERROR: can't upload {name} to the remote cache.")
+                self.msg(LOG_VERBOSE, 'The following exception was raised:')
+                self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+        self.uploads = []
+        self.upload_executor.shutdown()
+        self.upload_executor = None
+        if not errors:
+            self.msg(LOG_VERBOSE, 'Remote cache updated.')
+
+    def getfiles(self, jobs, on_error_abort=False, workers=8):
+        """Download many files at once, at most workers at a time. "jobs" 
+        is a sequence of (fileurl, checksum) pairs, or of (fileurl, checksum, 
+        filename, refresh) tuples, as in getfile. Return the filepaths in 
+        the same order (empty strings for failed downloads)."""
+        if not jobs:
+            return []
+        with ThreadPoolExecutor(max_workers=min(len(jobs), workers)) as executor:
+            futures = [executor.submit(self.getfile, fileurl, checksum, 
+                                       on_error_abort, *more)
+                       for fileurl, checksum, *more in jobs]
+            return [future.result() for future in futures]
+
+    def download_wheels(self, versions, workers=8):
+        """Download the REQUIREMENTS wheels for each target Python in 
+        versions into the cache (see PREFETCH_WHEEL_DIR), with the host Pip. 
+        Pip's cache is warmed up too. Return False if something went wrong."""
+        wheelhouse = self.cache_dir / PREFETCH_WHEEL_DIR
+        # micro versions share the same wheels
+        tags = sorted({(ma, mi, arch) for ma, mi, mc, arch in versions})
+        def download(tag):
+            ma, mi, arch = tag
+            self.msg(LOG_VERBOSE, f'Downloading wheels for Python {ma}.{mi}-{arch}...')
+            args = [sys.executable, '-m', 'pip', 'download', 
+                    '-r', self.cfg.REQUIREMENTS, '--dest', str(wheelhouse), 
+                    f'--cache-dir={self.cache_dir}', '--only-binary=:all:', 
+                    '--platform', 'win_amd64' if arch == 64 else 'win32', 
+                    '--python-version', f'{ma}.{mi}', '--implementation', 'cp']
+            return self.run_subprocess(*args)
+        with ThreadPoolExecutor(max_workers=min(len(tags), workers)) as executor:
+            results = list(executor.map(download, tags))
+        self.count('wheel_sets', results.count(True))
+        return all(results)
+
+    def load_catalog(self, save=True):
+        """Return the Python version catalog (and set self.catalog): the 
+        built-in table, plus the Pythons found on PY_CATALOG_MIRROR, if any. 
+        The mirror catalog is kept in the cache, and refreshed each time. 
+        If save=False, the refreshed catalog is not written in the cache."""
+        if self.catalog is not None:
+            return self.catalog
+        self.catalog = PyVersionCatalog()
+        if not self.cfg.PY_CATALOG_MIRROR:
+            return self.catalog
+        catalog_file = self.cache_dir / PY_CATALOG_FILE
+        if catalog_file.exists():
+            try:
+                self.catalog.load(catalog_file)
+            except (ValueError, KeyError, TypeError) as e:
+                self.msg(LOG_VERBOSE, f'ERROR: bad catalog file {catalog_file}.')
+                self.msg(LOG_VERBOSE, 'The following exception was raised:')
+                self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+        if self.cfg.OFFLINE:
+            self.msg(LOG_VERBOSE, 'Offline: Python catalog not refreshed.')
+            return self.catalog
+        self.msg(LOG_VERBOSE, 'Refreshing Python catalog from', 
+                 self.cfg.PY_CATALOG_MIRROR)
+        try:
+            found = self.catalog.refresh(self.cfg.PY_CATALOG_MIRROR)
+        except Exception as e:
+            self.msg(LOG_VERBOSE, "ERROR: can't refresh the Python catalog, "
+                                  "using what we know.")
+            self.msg(LOG_VERBOSE, 'The following exception was raised:')
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return self.catalog
+        if found is None:
+            self.msg(LOG_VERBOSE, 'Python catalog not changed.')
+        else:
+            self.msg(LOG_VERBOSE, f'Python catalog updated, {found} Pythons found.')
+            if save:
+                self.cache_dir.mkdir(exist_ok=True)
+                self.catalog.save(catalog_file)
+        return self.catalog
+
     def parse_pyversion(self):
         """Read self.cfg.PYTHON_VERSION and figure out which Python we want.
         Return and set self.target_py_version."""
         self.msg(LOG_VERBOSE, "Choosing Python version...")
+        catalog = self.load_catalog()
         # fallback version: current Python OR min possible with current arch.
         ma, mi, mc = sys.version_info[:3]
         arch = 64 if sys.maxsize > 2**32 else 32
         if (ma, mi, mc) < MIN_TARGET_VERSION:
-            ma, mi = MIN_TARGET_VERSION[:2]
-            mc = MAX_MICRO_VERSIONS[(ma, mi)] # long story short, latest 3.5.x
-        fallback = ma, mi, mc, arch
+            ma, mi, mc = MIN_TARGET_VERSION[0], MIN_TARGET_VERSION[1], None
+        fallback = catalog.latest(ma, mi, mc, arch) # long story short, latest 3.5.x
         self.msg(LOG_DEBUG, '->Debug - fallback Py version:', fallback)
         # architecture parsing
         wanted_py = self.cfg.PYTHON_VERSION
-        ma, mi, mc, arch = None, None, None, 64
+        arch = 64
         try:
             wanted_py, architecture = wanted_py.split('-')
             if architecture == '32':
@@ -426,45 +2092,32 @@ class Packit:
                      f'Dafaulting to <{fallback}>.')
             self.target_py_version = fallback
             return self.target_py_version
-        # major number parsing
-        ma = wanted_py[0]
-        if ma < MIN_TARGET_VERSION[0]:  # if Python 2, use fallback
+        if wanted_py[0] < MIN_TARGET_VERSION[0]:  # if Python 2, use fallback
             self.msg(LOG_VERBOSE, 
                      f"Can't use <{self.cfg.PYTHON_VERSION}> as target Python.", 
                      f'Defaulting to <{fallback}>.')
             self.target_py_version = fallback
             return self.target_py_version
-        elif ma > MAX_MAJOR_VERSION:
-            ma = MAX_MAJOR_VERSION
-        # minor number parsing
-        try:
-            mi = wanted_py[1]
-            if mi > MAX_MINOR_VERSIONS[ma]:
-                mi = MAX_MINOR_VERSIONS[ma]
-        except IndexError:
-            mi = MAX_MINOR_VERSIONS[ma]
-        # micro number parsing
-        try:
-            mc = wanted_py[2]
-            if mc > MAX_MICRO_VERSIONS[(ma, mi)]:
-                mc = MAX_MICRO_VERSIONS[(ma, mi)]
-        except IndexError:
-            mc = MAX_MICRO_VERSIONS[(ma, mi)]
-        self.target_py_version = ma, mi, mc, arch
+        # missing minor/micro numbers mean "the latest"
+        ma, mi, mc = (wanted_py + [None, None])[:3]
         # special cases
         for sp_case, sp_fallback in SPECIAL_CASE_VERSIONS:
             if (ma, mi, mc, arch) == sp_case:
                 self.msg(LOG_VERBOSE, 
-                         f'Version <{self.target_py_version}> is a special case.')
+                         f'Version <{sp_case}> is a special case.')
                 self.target_py_version = sp_fallback
                 break
+        else:
+            self.target_py_version = catalog.latest(ma, mi, mc, arch)
         self.msg(LOG_VERBOSE, f'Version <{self.target_py_version}> needed.')
         return self.target_py_version
 
-    def prepare_dirs(self):
-        """Make build dir, parse PROJECTS and COPY_DIRS settings to figure out
-        original/target dirs to be copied later, and entry point machinery."""
+    def _make_build_dir(self):
         self.cache_dir.mkdir(exist_ok=True)
+        # the logs of a previous build would be misleading
+        shutil.rmtree(self.build_dir.with_name(self.build_dir.name + 
+                                               PROCESS_LOG_SUFFIX), 
+                      ignore_errors=True)
         if self.build_dir.exists():
             try:
                 shutil.rmtree(self.build_dir)
@@ -473,6 +2126,11 @@ class Packit:
                          f"FATAL: Can't delete existing <{self.build_dir}>.")
                 raise # this will exit with stacktrace
         self.build_dir.mkdir()
+
+    def prepare_dirs(self):
+        """Make build dir, parse PROJECTS and COPY_DIRS settings to figure out
+        original/target dirs to be copied later, and entry point machinery."""
+        self._make_build_dir()
         self.bootstrap_dir = self.build_dir / 'winpackit_bootstrap'
         self.bootstrap_dir.mkdir(exist_ok=True)
         self.proj_dirs = []
@@ -481,6 +2139,7 @@ class Packit:
         self.target_proj_dirs_relative = []
         self.target_copy_dirs = []
         self.entry_points = []
+        self.entry_point_sources = []
         if self.cfg.PROJECTS:
             for project in self.cfg.PROJECTS:
                 proj_dir = self.cfg.HERE / Path(project[0])
@@ -507,6 +2166,7 @@ class Packit:
     def _prepare_entry_points(self, entrypoints, basedir):
         for entrypath, name in entrypoints:
             entrypath = Path(entrypath)
+            source = basedir / entrypath
             entrypath = basedir.name / entrypath 
             if entrypath.suffix == '.py':
                 flavor = 'py'
@@ -514,6 +2174,8 @@ class Packit:
                 flavor = 'pyw'
             else:
                 flavor = ''
+            if flavor:
+                self.entry_point_sources.append(source)
             # entrypath: the target Path, relative to root project directory
             entry = [entrypath, name, flavor]
             self.entry_points.append(entry)
@@ -521,10 +2183,23 @@ class Packit:
     def obtain_python(self):
         """Download Python, return filepath. If fail, exit with stacktrace."""
         self.msg(LOG_VERBOSE, "\n****** Obtaining Python ******")
-        pyfile, checksum = PY_URL[self.parse_pyversion()]
-        f = self.getfile(pyfile, checksum=checksum, on_error_abort=True)
+        version = self.parse_pyversion()
+        pyfile, checksum = self.catalog.url(version)
+        if self.python_zip: # eg, downloaded by main_matrix
+            self.msg(LOG_VERBOSE, f'Using {self.python_zip.name}, already obtained.')
+            return self.python_zip
+        self.python_zip = self.getfile(pyfile, checksum=checksum, 
+                                       on_error_abort=True)
         self.msg(LOG_VERBOSE, 'Python successfully obtained.')
-        return f
+        return self.python_zip
+
+    def _getpip_source(self):
+        """Return the (url, checksum, cache filename) of the right Get-pip 
+        for the target Python: they all have the same name, after all."""
+        ma, mi, mc, arch = self.target_py_version
+        if (ma, mi) in GETPIP_URL:
+            return GETPIP_URL[(ma, mi)] + (f'get-pip-{ma}.{mi}.py',)
+        return GETPIP_DEFAULT_URL + ('get-pip.py',)
 
     def obtain_getpip(self):
         """Download Get-pip, return filepath. If fails, return empty string."""
@@ -532,14 +2207,17 @@ class Packit:
         if not self.cfg.PIP_REQUIRED:
             self.msg(LOG_VERBOSE, 'Skipped: no Pip required in config file.')
             return ''
-        ma, mi, mc, arch = self.target_py_version
-        f, checksum = GETPIP_URL.get((ma, mi), GETPIP_DEFAULT_URL)
-        # never use a cached Get-pip! Since it's not versioned and 
-        # there's no md5 checksum, we don't know if we have the right one.
-        old_cache_setting = self.cfg.USE_CACHE
-        self.cfg.USE_CACHE = False
-        getpip = self.getfile(f, checksum=checksum, on_error_abort=False)
-        self.cfg.USE_CACHE = old_cache_setting
+        if self.getpip_file is not None: # eg, downloaded by main_matrix
+            if self.getpip_file:
+                self.msg(LOG_VERBOSE, 'Using Get-pip, already obtained.')
+            else:
+                self.msg(LOG_VERBOSE, 'ERROR: Get-pip not obtained.')
+            return self.getpip_file
+        f, checksum, filename = self._getpip_source()
+        # never use a cached Get-pip, unless offline! Since it's not versioned 
+        # and there's no md5 checksum, we don't know if we have the right one.
+        getpip = self.getfile(f, checksum=checksum, on_error_abort=False, 
+                              filename=filename, refresh=True)
         if getpip:
             self.msg(LOG_VERBOSE, 'Get-pip successfully obtained.')
         else:
@@ -549,12 +2227,19 @@ class Packit:
     def unpack_python(self, pyfile):
         """Unzip Python package. If fail, exit with stacktrace."""
         self.msg(LOG_VERBOSE, "\n****** Installing Python ******")
+        self.python_zip = pyfile
         self.target_py_dir = self.build_dir / pyfile.stem
         self.target_py_dir.mkdir(exist_ok=True)
-        self.msg(LOG_VERBOSE, 'Unzipping...')
         try:
-            with zipfile.ZipFile(pyfile, 'r') as python_zip:
-                python_zip.extractall(self.target_py_dir)
+            if self.warm is not None:
+                self._unpack_python_template(pyfile)
+            else:
+                self.msg(LOG_VERBOSE, 'Unzipping...')
+                with zipfile.ZipFile(pyfile, 'r') as python_zip:
+                    python_zip.extractall(self.target_py_dir)
+                    infos = python_zip.infolist()
+                self.count('files_written', len(infos))
+                self.count('bytes_written', sum(i.file_size for i in infos))
         except:
             self.msg(LOG_ALWAYS, 
                      f"FATAL: can't unzip {pyfile} in {self.target_py_dir}!")
@@ -573,6 +2258,20 @@ class Packit:
                             'import sys; print(sys.path, flush=True)'))
         return ret
 
+    def _unpack_python_template(self, pyfile):
+        """Hardlink the files of the already extracted pyfile (see WarmCache) 
+        into the target Python dir."""
+        self.msg(LOG_VERBOSE, 'Linking the extracted package...')
+        template = self.warm.template(pyfile)
+        for src in template.iterdir():
+            dst = self.target_py_dir / src.name
+            if src.suffix == '._pth': # we append to this one, see _fix_imports
+                shutil.copy2(src, dst)
+                self.count('files_copied')
+            else:
+                _link_or_copy(src, dst)
+                self.count('files_linked')
+
     def _fix_imports(self):
         # we add paths to ._pth file, which is better than using 
         # sitecustomize.py because this way we don't need to import site, 
@@ -610,6 +2309,7 @@ class Packit:
         Also, set self.pip_is_present if Pip was successfully installed."""
         pyexec = self.target_py_dir / 'python.exe'
         args = str(pyexec), str(getpipfile), *self.cfg.PIP_ARGS
+        args += tuple(self._offline_args())
         if self.run_subprocess(*args):
             self.msg(LOG_VERBOSE, 'Pip successfully installed.')
             self.pip_is_present = True
@@ -642,16 +2342,204 @@ class Packit:
         else:
             return self._install_pip_now(getpipfile)
 
+    def _offline_args(self):
+        """Return the Pip install args for an OFFLINE build: our local index 
+        (see export_index) if we have one, else no index at all."""
+        if not self.cfg.OFFLINE:
+            return []
+        index = self.cache_dir / OFFLINE_INDEX_DIR
+        if (index / 'index.html').exists():
+            return ['--index-url', index.resolve().as_uri() + '/']
+        return ['--no-index']
+
+    def _pip_cache_dir(self):
+        """Return the Pip cache dir (see PIP_CACHE), or None."""
+        for arg in self.cfg.PIP_ARGS:
+            if arg.startswith('--cache-dir='):
+                return Path(arg[len('--cache-dir='):])
+        return None
+
+    def _pull_pip_cache(self):
+        """Fetch from the remote cache the Pip cache files we don't have. 
+        Return the remote manifest (the set of the files there)."""
+        pip_cache = self._pip_cache_dir()
+        pip_cache.mkdir(parents=True, exist_ok=True)
+        manifest = set()
+        manifest_file = pip_cache / REMOTE_PIP_MANIFEST
+        if self.fetch_remote(REMOTE_PIP_MANIFEST, manifest_file):
+            manifest = set(json.loads(manifest_file.read_text()))
+        missing = [name for name in manifest if not (pip_cache / name).exists()]
+        def fetch(name):
+            (pip_cache / name).parent.mkdir(parents=True, exist_ok=True)
+            return self.fetch_remote(name, pip_cache / name)
+        if missing:
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                fetched = sum(executor.map(fetch, missing))
+            self.msg(LOG_VERBOSE, f'{fetched} Pip cache files fetched.')
+        return manifest
+
+    def _push_pip_cache(self, manifest):
+        """Store in the remote cache the new Pip cache files, then 
+        a new manifest (in the background)."""
+        pip_cache = self._pip_cache_dir()
+        new = {}
+        for dirname in REMOTE_PIP_DIRS:
+            for path in _walk_tree(pip_cache / dirname):
+                name = path.relative_to(pip_cache).as_posix()
+                if name not in manifest and not name.endswith('.part'):
+                    new[name] = path
+        if not new:
+            return
+        def job():
+            for name, path in new.items():
+                self.remote.store(name, path)
+            # others may have added files meanwhile
+            manifest_file = pip_cache / (REMOTE_PIP_MANIFEST + '.upload')
+            merged = set(new)
+            if self.remote.fetch(REMOTE_PIP_MANIFEST, manifest_file):
+                merged.update(json.loads(manifest_file.read_text()))
+            _ = manifest_file.write_text(json.dumps(sorted(merged)))
+            self.remote.store(REMOTE_PIP_MANIFEST, manifest_file)
+            manifest_file.unlink()
+        self.push_remote(REMOTE_PIP_MANIFEST, None, job=job)
+
+    @staticmethod
+    def _layer_args(items):
+        """Pip arguments for the items of a layer (packages or "-r file")."""
+        args = []
+        for item in items:
+            if item.startswith('-r '):
+                args += ['-r', item[3:].strip()]
+            else:
+                args.append(item)
+        return args
+
+    def _layer_fingerprints(self):
+        """Return the (name, items, fingerprint) of each DEPENDENCY_LAYERS 
+        layer: a layer depends on its packages (and the content of its 
+        requirement files), the target Python, Pip install args, and 
+        all the layers below."""
+        layers = []
+        previous = ''
+        for name, *items in self.cfg.DEPENDENCY_LAYERS:
+            h = md5()
+            h.update(json.dumps([previous, list(self.target_py_version), 
+                                 self.cfg.PIP_INSTALL_ARGS, items]).encode())
+            for item in items:
+                if item.startswith('-r '):
+                    h.update(Path(item[3:].strip()).read_bytes())
+            previous = h.hexdigest()
+            layers.append((name, items, previous))
+        return layers
+
+    def _make_layer(self, name, items, layer_dir):
+        """Install a layer on top of the target Python, then save in 
+        layer_dir what changed. Return False if something went wrong."""
+        pyexec = self.target_py_dir / 'python.exe'
+        before = _snapshot_tree(self.target_py_dir)
+        args = [str(pyexec), '-m', 'pip'] + self.cfg.PIP_ARGS + ['install'] 
+        args += self._layer_args(items) + self.cfg.PIP_INSTALL_ARGS
+        args += self._offline_args()
+        if not self.run_subprocess(*args):
+            return False
+        after = _snapshot_tree(self.target_py_dir)
+        changed = [path for path in after if after[path] != before.get(path)]
+        tmp = layer_dir.with_name(layer_dir.name + '.part')
+        shutil.rmtree(tmp, ignore_errors=True)
+        for path in changed:
+            dest = tmp / 'files' / path
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copy2(self.target_py_dir / path, dest)
+        info = {'name': name, 'items': items, 
+                'deleted': sorted(path for path in before if path not in after), 
+                'files': len(changed), 
+                'bytes': sum(after[path][0] for path in changed)}
+        tmp.mkdir(parents=True, exist_ok=True)
+        _ = (tmp / 'layer.json').write_text(json.dumps(info, indent=2))
+        try:
+            os.rename(tmp, layer_dir)
+        except OSError: # another build made it meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+            return True
+        if self.cfg.USE_CACHE and self.remote is not None:
+            archive = layer_dir.with_name(layer_dir.name + '.zip')
+            def job():
+                shutil.make_archive(str(archive.with_suffix('')), 'zip', layer_dir)
+                self.remote.store(f'layers/{archive.name}', archive)
+                archive.unlink()
+            self.push_remote(f'layers/{archive.name}', None, job=job)
+        return True
+
+    def _fetch_layer(self, layer_dir):
+        """Fetch a layer from the remote cache. Return False if not found."""
+        archive = layer_dir.with_name(layer_dir.name + '.zip')
+        if not self.fetch_remote(f'layers/{archive.name}', archive):
+            return False
+        tmp = layer_dir.with_name(layer_dir.name + '.part')
+        shutil.rmtree(tmp, ignore_errors=True)
+        with zipfile.ZipFile(archive, 'r') as z:
+            z.extractall(tmp)
+        archive.unlink()
+        try:
+            os.rename(tmp, layer_dir)
+        except OSError: # another build got it meanwhile
+            shutil.rmtree(tmp, ignore_errors=True)
+        return True
+
+    def _apply_layer(self, layer_dir):
+        """Hardlink a cached layer into the target Python."""
+        info = json.loads((layer_dir / 'layer.json').read_text())
+        for path in info['deleted']:
+            target = self.target_py_dir / path
+            if target.exists():
+                target.unlink()
+        files = layer_dir / 'files'
+        for src in _walk_tree(files):
+            dst = self.target_py_dir / src.relative_to(files)
+            dst.parent.mkdir(parents=True, exist_ok=True)
+            if dst.exists(): # never write through a link into the cache
+                dst.unlink()
+            _link_or_copy(src, dst)
+        self.count('files_linked', info['files'])
+
+    def _install_layers(self):
+        """Install DEPENDENCY_LAYERS, in order: cached layers are hardlinked, 
+        the others are installed and cached. Return False if something 
+        went wrong."""
+        layers_dir = self.cache_dir / 'layers'
+        layers_dir.mkdir(parents=True, exist_ok=True)
+        for name, items, fingerprint in self._layer_fingerprints():
+            layer_dir = layers_dir / fingerprint
+            cached = self.cfg.USE_CACHE and (layer_dir.exists() 
+                                             or self._fetch_layer(layer_dir))
+            if cached:
+                self.count('layer_hits')
+                self.msg(LOG_VERBOSE, f'Linking cached layer <{name}>...')
+                self._apply_layer(layer_dir)
+                continue
+            self.count('layer_misses')
+            self.msg(LOG_VERBOSE, f'Installing layer <{name}>...')
+            shutil.rmtree(layer_dir, ignore_errors=True)
+            if not self._make_layer(name, items, layer_dir):
+                self.msg(LOG_VERBOSE, f'ERROR: layer <{name}> not installed.')
+                return False
+        return True
+
     def _install_dependencies_now(self):
         """Uses pip to install dependencies. 
         Return False if something went wrong."""
         pyexec = self.target_py_dir / 'python.exe'
         return_codes = []
+        sync_pip_cache = self.remote is not None and self._pip_cache_dir()
+        if sync_pip_cache:
+            manifest = self._pull_pip_cache()
+        if self.cfg.DEPENDENCY_LAYERS:
+            return_codes.append(self._install_layers())
         if self.cfg.REQUIREMENTS:
             self.msg(LOG_VERBOSE, f'Installing from {self.cfg.REQUIREMENTS}...')
             args = [str(pyexec), '-m', 'pip'] + self.cfg.PIP_ARGS 
             args += ['install', '-r', self.cfg.REQUIREMENTS] 
-            args += self.cfg.PIP_INSTALL_ARGS
+            args += self.cfg.PIP_INSTALL_ARGS + self._offline_args()
             ret = self.run_subprocess(*args)
             return_codes.append(ret)
         else:
@@ -661,10 +2549,13 @@ class Packit:
             for package in self.cfg.DEPENDENCIES:
                 args = [str(pyexec), '-m', 'pip', 'install', package]
                 args += self.cfg.PIP_ARGS + self.cfg.PIP_INSTALL_ARGS
+                args += self._offline_args()
                 ret = self.run_subprocess(*args)
                 return_codes.append(ret)
         else:
             self.msg(LOG_VERBOSE, 'No packages list found.')
+        if sync_pip_cache:
+            self._push_pip_cache(manifest)
         if all(return_codes):
             self.msg(LOG_VERBOSE, 'All dependencies successfully installed.')
             return True
@@ -677,8 +2568,16 @@ class Packit:
         """Install dependencies in the 'delayed install' scenario: leave a
         requirements.txt in the dist folder and post-deploy instructions."""
         dest = self.bootstrap_dir / 'requirements.txt'
-        if self.cfg.REQUIREMENTS:
-            shutil.copy(self.cfg.REQUIREMENTS, dest)
+        with open(dest, 'w') as f:
+            # no layers on the user machine: just install them first
+            for name, *items in self.cfg.DEPENDENCY_LAYERS:
+                for item in items:
+                    if item.startswith('-r '):
+                        f.write(Path(item[3:].strip()).read_text().rstrip('\n') + '\n')
+                    else:
+                        f.write(item+'\n')
+            if self.cfg.REQUIREMENTS:
+                f.write(Path(self.cfg.REQUIREMENTS).read_text())
         with open(dest, 'a') as f:
             for req in self.cfg.DEPENDENCIES:
                 f.write(req+'\n')
@@ -690,7 +2589,8 @@ class Packit:
     def install_dependencies(self):
         """Install dependencies. Return False if something went wrong."""
         self.msg(LOG_VERBOSE, "\n****** Installing dependencies ******")
-        want_dependencies = self.cfg.REQUIREMENTS or self.cfg.DEPENDENCIES
+        want_dependencies = (self.cfg.REQUIREMENTS or self.cfg.DEPENDENCIES 
+                             or self.cfg.DEPENDENCY_LAYERS)
         if not want_dependencies:
             self.msg(LOG_VERBOSE, 'Skipped: no dependency wanted.')
             return True
@@ -704,9 +2604,23 @@ class Packit:
             return self._install_dependencies_now()
 
     def _copy_files(self, orig, dest, ignore=None):
-        """Run shutil.copytree, return False if errors occurred."""
+        """Run shutil.copytree, return False if errors occurred. 
+        Dirs already staged by main_matrix are hardlinked instead."""
+        def link(src, dst):
+            self.count('files_linked')
+            self.emit(FileCopied(src, dst, os.path.getsize(src), True))
+            return _link_or_copy(src, dst)
+        def copy(src, dst):
+            size = os.path.getsize(src)
+            self.count('files_copied')
+            self.count('bytes_copied', size)
+            self.emit(FileCopied(src, dst, size, False))
+            return shutil.copy2(src, dst)
         try:
-            shutil.copytree(orig, dest, ignore=ignore)
+            if orig in self.shared_dirs:
+                shutil.copytree(self.shared_dirs[orig], dest, copy_function=link)
+            else:
+                shutil.copytree(orig, dest, ignore=ignore, copy_function=copy)
             self.msg(LOG_VERBOSE, f'Files copied into {dest}.')
             return True
         except Exception as e:
@@ -753,18 +2667,50 @@ class Packit:
         self.msg(LOG_VERBOSE, 'Modules will be compiled on the user machine.')
         return True
 
+    def _compileall(self, *paths):
+        """Run compileall on paths (dirs or modules) with the target Python. 
+        Return False if something went wrong."""
+        # MUST compile with target python, not our current python!
+        py_exec = self.target_py_dir / 'python.exe'
+        def compiled(line):
+            # not quiet: we want to know which modules are being compiled
+            match = re.match(r"Compiling ('.*'|\".*\")\.\.\.$", line)
+            if match:  # that's the repr of the path
+                self.count('files_compiled')
+                self.emit(ModuleCompiled(ast.literal_eval(match.group(1))))
+            elif not line.startswith('Listing '):
+                self.msg(LOG_VERBOSE, line)  # errors
+        args = [str(py_exec), '-m', 'compileall'] + [str(p) for p in paths]
+        if self.cfg.PYC_ONLY_DISTRIBUTION:
+            args.append('-b')
+        return self.run_subprocess(*args, on_line=compiled)
+
+    def _pyc_sources(self):
+        """Return the (module, compiled module) pairs compileall will write 
+        in the target project dirs."""
+        ma, mi = self.target_py_version[:2]
+        sources = []
+        for d in self.target_proj_dirs:
+            for source in d.glob('**/*.py'):
+                if self.cfg.PYC_ONLY_DISTRIBUTION:
+                    pyc = source.with_suffix('.pyc')
+                else:
+                    pyc = (source.parent / '__pycache__' / 
+                           f'{source.stem}.cpython-{ma}{mi}.pyc')
+                sources.append((source, pyc))
+        return sources
+
     def _compile_files_now(self):
         """Compile all py modules, remove originals if needed."""
         got_errors = False
-        # MUST compile with target python, not our current python!
-        py_exec = self.target_py_dir / 'python.exe'
-        quiet = '-q' if self.cfg.VERBOSE else '-qq'
+        if self.warm is not None: # compileall won't compile these again
+            sources = self._pyc_sources()
+            reused = self.warm.restore_pycs(self.target_py_version, 
+                                    self.cfg.PYC_ONLY_DISTRIBUTION, sources)
+            self.count('pycs_reused', reused)
+            self.msg(LOG_VERBOSE, f'{reused} compiled module(s) reused.')
         for d in self.target_proj_dirs:
-            args = [str(py_exec), '-m', 'compileall', str(d)]
-            if self.cfg.PYC_ONLY_DISTRIBUTION:
-                args.append('-b')
-            args.append(quiet)
-            ret = self.run_subprocess(*args)
+            ret = self._compileall(d)
             if not ret:
                 self.msg(LOG_VERBOSE, 
                          f'ERROR: not all modules successfully compiled in {d}.')
@@ -773,6 +2719,9 @@ class Packit:
             self.msg(LOG_VERBOSE, 'ERROR: not all modules successfully compiled.')
             return False
         self.msg(LOG_VERBOSE, 'All modules successfully compiled.')
+        if self.warm is not None:
+            self.warm.store_pycs(self.target_py_version, 
+                                 self.cfg.PYC_ONLY_DISTRIBUTION, sources)
         if self.cfg.PYC_ONLY_DISTRIBUTION:
             for d in self.target_proj_dirs:
                 for f in d.glob('**/*.py'):
@@ -834,11 +2783,12 @@ class Packit:
                                 have_pip=str(self.delay_have_pip),
                                 have_deps=str(self.delay_have_dependencies),
                                 welcome=repr(self.cfg.WELCOME_MESSAGE),
-                                goodbye=repr(self.cfg.GOODBYE_MESSAGE))
+                                goodbye=repr(self.cfg.GOODBYE_MESSAGE), 
+                                verify=repr(self.cfg.VERIFY_INSTALL or ''))
         with open(self.bootstrap_dir / 'bootstrap.py', 'a') as f:
             f.write(script)
         txt = f'"./{self.target_py_dir.name}/python.exe"'
-        txt += f' "./{self.bootstrap_dir.name}/bootstrap.py"'
+        txt += f' "./{self.bootstrap_dir.name}/bootstrap.py" %*'
         with open(self.build_dir / 'install.bat', 'a') as f:
             f.write('echo off\n')
             f.write(txt)
@@ -873,23 +2823,714 @@ class Packit:
             self.msg(LOG_VERBOSE, "ERROR: no Pip present.")
             return False
         pyexec = self.target_py_dir / 'python.exe' 
-        self.run_subprocess(str(pyexec), '-m', 'pip', 'freeze')
+        self.run_subprocess(str(pyexec), '-m', 'pip', 'freeze', 
+                            on_line=lambda line: self.msg(LOG_VERBOSE, line))
+        return True
+
+    def _slim_distribution(self, record, patterns, keep, remove_all):
+        """Remove the files listed in a dist-info RECORD that match the 
+        patterns (or all of them), unless they match the keep patterns, 
+        then rewrite the RECORD. Return (files, bytes) removed."""
+        site_packages = record.parent.parent
+        py_dir = os.path.normcase(os.path.abspath(self.target_py_dir))
+        tag = '.cpython-{}{}.'.format(*self.target_py_version[:2])
+        with open(record, newline='', encoding='utf-8') as f:
+            rows = [row for row in csv.reader(f) if row]
+        kept_rows = []
+        files, size = 0, 0
+        for row in rows:
+            relpath = row[0]
+            path = os.path.normcase(os.path.abspath(site_packages / relpath))
+            wrong_pyc = (relpath.endswith('.pyc') and tag not in relpath 
+                         and '/__pycache__/' in '/' + relpath)
+            remove = (remove_all 
+                      or wrong_pyc 
+                      or any(fnmatch.fnmatchcase(relpath, p) for p in patterns))
+            if (not remove 
+                    or any(fnmatch.fnmatchcase(relpath, k) for k in keep) 
+                    or not path.startswith(py_dir + os.sep)):
+                kept_rows.append(row)
+                continue
+            if os.path.isfile(path):
+                size += os.path.getsize(path)
+                files += 1
+                os.remove(path)
+                self.msg(LOG_DEBUG, '->Debug - slimmed', relpath)
+        if remove_all:
+            shutil.rmtree(record.parent, ignore_errors=True)
+        elif files:
+            tmp = record.with_name('RECORD.tmp')
+            with open(tmp, 'w', newline='', encoding='utf-8') as f:
+                csv.writer(f, lineterminator='\n').writerows(kept_rows)
+            os.replace(tmp, record)
+        return files, size
+
+    def slim_site_packages(self):
+        """Remove from site-packages what the installed distributions don't 
+        need at run time: files matching SLIM_DEFAULT_PATTERNS and 
+        SLIM_PATTERNS (as listed in the RECORD files), unless they match 
+        SLIM_KEEP. Return False if something went wrong."""
+        self.msg(LOG_VERBOSE, "\n****** Slimming site-packages ******")
+        if not self.cfg.SLIM_SITE_PACKAGES:
+            self.msg(LOG_VERBOSE, 'Skipped, no slimming required.')
+            return True
+        if self.cfg.DELAYED_INSTALL:
+            self.msg(LOG_VERBOSE, 
+                     'Skipped: dependencies are installed on the user machine.')
+            return True
+        site_packages = self.target_py_dir / 'Lib' / 'site-packages'
+        patterns = list(SLIM_DEFAULT_PATTERNS) + list(self.cfg.SLIM_PATTERNS)
+        keep = list(self.cfg.SLIM_KEEP)
+        slimmed = {}
+        try:
+            for record in sorted(site_packages.glob('*.dist-info/RECORD')):
+                name = _canonical_name(record.parent.name.split('-')[0])
+                if any(fnmatch.fnmatchcase(name, _canonical_name(k)) 
+                       for k in keep):
+                    continue
+                remove_all = any(fnmatch.fnmatchcase(name, _canonical_name(p)) 
+                                 for p in patterns)
+                files, size = self._slim_distribution(record, patterns, keep, 
+                                                      remove_all)
+                if name == 'pip' and remove_all:
+                    self.pip_is_present = False
+                if files:
+                    slimmed[name] = {'files': files, 'bytes': size}
+            for dirpath, dirnames, filenames in os.walk(site_packages, 
+                                                        topdown=False):
+                if dirpath != str(site_packages) and not os.listdir(dirpath):
+                    os.rmdir(dirpath)
+        except Exception as e:
+            self.msg(LOG_VERBOSE, "ERROR: can't slim site-packages!")
+            self.msg(LOG_VERBOSE, 'The following exception was raised:')
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return False
+        self.report.slimmed = slimmed
+        files = sum(item['files'] for item in slimmed.values())
+        removed = sum(item['bytes'] for item in slimmed.values())
+        self.count('files_removed', files)
+        self.count('bytes_removed', removed)
+        for name, item in sorted(slimmed.items(), 
+                                 key=lambda i: i[1]['bytes'], reverse=True):
+            self.msg(LOG_VERBOSE, f'  {name + " ":.<30} {item["bytes"]:>12} bytes,', 
+                     f'{item["files"]} files')
+        self.msg(LOG_VERBOSE, 
+                 f'Site-packages successfully slimmed, {removed} bytes removed.')
+        return True
+
+    def _find_needed_modules(self):
+        """Return the set of top-level module names reachable from the
+        entry points (and the bootstrap script), plus PRUNE_KEEP and the
+        IMPORT_LOG content. Return None if some entry point can't be analyzed."""
+        # we can't analyze the target stdlib (pyc only, maybe another Python
+        # version): so, we follow imports through our own stdlib instead.
+        host_stdlib = [sysconfig.get_path('stdlib'),
+                       sysconfig.get_path('platstdlib')]
+        for d in (Path(host_stdlib[1]) / 'lib-dynload',
+                  Path(sys.base_prefix) / 'DLLs'):
+            if d.is_dir():
+                host_stdlib.append(str(d))
+        path = [str(d) for d in self.proj_dirs]
+        path.append(str(self.target_py_dir / 'Lib' / 'site-packages'))
+        path += host_stdlib
+        finder = modulefinder.ModuleFinder(path=path)
+        scripts = list(self.entry_point_sources)
+        bootstrap = self.bootstrap_dir / 'bootstrap.py'
+        if bootstrap.exists():
+            scripts.append(bootstrap)
+        for script in scripts:
+            self.msg(LOG_DEBUG, '->Debug - analyzing imports of', script)
+            try:
+                finder.run_script(str(script))
+            except Exception as e:
+                self.msg(LOG_VERBOSE, f"ERROR: can't analyze {script}!")
+                self.msg(LOG_VERBOSE, 'The following exception was raised:')
+                self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+                return None
+        keep = list(PRUNE_ALWAYS_KEEP) + list(self.cfg.PRUNE_KEEP)
+        if self.delay_compile_pycs:
+            keep.append('compileall')
+        for name in keep:
+            try:
+                finder.import_hook(name)
+            except ImportError: # not in our stdlib, but maybe in the target's
+                pass
+        # Pip must keep working, if we ship it: it loads its commands (and 
+        # the stdlib modules they need) dynamically, so we follow all of it
+        pip_dir = self.target_py_dir / 'Lib' / 'site-packages' / 'pip'
+        if self.pip_is_present and pip_dir.is_dir():
+            self.msg(LOG_DEBUG, '->Debug - analyzing imports of Pip')
+            for source in sorted(pip_dir.rglob('*.py')):
+                parts = source.relative_to(pip_dir.parent).with_suffix('').parts
+                if parts[-1] == '__init__':
+                    parts = parts[:-1]
+                try:
+                    finder.import_hook('.'.join(parts))
+                except Exception: # py2 leftovers, other Pythons' syntax...
+                    pass
+        needed = {name.split('.')[0]
+                  for name in list(finder.modules) + list(finder.badmodules)}
+        needed.update(name.split('.')[0] for name in keep)
+        if self.cfg.IMPORT_LOG:
+            needed |= _read_import_log(self.cfg.IMPORT_LOG)
+        return needed
+
+    def _prune_stdlib_zip(self, needed):
+        """Rewrite the pythonXY.zip stdlib, keeping needed modules only.
+        Return the number of bytes removed."""
+        removed = 0
+        for stdlib_zip in self.target_py_dir.glob('python*.zip'):
+            tmp = stdlib_zip.with_name(stdlib_zip.name + '.tmp')
+            with zipfile.ZipFile(stdlib_zip, 'r') as src, \
+                 zipfile.ZipFile(tmp, 'w') as dest:
+                for info in src.infolist():
+                    name = info.filename.split('/')[0]
+                    if '/' not in info.filename: # top-level module, eg "os.pyc"
+                        name = name.rsplit('.', 1)[0]
+                    if name in needed:
+                        dest.writestr(info, src.read(info))
+                    else:
+                        self.msg(LOG_DEBUG, '->Debug - pruned', info.filename)
+                        removed += info.file_size
+            os.replace(tmp, stdlib_zip)
+        return removed
+
+    def _prune_extensions(self, needed):
+        """Remove unneeded *.pyd extension modules, and runtime dlls left
+        without users. Return the number of bytes removed."""
+        removed = 0
+        for pyd in self.target_py_dir.glob('*.pyd'):
+            if pyd.stem not in needed:
+                self.msg(LOG_DEBUG, '->Debug - pruned', pyd.name)
+                removed += pyd.stat().st_size
+                pyd.unlink()
+        for dll in self.target_py_dir.glob('*.dll'):
+            for prefix, users in PRUNE_DLL_USERS.items():
+                if not dll.name.lower().startswith(prefix):
+                    continue
+                if not any((self.target_py_dir / f'{u}.pyd').exists()
+                           for u in users):
+                    self.msg(LOG_DEBUG, '->Debug - pruned', dll.name)
+                    removed += dll.stat().st_size
+                    dll.unlink()
+                break
+        return removed
+
+    def prune_python(self):
+        """Remove the stdlib modules and extension modules that are not
+        reachable from the entry points (or from Pip, if we ship it). 
+        Return False if something went wrong."""
+        self.msg(LOG_VERBOSE, "\n****** Pruning Python ******")
+        if not self.cfg.PRUNE_PYTHON:
+            self.msg(LOG_VERBOSE, 'Skipped, no pruning required.')
+            return True
+        if self.delay_have_pip:
+            self.msg(LOG_VERBOSE,
+                     "Skipped: can't prune Python before a delayed Pip install.")
+            return True
+        needed = self._find_needed_modules()
+        if needed is None:
+            self.msg(LOG_VERBOSE, 'ERROR: unable to figure out needed modules.')
+            return False
+        self.msg(LOG_DEBUG, '->Debug - needed modules:', sorted(needed))
+        removed = self._prune_stdlib_zip(needed)
+        removed += self._prune_extensions(needed)
+        self.count('bytes_removed', removed)
+        self.msg(LOG_VERBOSE,
+                 f'Python successfully pruned, {removed} bytes removed.')
         return True
 
+    def _find_profile_python(self):
+        """Return an interpreter matching the target minor version, 
+        or empty string if none is found."""
+        if self.cfg.PROFILE_PYTHON:
+            return self.cfg.PROFILE_PYTHON
+        ma, mi = self.target_py_version[:2]
+        if sys.platform == 'win32' and not self.cfg.DELAYED_INSTALL:
+            return str(self.target_py_dir / 'python.exe')  # the real thing
+        if sys.version_info[:2] == (ma, mi):
+            return sys.executable
+        return shutil.which(f'python{ma}.{mi}') or ''
+
+    def _target_sys_path(self):
+        """Return the target sys.path, as listed in the ._pth file."""
+        paths = []
+        for pth_file in self.target_py_dir.glob('*._pth'):
+            for line in pth_file.read_text().splitlines():
+                line = line.strip()
+                if line and not line.startswith(('#', 'import ')):
+                    paths.append(str((self.target_py_dir / line).resolve()))
+        return paths
+
+    def _profile_entry_point(self, pyexec, source, workdir):
+        """Run the imports of an entry point module under -X importtime.
+        Return a list of (module, self time, cumulative time), or None."""
+        try:
+            imports = _collect_imports(source)
+        except SyntaxError as e:
+            self.msg(LOG_VERBOSE, f"ERROR: can't parse {source}!")
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return None
+        sys_path = [str(workdir)] + self._target_sys_path()
+        code = f'import sys\nsys.path[:0] = {sys_path!r}\n'
+        for module, fromlist in imports:
+            code += f'try: __import__({module!r}, fromlist={fromlist!r})\n'
+            code += 'except Exception: pass\n'
+        args = [pyexec, '-X', 'importtime', '-E', '-S', '-c', code]
+        self.msg(LOG_DEBUG, '->Debug - profiling imports of', source)
+        try:
+            ret = subprocess.run(args, cwd=str(workdir), timeout=300,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 universal_newlines=True)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            self.msg(LOG_VERBOSE, f"ERROR: can't profile {source}!")
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return None
+        return _parse_importtime(ret.stderr)
+
+    def profile_imports(self):
+        """Write a report of the import times of each py/pyw entry point.
+        Return False if something went wrong."""
+        self.msg(LOG_VERBOSE, "\n****** Profiling imports ******")
+        if not self.cfg.PROFILE_IMPORTS:
+            self.msg(LOG_VERBOSE, 'Skipped, no profiling required.')
+            return True
+        if not self.entry_point_sources:
+            self.msg(LOG_VERBOSE, 'Skipped, no Python entry point present.')
+            return True
+        if self.target_py_version < (3, 7, 0, 32):
+            self.msg(LOG_VERBOSE, 'Skipped: no "-X importtime" before Python 3.7.')
+            return True
+        pyexec = self._find_profile_python()
+        if not pyexec:
+            ma, mi = self.target_py_version[:2]
+            self.msg(LOG_VERBOSE, 
+                     f'Skipped: no Python {ma}.{mi} found, set PROFILE_PYTHON.')
+            return True
+        self.msg(LOG_VERBOSE, f'Profiling with {pyexec}...')
+        if self.cfg.DELAYED_INSTALL:
+            self.msg(LOG_VERBOSE, 
+                     'Dependencies are not installed yet (delayed install).')
+        got_errors = False
+        report = {}
+        entry_points = [e for e in self.entry_points if e[2]]
+        for (entrypath, name, _), source in zip(entry_points, 
+                                                self.entry_point_sources):
+            workdir = (self.build_dir / entrypath).parent
+            times = self._profile_entry_point(pyexec, source, workdir)
+            if times is None:
+                got_errors = True
+                continue
+            times.sort(key=lambda t: t[1], reverse=True)
+            total = sum(t[1] for t in times)
+            report[name] = {'entry_point': str(entrypath), 
+                            'total_us': total, 'imports': times}
+            self.msg(LOG_VERBOSE, f'\n{name}: total import time {total} us')
+            for module, self_us, cumulative_us in times[:10]:
+                self.msg(LOG_VERBOSE, 
+                         f'{self_us:>10} us {cumulative_us:>10} us   {module}')
+        with open(self.bootstrap_dir / 'import_times.json', 'w') as f:
+            json.dump(report, f, indent=1)
+        if got_errors:
+            self.msg(LOG_VERBOSE, 'ERROR: not all entry points profiled.')
+            return False
+        self.msg(LOG_VERBOSE, 'Import times written to import_times.json.')
+        return True
+
+    def write_manifest(self):
+        """Write the build manifest (size and md5 of each file), for the 
+        bootstrap script to check the build at install time. 
+        Return False if something went wrong."""
+        self.msg(LOG_VERBOSE, "\n****** Writing build manifest ******")
+        if not self.cfg.VERIFY_INSTALL:
+            self.msg(LOG_VERBOSE, 'Skipped: no install check required in config file.')
+            return True
+        if not (self.bootstrap_dir / 'bootstrap.py').exists():
+            self.msg(LOG_VERBOSE, 'Skipped: no bootstrap script.')
+            return True
+        try:
+            files = _build_manifest(self.build_dir, MANIFEST_IGNORE_PATTERNS)
+            manifest = {'build': self.build_dir.name, 'files': files}
+            _ = (self.bootstrap_dir / BUILD_MANIFEST_FILE).write_text(
+                                                json.dumps(manifest, indent=1))
+        except OSError as e:
+            self.msg(LOG_VERBOSE, 'ERROR: build manifest not written.')
+            self.msg(LOG_VERBOSE, 'The following exception was raised:')
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return False
+        self.count('files_hashed', len(files))
+        self.msg(LOG_VERBOSE, f'Build manifest written: {len(files)} files.')
+        return True
+
+    def make_archive(self):
+        """Write the build into a zip file, next to the build dir. 
+        Return False if something went wrong."""
+        self.msg(LOG_VERBOSE, "\n****** Making archive ******")
+        if not self.cfg.ARCHIVE_OUTPUT:
+            self.msg(LOG_VERBOSE, 'Skipped, no archive required.')
+            return True
+        archive = self.build_dir.with_name(self.build_dir.name + '.zip')
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.build_dir):
+            for name in filenames:
+                path = Path(dirpath) / name
+                arcname = path.relative_to(self.build_dir.parent).as_posix()
+                files.append((arcname, path))
+        files.sort() # deterministic order
+        raw_sources = self._raw_archive_sources()
+        workers = os.cpu_count() or 1
+        self.msg(LOG_VERBOSE, f'Compressing {len(files)} files', 
+                 f'on {workers} threads...')
+        try:
+            with _ZipWriter(archive) as zw, \
+                 ThreadPoolExecutor(max_workers=workers) as pool:
+                pending = [] # a bounded window of compression jobs
+                for arcname, path in files:
+                    store = path.suffix.lower() in ARCHIVE_STORE_SUFFIXES
+                    st = path.stat()
+                    if st.st_size > ARCHIVE_STREAM_SIZE:
+                        job = None
+                    else:
+                        job = pool.submit(_deflate_file, path, store, 
+                                          raw_sources.get(path))
+                    pending.append((arcname, path, store, st.st_mtime, job))
+                    if len(pending) > workers * 4:
+                        self._write_archive_entry(zw, *pending.pop(0))
+                for entry in pending:
+                    self._write_archive_entry(zw, *entry)
+        except Exception as e:
+            self.msg(LOG_VERBOSE, f"ERROR: can't write {archive}!")
+            self.msg(LOG_VERBOSE, 'The following exception was raised:')
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return False
+        self.count('files_written', len(files))
+        self.count('bytes_written', archive.stat().st_size)
+        self.msg(LOG_VERBOSE, f'Archive {archive.name} successfully created', 
+                 f'({archive.stat().st_size} bytes).')
+        return True
+
+    def _raw_archive_sources(self):
+        """Map Python files to their entries in the embeddable package: 
+        if unchanged, they will be copied in the archive with no need to 
+        compress them again."""
+        sources = {}
+        if self.python_zip is None:
+            return sources
+        with zipfile.ZipFile(self.python_zip, 'r') as python_zip:
+            for info in python_zip.infolist():
+                if info.is_dir() or info.compress_type not in (
+                                    zipfile.ZIP_STORED, zipfile.ZIP_DEFLATED):
+                    continue
+                path = self.target_py_dir / info.filename
+                sources[path] = (self.python_zip, info)
+        self.msg(LOG_DEBUG, '->Debug - Python files to copy from', 
+                 self.python_zip, len(sources))
+        return sources
+
+    def _write_archive_entry(self, zw, arcname, path, store, mtime, job):
+        if job is None:
+            self.msg(LOG_DEBUG, '->Debug - streaming large file', arcname)
+            zw.write_stream(arcname, path, store)
+        else:
+            zw.write_entry(arcname, *job.result(), mtime)
+
+    def _make_target(self, pyversion):
+        """Return a Packit instance building the "pyversion" target of 
+        a build matrix, in its own subdir of self.build_dir."""
+        target = Packit(_clone_settings(self.cfg, PYTHON_VERSION=pyversion), 
+                        self.cache_dir)
+        target.catalog = self.load_catalog()
+        target.warm = self.warm
+        ma, mi, mc, arch = target.parse_pyversion()
+        name = f'py{ma}.{mi}.{mc}-{arch}'
+        target.build_dir = self.build_dir / name
+        target.msg_prefix = f'[{name}] '
+        for subscriber in self.subscribers:
+            if subscriber != self.print_message:
+                target.subscribe(subscriber)
+        return target
+
+    def _stage_shared_dirs(self, staging_dir):
+        """Copy PROJECTS and COPY_DIRS once, for all the matrix targets. 
+        Return a {original dir: staged dir} dict."""
+        shared = {}
+        ignore = shutil.ignore_patterns(*self.cfg.PROJECT_FILES_IGNORE_PATTERNS)
+        for kind, dirs in (('p', self.cfg.PROJECTS), ('c', self.cfg.COPY_DIRS)):
+            for n, item in enumerate(dirs or ()):
+                orig = self.cfg.HERE / Path(item[0])
+                if orig in shared:
+                    continue
+                staged = staging_dir / f'{kind}{n}_{orig.name}'
+                # on errors, let each target try again and report
+                if self._copy_files(orig, staged, 
+                                    ignore=ignore if kind == 'p' else None):
+                    shared[orig] = staged
+        return shared
+
+    def main_matrix(self):
+        """Build a distribution for each Python in PYTHON_VERSION (a list), 
+        each in its own subdir of the build dir. Project files are copied 
+        once and hardlinked into the targets, Pythons are downloaded 
+        concurrently, then the targets are built in parallel. 
+        Return a {target name: BuildReport} dict."""
+        self.msg(LOG_VERBOSE, "\n****** Preparing build matrix ******")
+        self.report = BuildReport()
+        self._make_build_dir()
+        targets = {}
+        for pyversion in self.cfg.PYTHON_VERSION:
+            target = self._make_target(pyversion)
+            name = target.build_dir.name
+            if name in targets:
+                self.msg(LOG_VERBOSE, f'Duplicate target <{pyversion}> skipped.')
+                continue
+            targets[name] = target
+        self.msg(LOG_VERBOSE, 'Targets:', ', '.join(targets))
+        self.msg(LOG_VERBOSE, 'Copying shared files...')
+        staging_dir = self.build_dir / 'winpackit_shared'
+        shared = self.run_stage(self._stage_shared_dirs, staging_dir)
+        self.msg(LOG_VERBOSE, 'Obtaining Pythons...')
+        pyfiles = self.run_stage(self.getfiles, [self.catalog.url(
+                                 t.target_py_version) for t in targets.values()], 
+                                 True)
+        for target, pyfile in zip(targets.values(), pyfiles):
+            target.python_zip = pyfile
+            target.shared_dirs = shared
+        if self.cfg.PIP_REQUIRED:
+            # once for all: each target would download the same file again, 
+            # while the others may be running it
+            self.msg(LOG_VERBOSE, 'Obtaining Get-pip...')
+            getpips = {}
+            for target in targets.values():
+                job = target._getpip_source() + (True,) # refresh, see obtain_getpip
+                getpips.setdefault(job, []).append(target)
+            getpip_files = self.run_stage(self.getfiles, list(getpips))
+            for getpip, users in zip(getpip_files, getpips.values()):
+                for target in users:
+                    target.getpip_file = getpip
+        # threads are enough here: Pip and compileall run in their own 
+        # processes, and the settings (with custom_action) need no pickling
+        with ThreadPoolExecutor(max_workers=len(targets)) as executor:
+            futures = {name: executor.submit(target.main) 
+                       for name, target in targets.items()}
+            results = {name: future.result() for name, future in futures.items()}
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        self.targets = targets
+        self.finish_uploads()
+        matrix_report = self.report.as_dict()
+        matrix_report['targets'] = {name: report.as_dict() 
+                                    for name, report in results.items()}
+        _ = (self.build_dir / 'build_report.json').write_text(
+                                        json.dumps(matrix_report, indent=2))
+        if not all(all(retcodes) for retcodes in results.values()):
+            self.msg(LOG_ALWAYS, '\n\nBuild matrix done - some errors occurred:')
+            verbose = LOG_ALWAYS
+        else:
+            self.msg(LOG_VERBOSE, '\n\nBuild matrix done.')
+            verbose = LOG_VERBOSE
+        for name, retcodes in results.items():
+            str_ret = 'ok' if all(retcodes) else 'ERROR'
+            self.msg(verbose, f'  {name + " ":.<21} ', str_ret)
+        return results
+
+    def _previous_reports(self):
+        """Return the build reports found in the previous builds, 
+        newest first (matrix builds have one for each target).""" 
+        reports = []
+        for pattern in ('winpackit_build_*/build_report.json', 
+                        'winpackit_build_*/*/build_report.json'):
+            for path in self.cfg.HERE.glob(pattern):
+                try:
+                    report = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    continue
+                if report.get('target') and report.get('stages'):
+                    reports.append((path.stat().st_mtime, str(path), report))
+        reports.sort(key=lambda item: item[0], reverse=True)
+        return [(path, report) for mtime, path, report in reports]
+
+    def _plan_dirs(self, dirs, ignore=None):
+        """Size the dirs to be copied: return a dict of files, bytes, 
+        and Python modules among them."""
+        plan = {'files': 0, 'bytes': 0, 'modules': 0}
+        for item in dirs or ():
+            for path in _walk_tree(self.cfg.HERE / Path(item[0]), ignore):
+                plan['files'] += 1
+                plan['bytes'] += path.stat().st_size
+                if path.suffix in ('.py', '.pyw'):
+                    plan['modules'] += 1
+        return plan
+
+    def _plan_estimates(self, plan, reports):
+        """Estimate stage times from the latest report for the same target 
+        (or else, from the latest report), scaled by the planned work.""" 
+        matching = [item for item in reports 
+                    if item[1]['target'] == plan['target']] or reports
+        if not matching:
+            return None
+        path, report = matching[0]
+        cached = {d['stage']: d['cached'] for d in plan['downloads']}
+        todo = {'copy_project_files': plan['copy_projects']['bytes'], 
+                'copy_other_files': plan['copy_other_dirs']['bytes'], 
+                'compile_files': plan['compile']['modules']}
+        stages = {}
+        for stage in report['stages']:
+            name, wall_time = stage['stage'], stage['wall_time']
+            counters = stage['counters']
+            done = counters.get('files_compiled' if name == 'compile_files' 
+                                else 'bytes_copied')
+            if cached.get(name) and counters.get('bytes_downloaded'):
+                wall_time = 0.0 # it will come from the cache this time
+            elif name in todo and done:
+                wall_time = wall_time * todo[name] / done
+            stages[name] = round(wall_time, 3)
+        return {'from': path, 'stages': stages, 
+                'total': round(sum(stages.values()), 3)}
+
+    def _plan_target(self, reports):
+        """Plan the build for our (single) target Python, 
+        without touching anything on disk.""" 
+        ma, mi, mc, arch = self.target_py_version or self.parse_pyversion()
+        plan = {'target': f'{ma}.{mi}.{mc}-{arch}', 
+                'build_dir': str(self.build_dir), 'downloads': []}
+        previous = {}  # bytes downloaded last time, by stage
+        for path, report in reports:
+            if report['target'] == plan['target']:
+                for stage in report['stages']:
+                    downloaded = stage['counters'].get('bytes_downloaded')
+                    if downloaded:
+                        previous.setdefault(stage['stage'], downloaded)
+        url = self.catalog.url((ma, mi, mc, arch))[0]
+        downloads = [('obtain_python', url, self.cfg.USE_CACHE, 
+                      url.split('/')[-1])]
+        if self.cfg.PIP_REQUIRED:  # from the cache only offline, see obtain_getpip
+            url, checksum, filename = self._getpip_source()
+            downloads.append(('obtain_getpip', url, 
+                              self.cfg.USE_CACHE and self.cfg.OFFLINE, filename))
+        for stage, url, use_cache, filename in downloads:
+            filepath = self.cache_dir / filename
+            cached = use_cache and filepath.exists()
+            plan['downloads'].append({
+                'stage': stage, 'url': url, 'cached': cached, 
+                'bytes': filepath.stat().st_size if cached 
+                         else previous.get(stage)})
+        dependencies = list(self.cfg.DEPENDENCIES or ())
+        if self.cfg.REQUIREMENTS:
+            dependencies.insert(0, f'-r {self.cfg.REQUIREMENTS}')
+        delayed = 'on the user machine' if self.cfg.DELAYED_INSTALL else 'now'
+        plan['pip'] = {'install': delayed if self.cfg.PIP_REQUIRED else 'no', 
+                       'dependencies': dependencies, 'layers': []}
+        if self.cfg.DEPENDENCY_LAYERS:
+            for name, items, fingerprint in self._layer_fingerprints():
+                cached = (self.cfg.USE_CACHE and not self.cfg.DELAYED_INSTALL 
+                          and (self.cache_dir / 'layers' / fingerprint).exists())
+                plan['pip']['layers'].append({'name': name, 'items': items, 
+                                              'cached': cached})
+        ignore = shutil.ignore_patterns(*self.cfg.PROJECT_FILES_IGNORE_PATTERNS)
+        plan['copy_projects'] = self._plan_dirs(self.cfg.PROJECTS, ignore)
+        plan['copy_other_dirs'] = self._plan_dirs(self.cfg.COPY_DIRS)
+        compile_now = self.cfg.COMPILE and self.cfg.PROJECTS
+        plan['compile'] = {'when': delayed if compile_now else 'no', 
+                           'modules': plan['copy_projects']['modules'] 
+                                      if compile_now else 0}
+        plan['estimates'] = self._plan_estimates(plan, reports)
+        return plan
+
+    def _print_plan(self, plan):
+        def size(nbytes):
+            if nbytes is None:
+                return 'size unknown'
+            return f'{nbytes / 1024 / 1024:.1f} MB'
+        self.msg(LOG_ALWAYS, f"\nTarget Python {plan['target']}", 
+                 f"(build dir: {plan['build_dir']}):")
+        for download in plan['downloads']:
+            name = download['url'].split('/')[-1]
+            what = ('from the cache' if download['cached'] 
+                    else f"download, {size(download['bytes'])}")
+            self.msg(LOG_ALWAYS, f'  {name}: {what}')
+        pip = plan['pip']
+        self.msg(LOG_ALWAYS, f"  Install Pip: {pip['install']};", 
+                 f"dependencies: {', '.join(pip['dependencies']) or 'none'}")
+        for layer in pip['layers']:
+            what = 'from the cache' if layer['cached'] else 'install'
+            self.msg(LOG_ALWAYS, f"  Layer <{layer['name']}>: {what}")
+        for key, label in (('copy_projects', 'Copy projects'), 
+                           ('copy_other_dirs', 'Copy other dirs')):
+            self.msg(LOG_ALWAYS, f'  {label}: {plan[key]["files"]} files,', 
+                     size(plan[key]['bytes']))
+        self.msg(LOG_ALWAYS, f"  Compile: {plan['compile']['when']}", 
+                 f"({plan['compile']['modules']} modules)")
+        estimates = plan['estimates']
+        if estimates is None:
+            self.msg(LOG_ALWAYS, '  Estimated time: unknown, no previous build.')
+        else:
+            self.msg(LOG_ALWAYS, f"  Estimated time: {estimates['total']} seconds", 
+                     f"(from {estimates['from']})")
+
+    def plan(self):
+        """Figure out what a build would do, and how long it would take, 
+        without touching anything on disk. Return the plan as a dict, 
+        with one item in "targets" for each target Python.""" 
+        self.msg(LOG_ALWAYS, "\n****** Build plan (dry run) ******")
+        self.load_catalog(save=False)
+        reports = self._previous_reports()
+        if isinstance(self.cfg.PYTHON_VERSION, (list, tuple)):
+            targets = {}
+            for pyversion in self.cfg.PYTHON_VERSION:
+                target = self._make_target(pyversion)
+                targets.setdefault(target.build_dir.name, target)
+            plans = [target._plan_target(reports) for target in targets.values()]
+        else:
+            plans = [self._plan_target(reports)]
+        for plan in plans:
+            self._print_plan(plan)
+        self.msg(LOG_ALWAYS, '\nNothing done: this was a dry run.')
+        return {'targets': plans}
+
+    def write_report(self):
+        """Add output sizes to the build report, and write it 
+        as build_report.json in the build dir."""
+        ma, mi, mc, arch = self.target_py_version
+        self.report.target = f'{ma}.{mi}.{mc}-{arch}'
+        files, size = _tree_size(self.build_dir)
+        self.report.output = {'build_dir': str(self.build_dir), 
+                              'files': files, 'bytes': size}
+        archive = self.build_dir.with_name(self.build_dir.name + '.zip')
+        if self.cfg.ARCHIVE_OUTPUT and archive.exists():
+            self.report.output['archive_bytes'] = archive.stat().st_size
+        self.report.save(self.build_dir / 'build_report.json')
+        self.msg(LOG_VERBOSE, '\nBuild report written in build_report.json:', 
+                 f'{self.report.totals()["wall_time"]} seconds,', 
+                 f'{size} bytes in {files} files.')
+
     def main(self):
-        retcodes = []
-        self.prepare_dirs()
-        python_file = self.obtain_python()
-        retcodes.append(self.unpack_python(python_file))
-        getpip_file = self.obtain_getpip()
-        retcodes.append(self.install_pip(getpip_file))
-        retcodes.append(self.install_dependencies())
-        retcodes.append(self.copy_project_files())
-        retcodes.append(self.compile_files())
-        retcodes.append(self.copy_other_files())
-        retcodes.append(self.make_bootstrap())
-        retcodes.append(self.run_custom_action())
-        retcodes.append(self.run_pip_freeze())
+        if isinstance(self.cfg.PYTHON_VERSION, (list, tuple)):
+            return self.main_matrix()
+        retcodes = self.report = BuildReport()
+        trace = self.subscribe(ChromeTrace()) if self.cfg.TRACE_FILE else None
+        stage = self.run_stage
+        stage(self.prepare_dirs)
+        python_file = stage(self.obtain_python)
+        retcodes.append(stage(self.unpack_python, python_file))
+        getpip_file = stage(self.obtain_getpip)
+        retcodes.append(stage(self.install_pip, getpip_file))
+        retcodes.append(stage(self.install_dependencies))
+        retcodes.append(stage(self.copy_project_files))
+        retcodes.append(stage(self.compile_files))
+        retcodes.append(stage(self.copy_other_files))
+        retcodes.append(stage(self.make_bootstrap))
+        retcodes.append(stage(self.run_custom_action))
+        retcodes.append(stage(self.run_pip_freeze))
+        retcodes.append(stage(self.slim_site_packages))
+        retcodes.append(stage(self.prune_python))
+        retcodes.append(stage(self.profile_imports))
+        retcodes.append(stage(self.write_manifest))
+        retcodes.append(stage(self.make_archive))
+        self.finish_uploads()
+        self.write_report()
+        if trace:
+            self.unsubscribe(trace)
+            trace.save(self.build_dir / self.cfg.TRACE_FILE)
+            self.msg(LOG_VERBOSE, f'Trace written in {self.cfg.TRACE_FILE}.')
         if not all(retcodes):
             self.msg(LOG_ALWAYS, '\n\nDone - some errors occurred:')
             for op, ret in zip(['  Unpack Python........ ', 
@@ -900,13 +3541,221 @@ class Packit:
                                 '  Copy other files..... ', 
                                 '  Make bootstrap script ', 
                                 '  Custom action........ ', 
-                                '  Final pip freeze..... '], retcodes):
+                                '  Final pip freeze..... ', 
+                                '  Slim site-packages... ', 
+                                '  Prune Python......... ', 
+                                '  Profile imports...... ', 
+                                '  Write manifest....... ', 
+                                '  Make archive......... '], retcodes):
                 str_ret = 'ok' if ret else 'ERROR'
                 self.msg(LOG_ALWAYS, op, str_ret)
         else:
             self.msg(LOG_VERBOSE, '\n\nDone.')
         return retcodes
 
+    def snapshot_sources(self):
+        """Return a {(source dir, relative path): (mtime, size)} snapshot of 
+        the files in PROJECTS and COPY_DIRS, as they would be copied. 
+        The REQUIREMENTS file is there too, with None as the source dir."""
+        snapshot = {}
+        ignore = shutil.ignore_patterns(*self.cfg.PROJECT_FILES_IGNORE_PATTERNS)
+        for dirs, dir_ignore in ((self.cfg.PROJECTS, ignore), 
+                                 (self.cfg.COPY_DIRS, None)):
+            for item in dirs or ():
+                orig = self.cfg.HERE / Path(item[0])
+                for path in _walk_tree(orig, dir_ignore):
+                    try:
+                        st = path.stat()
+                    except OSError: # just deleted
+                        continue
+                    snapshot[(orig, path.relative_to(orig))] = (st.st_mtime_ns, 
+                                                                st.st_size)
+        if self.cfg.REQUIREMENTS:
+            try:
+                st = Path(self.cfg.REQUIREMENTS).stat()
+                snapshot[(None, Path(self.cfg.REQUIREMENTS))] = (st.st_mtime_ns, 
+                                                                 st.st_size)
+            except OSError:
+                pass
+        return snapshot
+
+    def _sync_module_removed(self, dst):
+        """Remove the compiled leftovers of the dst module."""
+        if self.cfg.PYC_ONLY_DISTRIBUTION:
+            leftovers = [dst.with_suffix('.pyc')]
+        else:
+            leftovers = dst.parent.glob(f'__pycache__/{dst.stem}.*.pyc')
+        for path in leftovers:
+            if path.exists():
+                path.unlink()
+
+    def _sync_manifest(self, synced):
+        """Update the build manifest (if any) for the synced files in the 
+        build dir, and their compiled modules. Return False if something 
+        went wrong."""
+        manifest_file = self.bootstrap_dir / BUILD_MANIFEST_FILE
+        if not (self.cfg.VERIFY_INSTALL and manifest_file.exists()):
+            return True
+        try:
+            manifest = json.loads(manifest_file.read_text())
+            files = manifest['files']
+            for dst in synced:
+                found = [dst]
+                if dst.suffix in ('.py', '.pyw'):
+                    found.append(dst.with_suffix('.pyc'))
+                    found.extend(dst.parent.glob(f'__pycache__/{dst.stem}.*.pyc'))
+                rel = dst.relative_to(self.build_dir)
+                stale = [rel.as_posix()]
+                if dst.suffix in ('.py', '.pyw'):
+                    stale.append(rel.with_suffix('.pyc').as_posix())
+                    stale.append((rel.parent / '__pycache__' / 
+                                  f'{rel.stem}.*.pyc').as_posix())
+                for key in [key for key in files 
+                            if any(fnmatch.fnmatchcase(key, p) for p in stale)]:
+                    del files[key]
+                for path in found:
+                    if path.is_file():
+                        files[path.relative_to(self.build_dir).as_posix()] = (
+                                        path.stat().st_size, _hashfile(path))
+            _ = manifest_file.write_text(json.dumps(manifest, indent=1))
+        except (OSError, ValueError, KeyError) as e:
+            self.msg(LOG_VERBOSE, 'ERROR: build manifest not updated.')
+            self.msg(LOG_VERBOSE, 'The following exception was raised:')
+            self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+            return False
+        self.msg(LOG_VERBOSE, f'Build manifest updated: {len(synced)} files.')
+        return True
+
+    def _sync_dependencies(self):
+        """Install the dependencies again, after a change in REQUIREMENTS: 
+        Pip first, if it was slimmed away, and slim site-packages again 
+        afterwards. Return False if something went wrong, or if a pruned 
+        Python needs a full build instead."""
+        if self.cfg.PRUNE_PYTHON and not self.delay_have_pip:
+            self.msg(LOG_ALWAYS, 'ERROR: REQUIREMENTS changed, but Python was '
+                     'pruned without the new dependencies in mind.')
+            self.msg(LOG_ALWAYS, 'Dependencies not installed: make a full build.')
+            return False
+        if self.cfg.PIP_REQUIRED and not self.pip_is_present: # slimmed away
+            if not self.install_pip(self.obtain_getpip()):
+                return False
+        requirements = self.bootstrap_dir / 'requirements.txt'
+        if requirements.exists(): # delayed install: write it from scratch
+            requirements.unlink()
+        return self.install_dependencies() and self.slim_site_packages()
+
+    def sync_changes(self, old, new):
+        """Bring the build dir up to date with the changes in the sources, 
+        from the old to the new snapshot (see snapshot_sources): copy, 
+        compile or delete the affected files only, and install the 
+        dependencies again if REQUIREMENTS changed. The build manifest 
+        and the archive are kept up to date too. Return False if 
+        something went wrong."""
+        if self.targets: # a build matrix: same sources for all the targets
+            return all([target.sync_changes(old, new) 
+                        for target in self.targets.values()])
+        dest_dirs = dict(zip(self.proj_dirs, self.target_proj_dirs))
+        dest_dirs.update(zip(self.copy_dirs, self.target_copy_dirs))
+        changed = [key for key in new if old.get(key) != new[key]]
+        deleted = [key for key in old if key not in new]
+        to_compile = []
+        synced = [] # the files touched in the build dir
+        no_errors = True
+        for orig, relpath in deleted:
+            if orig is None:
+                continue # we keep the dependencies already installed
+            dst = dest_dirs[orig] / relpath
+            synced.append(dst)
+            try:
+                if dst.exists():
+                    dst.unlink()
+                if dst.suffix in ('.py', '.pyw'):
+                    self._sync_module_removed(dst)
+                self.msg(LOG_VERBOSE, f'Deleted: {dst}')
+            except Exception as e:
+                self.msg(LOG_VERBOSE, f"ERROR: can't delete {dst}!")
+                self.msg(LOG_VERBOSE, 'The following exception was raised:')
+                self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+                no_errors = False
+        for orig, relpath in changed:
+            if orig is None:
+                continue # see below
+            src = orig / relpath
+            dst = dest_dirs[orig] / relpath
+            is_project = orig in self.proj_dirs
+            compiling = is_project and self.cfg.COMPILE
+            if (compiling and self.cfg.PYC_ONLY_DISTRIBUTION 
+                    and src.suffix == '.pyw' and src in self.entry_point_sources):
+                dst = dst.with_suffix('.py') # as compile_files does
+            synced.append(dst)
+            try:
+                dst.parent.mkdir(parents=True, exist_ok=True)
+                # replace the old file, don't write into it: in a build 
+                # matrix, it is hardlinked to the other targets' copies
+                if dst.exists():
+                    dst.unlink()
+                shutil.copy2(src, dst)
+                self.count('files_copied')
+                self.count('bytes_copied', new[(orig, relpath)][1])
+                self.emit(FileCopied(src, dst, new[(orig, relpath)][1], False))
+                self.msg(LOG_VERBOSE, f'Copied: {dst}')
+            except Exception as e:
+                self.msg(LOG_VERBOSE, f"ERROR: can't copy {src}!")
+                self.msg(LOG_VERBOSE, 'The following exception was raised:')
+                self.msg(LOG_VERBOSE, e.__class__.__name__, e.args)
+                no_errors = False
+                continue
+            if compiling and dst.suffix == '.py' and not self.cfg.DELAYED_INSTALL:
+                self._sync_module_removed(dst)
+                to_compile.append(dst)
+        if to_compile:
+            if self._compileall(*to_compile):
+                self.msg(LOG_VERBOSE, f'{len(to_compile)} module(s) compiled.')
+                if self.cfg.PYC_ONLY_DISTRIBUTION:
+                    for dst in to_compile:
+                        dst.unlink()
+            else:
+                self.msg(LOG_VERBOSE, 'ERROR: not all modules successfully compiled.')
+                no_errors = False
+        if any(orig is None for orig, relpath in changed):
+            if not self._sync_dependencies():
+                no_errors = False
+            if ((self.bootstrap_dir / BUILD_MANIFEST_FILE).exists() 
+                    and not self.write_manifest()): # site-packages changed
+                no_errors = False
+        elif synced and not self._sync_manifest(synced):
+            no_errors = False
+        if self.cfg.ARCHIVE_OUTPUT and no_errors and not self.make_archive():
+            no_errors = False
+        return no_errors
+
+    def watch(self, interval=WATCH_INTERVAL, rounds=None):
+        """Make a full build, then keep the build dir up to date with the 
+        project files, scanning them every "interval" seconds (for "rounds" 
+        times, or until Ctrl+C). Return the result of the full build."""
+        snapshot = self.snapshot_sources()
+        ret = self.main()
+        self.msg(LOG_ALWAYS, '\nWatching for changes... Press Ctrl+C to stop.')
+        done = 0
+        try:
+            while rounds is None or done < rounds:
+                time.sleep(interval)
+                done += 1
+                new = self.snapshot_sources()
+                if new == snapshot:
+                    continue
+                start = time.perf_counter()
+                ok = self.sync_changes(snapshot, new)
+                snapshot = new
+                elapsed = round(time.perf_counter() - start, 3)
+                if ok:
+                    self.msg(LOG_ALWAYS, f'Build updated in {elapsed} seconds.')
+                else:
+                    self.msg(LOG_ALWAYS, 'Build updated - some errors occurred.')
+        except KeyboardInterrupt:
+            self.msg(LOG_ALWAYS, '\nWatch mode stopped.')
+        return ret
+
 
 # this is the auto-generated config script
 PACKIT_CONFIG_SCRIPT = """\
@@ -932,13 +3781,35 @@ VERBOSE = 1
 # Set to `False` to ignore previously stored items. 
 USE_CACHE = True
 
+# A cache shared by your build machines (optional): the url of a web server 
+# accepting GET and PUT requests, or a directory (e.g. a network share). 
+# Downloads and Pip's cache are looked up here before going to the internet, 
+# and new ones are stored here. See WinPackIt docs for details.
+REMOTE_CACHE_URL = ''
+
+# Set to `True` to build without internet access: Python, Get-pip and 
+# packages come from the cache only (see `python -m winpackit --export-index`), 
+# and a cache miss is an error. See WinPackIt docs for details.
+OFFLINE = False
+
+# Big downloads (e.g. Python) are split in byte ranges, fetched over this 
+# many parallel connections (if the server supports it). `1` to turn it off.
+DOWNLOAD_CONNECTIONS = 4
+
 # The target Python version. 
 # An empty or invalid string defaults to your current version *or* to 
 # Python 3.5 if you run Python<3.5 (which should not be possible anyway!).
 # Set to `'3'` to default to the *latest* Python 3. 
+# Use a list (eg `['3.8-32', '3.8-64', '3.10']`) to build for many targets 
+# at once, each in its own subdir of the build dir. 
 # See WinPackIt docs for details.
 PYTHON_VERSION = '3'
 
+# URL of a mirror of https://www.python.org/ftp/python/ (with directory 
+# listings), to find Python releases newer than this WinPackIt version knows.
+# Leave empty to use the built-in list only.
+PY_CATALOG_MIRROR = ''
+
 # Set to `True` to program a "delayed install" on the target machine. 
 # This way, you won't need to run the target Python on your own machine:
 # pip-installing packages and compiling pyc files will occur at "install time". 
@@ -964,6 +3835,13 @@ REQUIREMENTS = ''
 # processed first. 
 DEPENDENCIES = []
 
+# Dependencies shared by many projects may be installed in layers, each cached 
+# and then hardlinked into the next builds; REQUIREMENTS and DEPENDENCIES go 
+# on top. Each layer is a list: a name, then packages and/or "-r file" items, 
+# e.g. DEPENDENCY_LAYERS = [['base', '-r requirements-base.txt'], 
+#                           ['qt', 'PyQt5', 'pyqtgraph']]. See WinPackIt docs.
+DEPENDENCY_LAYERS = []
+
 # If `True`, use WinPackIt cache to store Pip cache too. 
 # If `False`, `--no-cache` will be passed to Pip. 
 PIP_CACHE = True
@@ -1013,6 +3891,69 @@ PYC_ONLY_DISTRIBUTION = False
 # See WinPackIt docs for details.
 COPY_DIRS = []
 
+# =============================================================================
+# PRUNING SETTINGS
+# =============================================================================
+
+# If `True`, remove from the Python stdlib zip and extension modules (`*.pyd`) 
+# whatever your entry points don't import. Imports are followed statically, 
+# so dynamic imports (`importlib.import_module`, `__import__`...) will be missed: 
+# list them in PRUNE_KEEP and/or use IMPORT_LOG. See WinPackIt docs for details.
+PRUNE_PYTHON = False
+
+# A list of top-level module names to keep anyway, e.g. `['sqlite3', '_ssl']`.
+PRUNE_KEEP = []
+
+# Path to an import log captured at runtime: either a list of module names, 
+# one per line, or the output of `python -X importtime`. Optional.
+IMPORT_LOG = ''
+
+# If `True`, remove from site-packages what your dependencies don't need at 
+# run time: test suites, C sources and headers, type stubs, compiled modules 
+# for other Pythons, Pip and Setuptools themselves etc. (see the list in 
+# `winpackit.SLIM_DEFAULT_PATTERNS`). See WinPackIt docs for details.
+SLIM_SITE_PACKAGES = False
+
+# More patterns to remove: file paths as listed in the RECORD files 
+# (e.g. `'*/benchmarks/*'`) or distribution names (e.g. `'pywin32'`).
+SLIM_PATTERNS = []
+
+# Patterns (file paths or distribution names) to keep anyway, 
+# e.g. `['setuptools', 'numpy/*/tests/*']`.
+SLIM_KEEP = []
+
+# =============================================================================
+# PROFILING SETTINGS
+# =============================================================================
+
+# If `True`, time the imports of each `.py`/`.pyw` entry point in the build, 
+# and write a report in `winpackit_bootstrap/import_times.json`. 
+# Requires a target Python 3.7+. See WinPackIt docs for details.
+PROFILE_IMPORTS = False
+
+# Path to a Python interpreter matching the target minor version, 
+# used for profiling. Leave empty to let WinPackIt find one. 
+PROFILE_PYTHON = ''
+
+# =============================================================================
+# OUTPUT SETTINGS
+# =============================================================================
+
+# Write a manifest of the build (size and md5 of each file), checked by 
+# `install.bat` before installing: set to `'hash'` (full check), `'size'` 
+# (quick check, sizes only) or `''` (no manifest, no check). 
+VERIFY_INSTALL = 'hash'
+
+# If `True`, also pack the build directory into a zip file ready to be 
+# distributed (`winpackit_build_<timestamp>.zip`). Files are compressed 
+# in parallel; already compressed file types (images, zips...) are stored.
+ARCHIVE_OUTPUT = False
+
+# Set to a file name (eg `'trace.json'`) to record a trace of the build, 
+# written in the build directory. Open it in chrome://tracing or 
+# https://ui.perfetto.dev to see stages, processes and downloads over time.
+TRACE_FILE = ''
+
 # =============================================================================
 # =============================================================================
 
@@ -1038,29 +3979,292 @@ def custom_action(packit_instance):
 # =============================================================================
 if __name__ == '__main__':
     import os
+    import sys
+    import json
     from pathlib import Path
     from collections import namedtuple
     from winpackit import Packit
     HERE = Path(__file__).parent.resolve()
     os.chdir(str(HERE))
-    cfg = namedtuple('cfg', ['HERE', 'VERBOSE', 'USE_CACHE', 'PYTHON_VERSION', 
+    cfg = namedtuple('cfg', ['HERE', 'VERBOSE', 'USE_CACHE', 'REMOTE_CACHE_URL', 
+                             'OFFLINE', 'DOWNLOAD_CONNECTIONS', 
+                             'PYTHON_VERSION', 'PY_CATALOG_MIRROR', 
                              'DELAYED_INSTALL', 'PIP_REQUIRED', 'REQUIREMENTS', 
-                             'DEPENDENCIES', 'PIP_CACHE', 'PIP_ARGS', 
+                             'DEPENDENCIES', 'DEPENDENCY_LAYERS', 
+                             'PIP_CACHE', 'PIP_ARGS', 
                              'PIP_INSTALL_ARGS', 'PROJECTS', 
                              'PROJECT_FILES_IGNORE_PATTERNS', 'COMPILE', 
                              'PYC_ONLY_DISTRIBUTION', 'COPY_DIRS',
+                             'PRUNE_PYTHON', 'PRUNE_KEEP', 'IMPORT_LOG',
+                             'SLIM_SITE_PACKAGES', 'SLIM_PATTERNS', 'SLIM_KEEP', 
+                             'PROFILE_IMPORTS', 'PROFILE_PYTHON', 
+                             'VERIFY_INSTALL', 'ARCHIVE_OUTPUT', 'TRACE_FILE',
                              'WELCOME_MESSAGE', 'GOODBYE_MESSAGE', 
                              'custom_action'])
-    pack_settings = cfg(HERE, VERBOSE, USE_CACHE, PYTHON_VERSION, 
+    pack_settings = cfg(HERE, VERBOSE, USE_CACHE, REMOTE_CACHE_URL, OFFLINE, 
+                        DOWNLOAD_CONNECTIONS, 
+                        PYTHON_VERSION, PY_CATALOG_MIRROR, 
                         DELAYED_INSTALL, PIP_REQUIRED, REQUIREMENTS, 
-                        DEPENDENCIES, PIP_CACHE, PIP_ARGS, PIP_INSTALL_ARGS, 
+                        DEPENDENCIES, DEPENDENCY_LAYERS, 
+                        PIP_CACHE, PIP_ARGS, PIP_INSTALL_ARGS, 
                         PROJECTS, PROJECT_FILES_IGNORE_PATTERNS, COMPILE, 
-                        PYC_ONLY_DISTRIBUTION, COPY_DIRS, WELCOME_MESSAGE, 
-                        GOODBYE_MESSAGE, custom_action)
-    Packit(settings=pack_settings).main()
+                        PYC_ONLY_DISTRIBUTION, COPY_DIRS, 
+                        PRUNE_PYTHON, PRUNE_KEEP, IMPORT_LOG, 
+                        SLIM_SITE_PACKAGES, SLIM_PATTERNS, SLIM_KEEP, 
+                        PROFILE_IMPORTS, 
+                        PROFILE_PYTHON, VERIFY_INSTALL, ARCHIVE_OUTPUT, TRACE_FILE, 
+                        WELCOME_MESSAGE, GOODBYE_MESSAGE, custom_action)
+    packit = Packit(settings=pack_settings)
+    if '--dry-run' in sys.argv[1:]:  # add --json for a json plan
+        plan = packit.plan()
+        if '--json' in sys.argv[1:]:
+            print(json.dumps(plan, indent=2))
+    elif '--watch' in sys.argv[1:]:  # keep the build up to date, Ctrl+C to stop
+        packit.watch()
+    else:
+        packit.main()
 
 """
 
+# build server (python -m winpackit --serve)
+SERVE_DEFAULT_ADDRESS = ('127.0.0.1', 8765)
+SERVE_MAX_QUEUED = 100 # builds waiting for a worker, at most
+SERVE_JOB_TTL = 24 * 3600 # seconds a finished build is still listed
+SERVE_MAX_JOBS = 1000 # finished builds listed, at most
+# the settings a build request may set: not those running programs, 
+# writing files or reaching servers of the client's choice
+SERVE_REQUEST_SETTINGS = (
+    'VERBOSE', 'USE_CACHE', 'OFFLINE', 'DOWNLOAD_CONNECTIONS', 'PYTHON_VERSION', 
+    'DELAYED_INSTALL', 'PIP_REQUIRED', 'REQUIREMENTS', 'DEPENDENCIES', 
+    'DEPENDENCY_LAYERS', 'PIP_CACHE', 'PROJECTS', 'PROJECT_FILES_IGNORE_PATTERNS', 
+    'COMPILE', 'PYC_ONLY_DISTRIBUTION', 'COPY_DIRS', 'PRUNE_PYTHON', 'PRUNE_KEEP', 
+    'IMPORT_LOG', 'SLIM_SITE_PACKAGES', 'SLIM_PATTERNS', 'SLIM_KEEP', 
+    'PROFILE_IMPORTS', 'VERIFY_INSTALL', 'ARCHIVE_OUTPUT', 
+    'WELCOME_MESSAGE', 'GOODBYE_MESSAGE')
+
+# settings missing in a build request: the same as in a new runner module
+_DEFAULT_SETTINGS = {
+    'VERBOSE': 1, 'USE_CACHE': True, 'REMOTE_CACHE_URL': '', 'OFFLINE': False, 
+    'DOWNLOAD_CONNECTIONS': 4, 
+    'PYTHON_VERSION': '3', 
+    'PY_CATALOG_MIRROR': '', 'DELAYED_INSTALL': False, 'PIP_REQUIRED': True, 
+    'REQUIREMENTS': '', 'DEPENDENCIES': [], 'DEPENDENCY_LAYERS': [], 
+    'PIP_CACHE': True, 'PIP_ARGS': [], 
+    'PIP_INSTALL_ARGS': [], 'PROJECTS': [], 'PROJECT_FILES_IGNORE_PATTERNS': [], 
+    'COMPILE': True, 'PYC_ONLY_DISTRIBUTION': False, 'COPY_DIRS': [], 
+    'PRUNE_PYTHON': False, 'PRUNE_KEEP': [], 'IMPORT_LOG': '', 
+    'SLIM_SITE_PACKAGES': False, 'SLIM_PATTERNS': [], 'SLIM_KEEP': [], 
+    'PROFILE_IMPORTS': False, 'PROFILE_PYTHON': '', 'VERIFY_INSTALL': 'hash', 
+    'ARCHIVE_OUTPUT': False, 
+    'TRACE_FILE': '', 
+    'WELCOME_MESSAGE': '\nInstalling project... Please wait...\n\n', 
+    'GOODBYE_MESSAGE': 'Done.\nPress ENTER to exit.'}
+
+def _settings_from_request(payload, here, root=None):
+    """Return the settings for a build request: a JSON object with the 
+    runner settings (only those in SERVE_REQUEST_SETTINGS), relative paths 
+    starting from HERE (itself relative to here). If root is given, all 
+    the paths must be inside it. Raise ValueError if something is wrong."""
+    if not isinstance(payload, dict):
+        raise ValueError('A build request must be a JSON object.')
+    unknown = set(payload) - set(_DEFAULT_SETTINGS) - {'HERE'}
+    if unknown:
+        raise ValueError(f'Unknown settings: {", ".join(sorted(unknown))}.')
+    refused = set(payload) - set(SERVE_REQUEST_SETTINGS) - {'HERE'}
+    if refused:
+        raise ValueError('Settings not allowed in a build request: '
+                         f'{", ".join(sorted(refused))}.')
+    # no Pip options in disguise (only requirements files)
+    requirements = list(payload.get('DEPENDENCIES', ()))
+    for layer in payload.get('DEPENDENCY_LAYERS', ()):
+        requirements += list(layer)[1:]
+    for item in requirements:
+        if str(item).startswith('-') and not str(item).startswith('-r '):
+            raise ValueError(f'Pip options not allowed in a build request: {item}.')
+    settings = copy.deepcopy(_DEFAULT_SETTINGS)
+    settings.update(payload)
+    settings['HERE'] = (Path(here) / payload.get('HERE', '.')).resolve()
+    # the runner module would chdir into HERE
+    for key in ('REQUIREMENTS', 'IMPORT_LOG'):
+        if settings[key]:
+            settings[key] = str(settings['HERE'] / settings[key])
+    settings['DEPENDENCY_LAYERS'] = [
+        [item if n == 0 or not item.startswith('-r ') 
+         else '-r ' + str(settings['HERE'] / item[3:].strip()) 
+         for n, item in enumerate(layer)] 
+        for layer in settings['DEPENDENCY_LAYERS']]
+    if root is not None:
+        paths = [settings['HERE']]
+        paths += [settings['HERE'] / item[0] 
+                  for item in settings['PROJECTS'] + settings['COPY_DIRS']]
+        paths += [settings[key] for key in ('REQUIREMENTS', 'IMPORT_LOG') 
+                  if settings[key]]
+        paths += [item[3:] for layer in settings['DEPENDENCY_LAYERS'] 
+                  for item in layer[1:] if item.startswith('-r ')]
+        root = Path(root).resolve()
+        for path in paths:
+            try:
+                Path(path).resolve().relative_to(root)
+            except ValueError:
+                raise ValueError(f'{path} is outside of {root}.') from None
+    settings['custom_action'] = lambda packit_instance: True
+    return SimpleNamespace(**settings)
+
+
+class _BuildRequestHandler(BaseHTTPRequestHandler):
+    def _reply(self, code, data):
+        body = json.dumps(data, indent=2).encode()
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/builds':
+            self._reply(404, {'error': 'Not found.'})
+            return
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            payload = json.loads(self.rfile.read(length).decode() or '{}')
+            wait = isinstance(payload, dict) and payload.pop('wait', False)
+            submitted = self.server.submit(payload)
+        except ValueError as e:
+            self._reply(400, {'error': str(e)})
+            return
+        if submitted is None:
+            self._reply(503, {'error': 'Too many builds queued, try again later.'})
+            return
+        job, future = submitted
+        if wait:
+            future.result()
+        self._reply(200 if wait else 202, self.server.status(job['id']))
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/builds':
+            self._reply(200, self.server.status())
+            return
+        job = None
+        if path.startswith('/builds/') and path[8:].isdigit():
+            job = self.server.status(int(path[8:]))
+        if job is None:
+            self._reply(404, {'error': 'Not found.'})
+        else:
+            self._reply(200, job)
+
+
+class BuildServer(ThreadingMixIn, HTTPServer):
+    """A long-lived WinPackIt, running the builds requested over HTTP 
+    (see serve), at most "workers" at a time. All the builds share the 
+    same cache dir, and a WarmCache. Requests may only build projects 
+    inside root (default: here). Finished builds are forgotten after 
+    job_ttl seconds, or when there are more than max_jobs."""
+    daemon_threads = True
+
+    def __init__(self, address, cache_dir, workers=None, here=None, root=None, 
+                 job_ttl=SERVE_JOB_TTL, max_jobs=SERVE_MAX_JOBS):
+        super().__init__(address, _BuildRequestHandler)
+        self.here = Path(here or Path.cwd())
+        self.root = Path(root or self.here).resolve()
+        self.job_ttl = job_ttl
+        self.max_jobs = max_jobs
+        self.cache_dir = Path(cache_dir).resolve()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.warm = WarmCache(self.cache_dir / 'winpackit_templates')
+        self.workers = workers or os.cpu_count()
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.slots = threading.BoundedSemaphore(SERVE_MAX_QUEUED)
+        self.jobs_lock = threading.Lock()
+        self.jobs = {} # job id -> job status (a dict)
+        self.finished = {} # job id -> when it finished, oldest first
+        self.last_id = 0
+
+    def _forget_jobs(self):
+        """Drop the finished builds too old, or too many (under jobs_lock)."""
+        now = time.time()
+        for job_id, finished in list(self.finished.items()):
+            if now - finished > self.job_ttl or len(self.finished) > self.max_jobs:
+                del self.finished[job_id]
+                del self.jobs[job_id]
+
+    def submit(self, payload):
+        """Queue a build request (see _settings_from_request). 
+        Return (job, future), or None if too many builds are queued."""
+        settings = _settings_from_request(payload, self.here, self.root)
+        if not self.slots.acquire(blocking=False):
+            return None
+        with self.jobs_lock:
+            self._forget_jobs()
+            self.last_id += 1
+            job = {'id': self.last_id, 'status': 'queued', 'ok': None, 
+                   'build_dir': None, 'error': None, 'report': None}
+            self.jobs[job['id']] = job
+        return job, self.executor.submit(self._build, job, settings)
+
+    def _build(self, job, settings):
+        try:
+            packit = Packit(settings, self.cache_dir)
+            packit.warm = self.warm
+            # more builds may start in the same second
+            packit.build_dir = packit.build_dir.with_name(
+                                    f'{packit.build_dir.name}_{job["id"]}')
+            packit.msg_prefix = f'[build {job["id"]}] '
+            job.update(status='running', build_dir=str(packit.build_dir))
+            report = packit.main()
+            if isinstance(report, dict): # a build matrix
+                job['report'] = {name: r.as_dict() for name, r in report.items()}
+                ok = all(all(r) for r in report.values())
+            else:
+                job['report'] = report.as_dict()
+                ok = all(report)
+            job.update(status='done', ok=ok)
+        except (Exception, SystemExit) as e: # fatal errors call sys.exit
+            job.update(status='failed', ok=False, 
+                       error=f'{e.__class__.__name__}: {e}')
+        finally:
+            with self.jobs_lock:
+                self.finished[job['id']] = time.time()
+            self.slots.release()
+        return job
+
+    def status(self, job_id=None):
+        """Return the status of a build, or a list of all the builds 
+        (without their reports). None if there is no such build."""
+        with self.jobs_lock:
+            self._forget_jobs()
+            if job_id is None:
+                return [{k: v for k, v in job.items() if k != 'report'} 
+                        for job in self.jobs.values()]
+            job = self.jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown(wait=False)
+
+
+def serve(address=SERVE_DEFAULT_ADDRESS, workers=None, cache_dir=None, 
+          root=None):
+    """Run a build server on address, until Ctrl+C. POST a JSON object 
+    with the runner settings to /builds to request a build; GET /builds 
+    and /builds/<id> for the status. Only projects inside root (default: 
+    the current dir) may be built."""
+    print(f'This is the WinPackIt script version {version}.')
+    if cache_dir is None:
+        cache_dir = Path.cwd() / 'winpackit_cache'
+    server = BuildServer(address, cache_dir, workers, root=root)
+    host, port = server.server_address[:2]
+    print(f'Build server listening on http://{host}:{port}/builds,', 
+          f'{server.workers} workers. Press Ctrl+C to stop.')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print('\nBuild server stopped.')
+    finally:
+        server.server_close()
+    return 0
+
 def make_runner_script(namefile):
     namefile = Path(namefile)
     print(f'This is the WinPackIt script version {version}.')
@@ -1075,10 +4279,318 @@ def make_runner_script(namefile):
            'to package your project.')
     return 0
 
+def make_delta(old_build, new_build, output=None):
+    """Make a delta package to update old_build into new_build: a zip file 
+    with added/changed files, a manifest (with a delete list) and an 
+    apply script for the target Python."""
+    old_build, new_build = Path(old_build), Path(new_build)
+    print(f'This is the WinPackIt script version {version}.')
+    print(f'Making a delta package from {old_build.name} to {new_build.name}...')
+    for build in (old_build, new_build):
+        if not (build / 'install.bat').exists():
+            print(f'\n{build} is not a WinPackIt build directory!')
+            return 1
+    if output is None:
+        output = Path.cwd() / f'winpackit_delta_{new_build.name}.zip'
+    output = Path(output)
+    old = _build_manifest(old_build, DELTA_IGNORE_PATTERNS)
+    new = _build_manifest(new_build, DELTA_IGNORE_PATTERNS)
+    delta = {'old': old_build.name, 'new': new_build.name, 
+             'add': {p: new[p] for p in sorted(new) if p not in old}, 
+             'change': {p: (old[p][1],) + new[p] for p in sorted(new) 
+                        if p in old and old[p][1] != new[p][1]}, 
+             'delete': {p: old[p][1] for p in sorted(old) if p not in new}}
+    pydirs = [p.split('/')[0] for p in old if p.endswith('/python.exe')]
+    if any(p.split('/')[0] in pydirs for p in delta['delete']):
+        print('\nWARNING: the Python version has changed between the builds.')
+        print('The delta package will be large, a new build may be better.')
+    script = APPLY_DELTA_PY_SCRIPT.format(old=old_build.name, 
+                                          new=new_build.name)
+    bat = 'echo off\n'
+    if pydirs:
+        bat += f'"./{pydirs[0]}/python.exe"'
+    else:
+        bat += 'python'
+    bat += ' "./winpackit_delta/apply_delta.py" %*'
+    with zipfile.ZipFile(output, 'w', zipfile.ZIP_DEFLATED) as z:
+        z.writestr('apply_delta.bat', bat)
+        z.writestr('winpackit_delta/apply_delta.py', script)
+        z.writestr('winpackit_delta/delta_manifest.json', 
+                   json.dumps(delta, indent=1))
+        for path in list(delta['add']) + list(delta['change']):
+            z.write(new_build / path, f'winpackit_delta/files/{path}')
+    print(f"\nDelta package {output} generated:", 
+          f"{len(delta['add'])} files added, {len(delta['change'])} changed,", 
+          f"{len(delta['delete'])} deleted.")
+    print('To update, users should unzip it into their build directory', 
+          'and run "apply_delta.bat".')
+    return 0
+
+def prefetch(pyversions, requirements=None, cache_dir=None, workers=None):
+    """Download into the cache (default: winpackit_cache) the embeddable 
+    package and Get-pip for each Python in pyversions (as in PYTHON_VERSION), 
+    and the wheels in the requirements file for each one of them, so that 
+    the builds start warm. At most workers downloads run at once."""
+    print(f'This is the WinPackIt script version {version}.')
+    workers = workers or min(32, (os.cpu_count() or 1) + 4)
+    settings = _settings_from_request({'PYTHON_VERSION': list(pyversions), 
+                                       'REQUIREMENTS': requirements or ''}, 
+                                      Path.cwd())
+    if settings.REQUIREMENTS and not Path(settings.REQUIREMENTS).is_file():
+        print(f'\n{requirements} is not a requirements file!')
+        return 1
+    packit = Packit(settings, cache_dir)
+    packit.cache_dir.mkdir(parents=True, exist_ok=True)
+    targets = {}
+    for pyversion in pyversions:
+        target = packit._make_target(pyversion)
+        targets.setdefault(target.target_py_version, target)
+    jobs = []
+    for pyversion, target in targets.items():
+        jobs.append(packit.catalog.url(pyversion))
+        # a fresh Get-pip, as an online build would download
+        getpip = target._getpip_source() + (True,)
+        if getpip not in jobs:
+            jobs.append(getpip)
+    packit.msg(LOG_VERBOSE, f'\nPrefetching {len(jobs)} files for', 
+               f'{len(targets)} Pythons into {packit.cache_dir}...')
+    files = packit.run_stage(packit.getfiles, jobs, False, workers)
+    ok = all(files)
+    if settings.REQUIREMENTS:
+        ok = packit.run_stage(packit.download_wheels, targets, workers) and ok
+    totals = packit.report.totals()
+    print(f'\nPrefetch done in {totals["wall_time"]:.1f}s:', 
+          f'{len([f for f in files if f])} of {len(jobs)} files in the cache,', 
+          f'{totals.get("bytes_downloaded", 0)} bytes downloaded.')
+    if not ok:
+        print('ERROR: some downloads failed, see above.')
+        return 1
+    return 0
+
+def export_index(output=None, cache_dir=None):
+    """Make a static PEP 503 "simple" index in output (default: the index 
+    dir in the cache), from the wheels and sdists found in cache_dir, 
+    Pip's cache included. OFFLINE builds install from this index."""
+    print(f'This is the WinPackIt script version {version}.')
+    cache_dir = Path(cache_dir or Path.cwd() / 'winpackit_cache')
+    output = Path(output or cache_dir / OFFLINE_INDEX_DIR)
+    if not cache_dir.is_dir():
+        print(f'\n{cache_dir} is not a WinPackIt cache directory!')
+        return 1
+    print(f'Exporting the distributions in {cache_dir}...')
+    ignore = lambda d, names: INDEX_SKIP_DIRS if Path(d) == cache_dir else ()
+    output.mkdir(parents=True, exist_ok=True)
+    exported = output.resolve()
+    added = 0
+    for path in _walk_tree(cache_dir, ignore):
+        if exported in path.resolve().parents:
+            continue
+        dist = _dist_filename(path)
+        if dist is None:
+            continue
+        project, filename = dist
+        dest = output / _canonical_name(project) / filename
+        if not dest.exists():
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            _link_or_copy(path, dest)
+            added += 1
+    # files exported last time are still there: list them all
+    projects = sorted(d.name for d in output.iterdir() if d.is_dir())
+    page = '<!DOCTYPE html>\n<html><body>\n{}</body></html>\n'
+    for project in projects:
+        links = ''
+        for dist in sorted((output / project).iterdir()):
+            if dist.name != 'index.html':
+                digest = sha256(dist.read_bytes()).hexdigest()
+                links += f'<a href="{dist.name}#sha256={digest}">{dist.name}</a><br>\n'
+        _ = (output / project / 'index.html').write_text(page.format(links))
+    links = ''.join(f'<a href="{p}/">{p}</a><br>\n' for p in projects)
+    _ = (output / 'index.html').write_text(page.format(links))
+    print(f'\nIndex {output} generated: {len(projects)} projects,', 
+          f'{added} new distributions.')
+    print('Set OFFLINE = True in your runner module to build from the cache only.')
+    return 0
+
+def _build_components(build_dir, target, sizes):
+    """Return a {path: component} dict for the files of a build target 
+    (a subdir of build_dir, or build_dir itself if target is empty)."""
+    label = f'{target[:-1]}: ' if target else ''
+    paths = [path for path in sizes if path.startswith(target)]
+    pydirs = {path[len(target):].split('/')[0] for path in paths 
+              if path[len(target):].count('/') == 1 
+              and path.endswith('/python.exe')}
+    projects = []
+    bootstrap = build_dir / target / 'winpackit_bootstrap' / 'bootstrap.py'
+    if bootstrap.exists():
+        found = re.search(r'^PROJECY_DIRS = (.*)$', bootstrap.read_text(), re.M)
+        if found:
+            projects = ast.literal_eval(found.group(1))
+    owners = {}
+    for path in paths:
+        first, sep, rest = path[len(target):].partition('/')
+        if not sep:
+            owners[path] = label + 'other files'
+        elif first in pydirs:
+            if not rest.startswith('Lib/site-packages/'):
+                owners[path] = label + 'interpreter'
+            else:
+                owners[path] = label + 'site-packages (no RECORD)'
+            if re.match(r'^python\d+\.zip$', rest):
+                owners[path] = label + 'stdlib zip'
+        elif first == 'winpackit_bootstrap':
+            owners[path] = label + 'bootstrap'
+        elif first in projects:
+            owners[path] = label + f'project {first}'
+        else:
+            owners[path] = label + f'dir {first}'
+    # site-packages files go to their distribution, as listed in RECORD
+    for pydir in pydirs:
+        site = f'{target}{pydir}/Lib/site-packages/'
+        for record in paths:
+            if not (record.startswith(site) 
+                    and record.endswith('.dist-info/RECORD')):
+                continue
+            dist = record[len(site):].split('-')[0]
+            with open(build_dir / record, newline='') as f:
+                for row in csv.reader(f):
+                    path = posixpath.normpath(site + row[0]) if row else ''
+                    if path in owners:
+                        owners[path] = label + f'site-packages {dist}'
+    return owners
+
+def analyze_build(build_dir, top=ANALYZE_TOP):
+    """Return the size breakdown of a build dir: files and bytes of the 
+    Python interpreter, its stdlib zip, each site-packages distribution, 
+    each project and each other dir (for each target of a build matrix), 
+    and the top largest files."""
+    build_dir = Path(build_dir)
+    sizes = _scan_tree(build_dir)
+    if (build_dir / 'install.bat').exists():
+        targets = ['']
+    else: # a build matrix, one build in each subdir
+        targets = sorted(path[:-len('install.bat')] for path in sizes 
+                         if path.count('/') == 1 and path.endswith('/install.bat'))
+    owners = {}
+    for target in targets:
+        owners.update(_build_components(build_dir, target, sizes))
+    components = {}
+    for path, size in sizes.items():
+        component = components.setdefault(owners.get(path, 'other files'), 
+                                          {'files': 0, 'bytes': 0})
+        component['files'] += 1
+        component['bytes'] += size
+    largest = sorted(sizes.items(), key=lambda item: (-item[1], item[0]))[:top]
+    return {'build': build_dir.name, 'files': len(sizes), 
+            'bytes': sum(sizes.values()), 
+            'components': dict(sorted(components.items(), 
+                                      key=lambda item: -item[1]['bytes'])), 
+            'largest': [list(item) for item in largest]}
+
+def analyze(build_dir, against=None, top=ANALYZE_TOP, as_json=False):
+    """Print the size breakdown of build_dir (see analyze_build), and 
+    the growth against a previous build, if given."""
+    for build in (build_dir, against):
+        if build is not None and not Path(build).is_dir():
+            print(f'\n{build} is not a directory!')
+            return 1
+    analysis = analyze_build(build_dir, top)
+    if against is not None:
+        old = analyze_build(against, top)
+        analysis['against'] = old['build']
+        for name, component in analysis['components'].items():
+            before = old['components'].get(name, {'files': 0, 'bytes': 0})
+            component['files_change'] = component['files'] - before['files']
+            component['bytes_change'] = component['bytes'] - before['bytes']
+        for name, before in old['components'].items(): # all gone
+            if name not in analysis['components']:
+                analysis['components'][name] = {
+                    'files': 0, 'bytes': 0, 'files_change': -before['files'], 
+                    'bytes_change': -before['bytes']}
+        analysis['files_change'] = analysis['files'] - old['files']
+        analysis['bytes_change'] = analysis['bytes'] - old['bytes']
+    if as_json:
+        print(json.dumps(analysis, indent=2))
+        return 0
+    mb = lambda nbytes: f'{nbytes / 1024 / 1024:.1f} MB'
+    print(f'This is the WinPackIt script version {version}.')
+    print(f"\nBuild {analysis['build']}: {analysis['files']} files,", 
+          mb(analysis['bytes']))
+    if against is not None:
+        print(f"Against {analysis['against']}: {analysis['files_change']:+d} files,", 
+              f"{analysis['bytes_change'] / 1024 / 1024:+.1f} MB")
+    for name, component in analysis['components'].items():
+        line = (f"  {name + ' ':.<44} {component['files']:>7} files"
+                f" {mb(component['bytes']):>10}")
+        if against is not None:
+            line += (f"  {component['files_change']:+7d}"
+                     f"  {component['bytes_change'] / 1024 / 1024:+8.1f} MB")
+        print(line)
+    print('\nLargest files:')
+    for path, size in analysis['largest']:
+        print(f'  {mb(size):>10}  {path}')
+    return 0
+
+def _command_line(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m winpackit', 
+                description='WinPackIt - the quick and dirty Python packager '
+                            'for Windows. With no options, generate a new '
+                            'runner module.')
+    parser.add_argument('runner', nargs='?', 
+                        default=Path.cwd() / 'run_winpackit.py', 
+                        help='the runner module to generate '
+                             '(default: run_winpackit.py)')
+    parser.add_argument('--delta', nargs=2, metavar=('OLD_BUILD', 'NEW_BUILD'), 
+                        help='make a delta package to update OLD_BUILD '
+                             'into NEW_BUILD')
+    parser.add_argument('--output', help='the delta package to generate '
+                        '(default: winpackit_delta_<NEW_BUILD>.zip)')
+    parser.add_argument('--analyze', metavar='BUILD_DIR', 
+                        help='show what takes up space in a build')
+    parser.add_argument('--against', metavar='OLD_BUILD', 
+                        help='with --analyze, the growth since a previous build')
+    parser.add_argument('--top', type=int, default=ANALYZE_TOP, 
+                        help='with --analyze, the largest files to list '
+                             f'(default: {ANALYZE_TOP})')
+    parser.add_argument('--json', action='store_true', 
+                        help='with --analyze, print the analysis as json')
+    parser.add_argument('--serve', nargs='?', metavar='[HOST:]PORT', 
+                        const='{}:{}'.format(*SERVE_DEFAULT_ADDRESS), 
+                        help='run a build server (default: {}:{})'.format(
+                                                    *SERVE_DEFAULT_ADDRESS))
+    parser.add_argument('--root', help='the build server will only build '
+                        'projects inside this dir (default: current dir)')
+    parser.add_argument('--workers', type=int, 
+                        help='builds run at once by the build server '
+                             '(default: number of cpus), or prefetch downloads')
+    parser.add_argument('--cache-dir', help='the build server cache, or the '
+                        'cache to prefetch into or to export '
+                        '(default: winpackit_cache)')
+    parser.add_argument('--prefetch', nargs='+', metavar='PYTHON_VERSION', 
+                        help='download the Pythons (e.g. 3.8-32 3.10) and '
+                             'Get-pip into the cache, ahead of the builds')
+    parser.add_argument('--requirements', help='also prefetch the wheels in '
+                        'this requirements file, for each Python')
+    parser.add_argument('--export-index', nargs='?', metavar='DIR', const='', 
+                        help='make a "simple" index of the cached distributions, '
+                             'for offline builds (default: winpackit_cache/index)')
+    args = parser.parse_args(argv)
+    if args.delta:
+        return make_delta(*args.delta, output=args.output)
+    if args.analyze:
+        return analyze(args.analyze, against=args.against, top=args.top, 
+                       as_json=args.json)
+    if args.prefetch:
+        return prefetch(args.prefetch, requirements=args.requirements, 
+                        cache_dir=args.cache_dir, workers=args.workers)
+    if args.export_index is not None:
+        return export_index(args.export_index or None, cache_dir=args.cache_dir)
+    if args.serve:
+        host, _, port = args.serve.rpartition(':')
+        return serve((host or SERVE_DEFAULT_ADDRESS[0], int(port)), 
+                     workers=args.workers, cache_dir=args.cache_dir, 
+                     root=args.root)
+    return make_runner_script(args.runner)
+
 if __name__ == '__main__':
-    try:
-        modname = Path(sys.argv[1])
-    except:
-        modname = Path.cwd() / 'run_winpackit.py'
-    sys.exit(make_runner_script(modname))
+    sys.exit(_command_line())
     
\ No newline at end of file